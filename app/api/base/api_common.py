@@ -1,18 +1,25 @@
-import io
 import logging
-from io import BytesIO
 from typing import Any
 
-from fastapi import File, APIRouter, UploadFile, Path, Request, Depends, BackgroundTasks
+from fastapi import APIRouter, Path, Request, Depends
 from fastapi.security import HTTPBearer
-from starlette.responses import StreamingResponse
+from fastapi_sqlalchemy import db
 
 from app.core import error_code, message
+from app.core.config import settings
+from app.core.security import oauth2_scheme
+from app.helpers.download import stream_download
 from app.helpers.exception_handler import CustomException
-from app.helpers.minio_handler import storage
+from app.helpers.minio_handler import storage, async_storage
+from app.helpers.upload_stream import MAX_UPLOAD_SIZE, SizeLimitedReader, normalize_upload_name, receive_upload, \
+    streamed_upload
 from app.schemas.sche_base import DataResponse
-from app.schemas.sche_common import UploadFileResponse
-from app.services.srv_synchronized import synchronized_srv
+from app.schemas.sche_common import UploadFileResponse, PresignedUploadRequest, PresignedUploadResponse, \
+    UploadCompleteRequest
+from app.schemas.sche_sync import SyncStatusResponse, SyncTriggerResponse
+from app.services import srv_upload
+from app.services.srv_iam import get_authorization
+from app.services.srv_sync_scheduler import iam_sync_scheduler
 
 logger = logging.getLogger(__name__)
 
@@ -20,23 +27,21 @@ router = APIRouter()
 
 
 @router.post("/upload/minio", response_model=DataResponse[UploadFileResponse])
-async def upload_file_to_minio(file: UploadFile = File(...)):
+@streamed_upload(field_name='file')
+async def upload_file_to_minio(request: Request):
+    """
+    Upload file (multipart, field "file"): kiểm tra dung lượng theo Content-Length trước khi đọc body và trong lúc
+    stream, file được đẩy lên storage theo từng part trong threadpool để không chặn event loop
+    """
+    upload = None
     try:
-        data = file.file.read()
-        if len(data) > 1024 * 1024 * 10:
-            raise CustomException(http_code=400, code=error_code.ERROR_100_FILE_TOO_LARGE,
-                                  message=message.MESSAGE_100_FILE_TOO_LARGE)
-
-        file_name = " ".join(file.filename.strip().split())
-        file_ext = file_name.split('.')[-1]
-        if file_ext.lower() not in ('jpg', 'png', 'pdf', 'xlsx', 'xls', 'svg', 'pdf', 'doc', 'docx', 'rar', 'zip'):
-            raise CustomException(http_code=400, code=error_code.ERROR_045_FORMAT_FILE,
-                                  message=message.MESSAGE_045_FORMAT_FILE)
-
-        data_file = storage.put_object(
+        upload = await receive_upload(request, field_name='file', max_size=MAX_UPLOAD_SIZE)
+        file_name = normalize_upload_name(upload.filename)
+        data_file = await async_storage.put_object(
             file_name=file_name,
-            file_data=BytesIO(data),
-            content_type=file.content_type
+            file_data=SizeLimitedReader(upload.file, MAX_UPLOAD_SIZE),
+            content_type=upload.content_type,
+            dedupe=settings.UPLOAD_DEDUPE
         )
         return DataResponse().success_response(data_file)
     except CustomException as e:
@@ -47,20 +52,57 @@ async def upload_file_to_minio(file: UploadFile = File(...)):
             raise CustomException(http_code=400, code=error_code.ERROR_101_NOT_CONNECT_MinIO,
                                   message=message.MESSAGE_101_NOT_CONNECT_MinIO)
         raise CustomException(code=error_code.ERROR_999_SERVER, message=message.MESSAGE_999_SERVER)
+    finally:
+        if upload is not None:
+            await upload.close()
+
+
+@router.post("/upload/presigned", response_model=DataResponse[PresignedUploadResponse])
+def create_presigned_upload(req_data: PresignedUploadRequest, email: str = Depends(oauth2_scheme)) -> Any:
+    """
+    Cấp URL để client upload file thẳng lên storage, sau khi upload xong gọi /upload/complete với file_name.
+    Tên object được lưu cùng người gọi, file không complete sẽ bị xoá sau khi URL hết hạn
+    """
+    try:
+        return DataResponse().success_response(srv_upload.create_presigned_upload(
+            db.session, email=email, file_name=req_data.file_name, content_type=req_data.content_type))
+    except CustomException as e:
+        raise e
+    except Exception as e:
+        logger.error(str(e))
+        if e.__class__.__name__ == 'MaxRetryError':
+            raise CustomException(http_code=400, code=error_code.ERROR_101_NOT_CONNECT_MinIO,
+                                  message=message.MESSAGE_101_NOT_CONNECT_MinIO)
+        raise CustomException(code=error_code.ERROR_999_SERVER, message=message.MESSAGE_999_SERVER)
+
+
+@router.post("/upload/complete", response_model=DataResponse[UploadFileResponse])
+def complete_presigned_upload(req_data: UploadCompleteRequest, email: str = Depends(oauth2_scheme)) -> Any:
+    """
+    Đăng ký file đã upload qua URL presigned: file_name phải do /upload/presigned cấp cho chính người gọi,
+    kiểm tra dung lượng (file quá lớn bị xoá), trả về cùng dữ liệu với /upload/minio để dùng làm file_path khi import
+    """
+    try:
+        return DataResponse().success_response(srv_upload.complete_presigned_upload(
+            db.session, email=email, object_name=req_data.file_name))
+    except CustomException as e:
+        raise e
+    except Exception as e:
+        logger.error(str(e))
+        if e.__class__.__name__ == 'MaxRetryError':
+            raise CustomException(http_code=400, code=error_code.ERROR_101_NOT_CONNECT_MinIO,
+                                  message=message.MESSAGE_101_NOT_CONNECT_MinIO)
+        raise CustomException(code=error_code.ERROR_999_SERVER, message=message.MESSAGE_999_SERVER)
 
 
 @router.get("/download/minio/{file_path}")
 def download_file_from_minio(
+        request: Request,
         *, file_path: str = Path(..., title="The relative path to the file", min_length=1, max_length=500)
 ) -> Any:
     try:
-        minio_client = storage
-        if not minio_client.check_file_name_exists(minio_client.bucket_name, file_path):
-            raise CustomException(http_code=400, code=error_code.ERROR_045_FORMAT_FILE,
-                                  message=message.MESSAGE_045_FORMAT_FILE)
-
-        file = minio_client.client.get_object(minio_client.bucket_name, file_path).read()
-        return StreamingResponse(io.BytesIO(file))
+        # stat_object báo lỗi 045 nếu file không tồn tại, nội dung được stream theo từng chunk
+        return stream_download(request, storage, file_path)
     except CustomException as e:
         raise e
     except Exception as e:
@@ -71,7 +113,22 @@ def download_file_from_minio(
         raise CustomException(code=error_code.ERROR_999_SERVER, message=message.MESSAGE_999_SERVER)
 
 
-@router.get("/synchronized", dependencies=[Depends(HTTPBearer())])
-def synchronized(request: Request, background_tasks: BackgroundTasks):
-    background_tasks.add_task(synchronized_srv, request)
-    return {"message": "Success"}
+@router.get("/synchronized", dependencies=[Depends(HTTPBearer())],
+            response_model=DataResponse[SyncTriggerResponse])
+def synchronized(request: Request, full: bool = False):
+    """
+    Bắt đầu đồng bộ IAM, nếu đang có lần đồng bộ chạy thì gộp vào một lần chạy tiếp theo
+    """
+    result = iam_sync_scheduler.trigger(token=get_authorization(request), full=full)
+    return DataResponse().success_response(data=result)
+
+
+@router.get("/synchronized/status", dependencies=[Depends(HTTPBearer())],
+            response_model=DataResponse[SyncStatusResponse])
+def synchronized_status(limit: int = 10):
+    runs = iam_sync_scheduler.get_runs(limit=max(min(limit, 100), 1))
+    return DataResponse().success_response(data=SyncStatusResponse(
+        running=iam_sync_scheduler.running,
+        last_run=runs[0] if runs else None,
+        runs=runs
+    ))
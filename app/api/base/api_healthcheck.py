@@ -1,8 +1,12 @@
 from fastapi import APIRouter
 from fastapi import Response
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
 
 from app.helpers.check_database_connect import check_database_connect
-from app.schemas.sche_base import ResponseSchemaBase
+from app.helpers.circuit_breaker import get_metrics
+from app.helpers.minio_handler import storage
+from app.schemas.sche_base import ResponseSchemaBase, DataResponse
 
 router = APIRouter()
 
@@ -22,3 +26,23 @@ async def get():
         "code": "000",
         "message": "Health check ready success"
     } if is_database_connect else Response({"message": "Health check ready false"}, status_code=400)
+
+
+@router.get("/upstreams", response_model=DataResponse[dict])
+async def get():
+    """
+    Trạng thái circuit breaker, bulkhead và retry budget của các service đang gọi (IAM, location)
+    """
+    return DataResponse().success_response(data=get_metrics())
+
+
+@router.get("/storage", response_model=ResponseSchemaBase)
+async def get():
+    """
+    Readiness của storage (MinIO / GCS), client được tạo ở lần gọi đầu tiên nếu chưa có
+    """
+    error = await run_in_threadpool(storage.check_ready)
+    return {
+        "code": "000",
+        "message": "Health check storage success"
+    } if error is None else JSONResponse({"message": "Health check storage false"}, status_code=400)
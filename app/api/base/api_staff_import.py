@@ -0,0 +1,37 @@
+import logging
+
+from fastapi import APIRouter, Depends, Request
+from fastapi.security import HTTPBearer
+
+from app.schemas.sche_base import DataResponse
+from app.schemas.sche_staff_import import StaffImportValidateRequest, StaffImportValidateResponse, \
+    StaffImportRequest, StaffImportResponse
+from app.services.srv_staff import StaffService
+
+logger = logging.getLogger()
+router = APIRouter()
+
+
+@router.post("/validate", dependencies=[Depends(HTTPBearer())],
+             response_model=DataResponse[StaffImportValidateResponse])
+def validate_upload_file(req_data: StaffImportValidateRequest):
+    """
+    API dry run import file nhân viên: trả về lỗi theo từng dòng, không ghi dữ liệu và không tạo file lỗi
+    """
+    staff_service = StaffService()
+    return DataResponse().success_response(data=staff_service.validate_upload_excel(req_data=req_data))
+
+
+@router.post("", dependencies=[Depends(HTTPBearer())], response_model=DataResponse[StaffImportResponse])
+def import_file(request: Request, req_data: StaffImportRequest):
+    """
+    API import file nhân viên
+    mode = create: mọi dòng là nhân viên mới
+    mode = sync: file là toàn bộ nhân viên của company, chỉ thêm / cập nhật / nghỉ việc những dòng thay đổi
+    Nếu file có lỗi thì không ghi dữ liệu và trả về file lỗi
+    """
+    staff_service = StaffService()
+    total_rows, error_file_path = staff_service.upload_excel(
+        request=request, req_data=req_data, mode=req_data.mode, only_error_rows=req_data.only_error_rows)
+    return DataResponse().success_response(
+        data=StaffImportResponse(total_rows=total_rows, error_file_path=error_file_path))
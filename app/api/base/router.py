@@ -1,9 +1,10 @@
 from fastapi import APIRouter
 
-from app.api.base import api_healthcheck, api_company
+from app.api.base import api_healthcheck, api_common, api_company, api_staff_import
 
 router = APIRouter()
 
 router.include_router(api_healthcheck.router, tags=["healthcheck"], prefix="/healthcheck")
-# router.include_router(api_common.router, tags=["common"], prefix="/common")
+router.include_router(api_common.router, tags=["common"], prefix="/common")
 router.include_router(api_company.router, tags=["company"], prefix="/companies")
+router.include_router(api_staff_import.router, tags=["staff-import"], prefix="/staffs/import")
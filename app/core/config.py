@@ -1,4 +1,5 @@
 import os
+from typing import List
 
 from dotenv import load_dotenv
 from pydantic import BaseSettings
@@ -21,6 +22,64 @@ class Settings(BaseSettings):
     VNLIFE_DATABASE_URL = os.getenv('VNLIFE_DATABASE_URL', '')
     PV_VNSHOP_KA_DATABASE_URL = os.getenv('PV_VNSHOP_KA_DATABASE_URL', '')
 
-    AUTHENTICATION_SERVICE = ''
+    AUTHENTICATION_SERVICE = os.getenv('AUTHENTICATION_SERVICE', '')
+    AUTHENTICATION_JWKS_URL = os.getenv('AUTHENTICATION_JWKS_URL', '')  # Có JWKS thì verify token tại local
+    USERINFO_CACHE_SECONDS: int = 5 * 60  # Thời gian tối đa cache userinfo của một token
+    USERINFO_CACHE_SIZE: int = 10000
+    JWKS_CACHE_SECONDS: int = 60 * 60
+    JWKS_REFRESH_MIN_SECONDS: int = 60  # Token có kid lạ chỉ làm tải lại JWKS tối đa 1 lần mỗi 60 giây
+    AUTHENTICATION_JWT_ALGORITHMS: List[str] = ['RS256', 'ES256']  # Không lấy alg từ header của token
+    IAM_SERVICE_URL = os.getenv('IAM_SERVICE_URL', '')
+    IAM_TENANT_ID = os.getenv('IAM_TENANT_ID', '1')
+    LOCATION_SERVICE_URL = os.getenv('LOCATION_SERVICE_URL', '')
+
+    SALE_MANAGER_ID: int = 0
+    SALE_ADMIN_ID: int = 0
+    SALE_LEADER_ID: int = 0
+    SALE_ID: int = 0
+    ADMINISTRATOR_ID: int = 0
+    LOCATION_ADMINISTRATOR: int = 0
+
+    # HTTP client gọi sang các service khác (IAM, location)
+    API_POOL_SIZE: int = 20  # Số connection keep-alive tối đa tới mỗi service
+    API_CONNECT_TIMEOUT: float = 3
+    API_READ_TIMEOUT: float = 15
+    API_MAX_RETRIES: int = 2  # Chỉ retry các method idempotent
+    API_RETRY_BACKOFF: float = 0.2
+    API_RETRY_BACKOFF_MAX: float = 2
+    UPSTREAM_MAX_CONCURRENCY: int = 0  # Số request đồng thời tối đa tới mỗi service, 0: tính theo các worker bên dưới
+    UPSTREAM_LIVE_CONCURRENCY: int = 16  # Số slot dành cho request của người dùng, ngoài đồng bộ IAM và outbox
+    UPSTREAM_BULKHEAD_TIMEOUT: float = 1  # Chờ tối đa để có slot gọi service, quá thì trả lỗi ngay
+    UPSTREAM_FAILURE_THRESHOLD: int = 5  # Số lỗi liên tiếp để mở circuit
+    UPSTREAM_RECOVERY_SECONDS: float = 30  # Thời gian circuit mở trước khi cho gọi thử lại
+    UPSTREAM_RETRY_BUDGET_RATIO: float = 0.2  # Số retry tối đa so với số request trong 10 giây
+    UPSTREAM_RETRY_MIN: int = 3
+    IAM_CREATE_USER_MAX_ATTEMPTS: int = 3  # Số lần tạo lại user khi IAM báo trùng số điện thoại (1019)
+    IAM_SYNC_CONCURRENCY: int = 16
+    IAM_PAGE_SIZE: int = 500
+    IAM_SERVICE_TOKEN = os.getenv('IAM_SERVICE_TOKEN', '')  # Authorization của hr-service khi gọi IAM ngoài request
+    IAM_SYNC_INTERVAL_SECONDS: int = 0  # 0: không chạy đồng bộ định kỳ
+    IAM_SYNC_WATERMARK_OVERLAP_SECONDS: int = 5 * 60  # Lùi mốc đồng bộ để bù lệch đồng hồ giữa các API worker
+    IAM_OUTBOX_WORKER_ENABLED: bool = True
+    IAM_OUTBOX_BATCH_SIZE: int = 100
+    IAM_OUTBOX_CONCURRENCY: int = 8
+    IAM_OUTBOX_MAX_ATTEMPTS: int = 8
+    IAM_OUTBOX_POLL_SECONDS: float = 2
+    IAM_OUTBOX_LEASE_SECONDS: int = 5 * 60  # Event processing quá thời gian này được xử lý lại
+
+    STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'minio')  # minio | gcs | local | memory
+    LOCAL_STORAGE_PATH = os.getenv('LOCAL_STORAGE_PATH', os.path.join(BASE_DIR, 'storage'))  # STORAGE_BACKEND=local
+    UPLOAD_CONCURRENCY: int = 4  # Số part upload song song của một file, part 5 MB
+    UPLOAD_PART_MAX_RETRIES: int = 3
+    UPLOAD_PART_RETRY_BACKOFF: float = 0.5
+    UPLOAD_PART_RETRY_BACKOFF_MAX: float = 5
+    UPLOAD_DEDUPE: bool = False  # Đặt tên object theo sha256 nội dung, file giống nhau chỉ lưu một lần
+    UPLOAD_PRESIGNED_EXPIRE_SECONDS: int = 15 * 60  # Thời hạn URL upload trực tiếp lên storage
+    UPLOAD_PRESIGNED_CLEANUP_GRACE_SECONDS: int = 60 * 60  # File không complete sau hạn URL + 1 giờ bị xoá
+    UPLOAD_PRESIGNED_CLEANUP_INTERVAL_SECONDS: int = 10 * 60  # 0: không chạy dọn file định kỳ
+    UPLOAD_VALIDATION_CACHE_SECONDS: int = 60 * 60  # Cache các dòng đã parse của file import trong 1 giờ
+    IMPORT_PROCESS_POOL_WORKERS: int = 2  # 0: chạy trực tiếp trong thread của request
+    IMPORT_PROCESS_POOL_QUEUE: int = 8
+    IMPORT_PROCESS_POOL_QUEUE_TIMEOUT: int = 30
 
 settings = Settings()
@@ -45,6 +45,10 @@ class ErrorCode(object):
     ERROR_136_MANAGER_ID_BELONG_CHILDREN = '136'
     ERROR_137_MANAGER_CANNOT_INACTIVE = '137'
     ERROR_139_FILE_WRONG_TEMPLATE = '139'
+    ERROR_140_IMPORT_BUSY = '140'
+    ERROR_141_IMPORT_WORKER_FAILED = '141'
+    ERROR_142_UPLOAD_NOT_REGISTERED = '142'
+    ERROR_143_PRESIGNED_UPLOAD_NOT_SUPPORTED = '143'
     ERROR_160_EXISTS_TEAM = "160"
     ERROR_161_TEAM_ID_NOT_FOUND = "161"
     ERROR_162_STAFF_AND_TEAM_NOT_BELONG_SAME_COMPANY = '162'
@@ -110,6 +114,10 @@ class ErrorMessage(object):
     MESSAGE_136_MANAGER_ID_BELONG_CHILDREN = 'Không thể update vì manager_id thuộc danh sách các nhân viên cấp dưới'
     MESSAGE_137_MANAGER_CANNOT_INACTIVE = 'Không thể inactive nhân viên vì nhân viên đang là người quản lý'
     MESSAGE_139_FILE_WRONG_TEMPLATE = 'File không đúng template'
+    MESSAGE_140_IMPORT_BUSY = 'Hệ thống đang xử lý nhiều file import, vui lòng thử lại sau'
+    MESSAGE_141_IMPORT_WORKER_FAILED = 'Xử lý file import bị gián đoạn, vui lòng thử lại'
+    MESSAGE_142_UPLOAD_NOT_REGISTERED = 'File chưa được cấp URL upload hoặc URL đã hết hạn'
+    MESSAGE_143_PRESIGNED_UPLOAD_NOT_SUPPORTED = 'Storage hiện tại không hỗ trợ upload trực tiếp, vui lòng upload qua hệ thống'
     MESSAGE_160_EXISTS_TEAM = "Tên team đã tồn tại trên hệ thống"
     MESSAGE_161_TEAM_ID_NOT_FOUND = "Không tìm thấy id team"
     MESSAGE_162_STAFF_AND_TEAM_NOT_BELONG_SAME_COMPANY = "Nhân viên và nhóm không cùng công ty"
@@ -1,17 +1,122 @@
+import hashlib
+import logging
+import threading
+import time
 from datetime import datetime, timedelta
 from typing import Any, Optional, Union
 
 import jwt
+from fastapi import HTTPException
 from fastapi.security import HTTPBearer
 from fastapi.security.http import HTTPAuthorizationCredentials
 from passlib.context import CryptContext
+from starlette.concurrency import run_in_threadpool
 from starlette.requests import Request
 
 from app.core.config import settings
 from app.helpers.api_handler import call_api
+from app.helpers.cache import TTLCache
+
+logger = logging.getLogger()
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# Cache thông tin user theo hash của token, hết hạn theo exp của token
+userinfo_cache = TTLCache(max_size=settings.USERINFO_CACHE_SIZE, ttl=settings.USERINFO_CACHE_SECONDS)
+jwks_cache = TTLCache(max_size=64, ttl=settings.JWKS_CACHE_SECONDS)
+jwks_client = jwt.PyJWKClient(settings.AUTHENTICATION_JWKS_URL) if settings.AUTHENTICATION_JWKS_URL else None
+_jwks_lock = threading.Lock()
+_jwks_fetched_at = float('-inf')
+
+
+def _raw_token(authorization: str) -> str:
+    scheme, _, token = authorization.partition(' ')
+    return token.strip() if token else scheme.strip()
+
+
+def _cache_ttl(claims: dict) -> float:
+    exp = claims.get('exp')
+    if exp is None:
+        return settings.USERINFO_CACHE_SECONDS
+    return min(settings.USERINFO_CACHE_SECONDS, float(exp) - time.time())
+
+
+def _refresh_jwks() -> bool:
+    """
+    Fetch the JWKS again, at most once every JWKS_REFRESH_MIN_SECONDS so tokens with an unknown kid
+    can not make every request call the issuer
+    """
+    global _jwks_fetched_at
+    with _jwks_lock:
+        if time.monotonic() - _jwks_fetched_at < settings.JWKS_REFRESH_MIN_SECONDS:
+            return False
+        _jwks_fetched_at = time.monotonic()
+    for signing_key in jwks_client.get_signing_keys():
+        jwks_cache.set(signing_key.key_id, signing_key.key)
+    return True
+
+
+def _get_signing_key(token: str):
+    kid = jwt.get_unverified_header(token).get('kid')
+    key = jwks_cache.get(kid)
+    if key is None and _refresh_jwks():
+        key = jwks_cache.get(kid)
+    if key is None:
+        raise jwt.InvalidTokenError('Unknown kid %s' % kid)
+    return key
+
+
+def _verify_locally(token: str) -> Optional[dict]:
+    """
+    Verify the token with the issuer JWKS, None when it can not be done locally (no JWKS, opaque token,
+    unknown kid, claims without email) so the caller falls back to /userinfo.
+    Only AUTHENTICATION_JWT_ALGORITHMS are accepted, the alg of the token header is never trusted
+    """
+    if jwks_client is None:
+        return None
+    try:
+        claims = jwt.decode(token, _get_signing_key(token), algorithms=settings.AUTHENTICATION_JWT_ALGORITHMS,
+                            options={'verify_aud': False})
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(status_code=403, detail="Not Authorization")
+    except Exception as e:
+        logger.info("Cannot verify token locally: %s" % e)
+        return None
+    return claims if claims.get('email') else None
+
+
+def _unverified_claims(token: str) -> dict:
+    try:
+        return jwt.decode(token, options={'verify_signature': False})
+    except jwt.InvalidTokenError:
+        return {}
+
+
+def get_cached_userinfo(authorization: str) -> Optional[dict]:
+    return userinfo_cache.get(hashlib.sha256(_raw_token(authorization).encode('utf-8')).hexdigest())
+
+
+def get_userinfo(authorization: str) -> dict:
+    """
+    User info of the token: from the cache, verified locally with the JWKS, or from /userinfo
+    """
+    token = _raw_token(authorization)
+    cache_key = hashlib.sha256(token.encode('utf-8')).hexdigest()
+    userinfo = userinfo_cache.get(cache_key)
+    if userinfo is not None:
+        return userinfo
+
+    userinfo = _verify_locally(token)
+    claims = userinfo
+    if userinfo is None:
+        resp = call_api(url=settings.AUTHENTICATION_SERVICE + '/userinfo', token_iam=authorization)
+        if resp.status_code != 200:
+            raise HTTPException(status_code=403, detail="Not Authorization")
+        userinfo = resp.json()
+        claims = _unverified_claims(token)
+    userinfo_cache.set(cache_key, userinfo, ttl=_cache_ttl(claims))
+    return userinfo
+
 
 class IAMHTTPBearer(HTTPBearer):
     def __init__(self, *, role: Optional[str] = None, bearerFormat: Optional[str] = None,
@@ -24,11 +129,10 @@ class IAMHTTPBearer(HTTPBearer):
     async def __call__(self, request: Request) -> Optional[HTTPAuthorizationCredentials]:
         await super().__call__(request)
 
-        resp = call_api(url=self._api_endpoint + '/userinfo',
-                        token_iam=request.headers["Authorization"])
-        resp = resp.json()
-
-        return resp['email']
+        userinfo = get_cached_userinfo(request.headers["Authorization"])
+        if userinfo is None:
+            userinfo = await run_in_threadpool(get_userinfo, request.headers["Authorization"])
+        return userinfo.get('email')
 
 
 oauth2_scheme = IAMHTTPBearer()
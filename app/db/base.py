@@ -5,6 +5,8 @@ from sqlalchemy.orm import sessionmaker
 
 from app.core.config import settings
 
+engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 vnlife_engine = create_engine(settings.VNLIFE_DATABASE_URL, pool_pre_ping=True)
 pv_vnshop_ka_engine = create_engine(settings.PV_VNSHOP_KA_DATABASE_URL, pool_pre_ping=True)
 
@@ -1,41 +1,133 @@
-import json
 import logging
+import random
+import threading
+import time
+from typing import Dict, Tuple, Union
+from urllib.parse import urlsplit
 
+import requests
 from pydantic import AnyUrl
-from requests import request
+from requests.adapters import HTTPAdapter
 from requests.models import Response
 
 from app.core.config import settings
+from app.helpers.circuit_breaker import get_guard, upstream_max_concurrency
+from app.helpers.exception_handler import CustomException, ExceptionType
 
 logger = logging.getLogger(__name__)
 
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+RETRY_STATUS_CODES = frozenset([502, 503, 504])
+
 
 def get_name_service(url):
-    services = [settings.IAM_SERVICE_URL]
-    for index, service in enumerate(services):
-        if service in url:
-            if index == 0:
-                return 'Iam service'
+    services = [(settings.IAM_SERVICE_URL, 'Iam service'),
+                (settings.AUTHENTICATION_SERVICE, 'Authentication service'),
+                (settings.LOCATION_SERVICE_URL, 'Location service')]
+    for service, name in services:
+        if service and service in url:
+            return name
     return 'Unknow service'
 
 
+class ApiClient(object):
+    """
+    Shared HTTP client: one keep-alive session (connection pool) per upstream host, every call has a
+    (connect, read) timeout and idempotent calls are retried with jittered exponential backoff.
+    Every upstream has its own circuit breaker, concurrency limit and retry budget (circuit_breaker.py).
+    """
+
+    def __init__(self, pool_size: int, timeout: Tuple[float, float], max_retries: int, backoff: float,
+                 backoff_max: float):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self._sessions: Dict[str, requests.Session] = {}
+        self._lock = threading.Lock()
+
+    def get_session(self, url: str) -> requests.Session:
+        parts = urlsplit(url)
+        key = '%s://%s' % (parts.scheme, parts.netloc)
+        session = self._sessions.get(key)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(key)
+                if session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+                    session.mount(key, adapter)
+                    self._sessions[key] = session
+        return session
+
+    def sleep_before_retry(self, attempt: int):
+        # Full jitter: các worker retry cùng lúc không dồn vào cùng một thời điểm
+        time.sleep(random.uniform(0, min(self.backoff_max, self.backoff * (2 ** attempt))))
+
+    def request(self, method: str, url: str, timeout: Union[float, Tuple[float, float]] = None,
+                **kwargs) -> Response:
+        session = self.get_session(url)
+        guard = get_guard(get_name_service(url))
+        retries = self.max_retries if method.upper() in IDEMPOTENT_METHODS else 0
+        attempt = 0
+        while True:
+            if not guard.acquire():
+                # Circuit đang mở hoặc đã đủ số request đồng thời: trả lỗi ngay, không chiếm thêm thread
+                logger.warning("Reject calling %s, url: %s, upstream state: %s" % (
+                    guard.name, url, guard.breaker.state))
+                raise CustomException(http_code=ExceptionType.MS_UNAVAILABLE.http_code,
+                                      code=ExceptionType.MS_UNAVAILABLE.code,
+                                      message=ExceptionType.MS_UNAVAILABLE.message)
+            success = False
+            try:
+                response = session.request(method=method, url=url, timeout=timeout or self.timeout, **kwargs)
+                success = response.status_code < 500
+            except requests.RequestException as e:
+                if attempt >= retries or not guard.try_retry():
+                    logger.warning("Cannot connect %s, url: %s, error: %s" % (guard.name, url, e))
+                    raise CustomException(http_code=ExceptionType.MS_UNAVAILABLE.http_code,
+                                          code=ExceptionType.MS_UNAVAILABLE.code,
+                                          message=ExceptionType.MS_UNAVAILABLE.message)
+            else:
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= retries or not guard.try_retry():
+                    return response
+                response.close()
+            finally:
+                # Mọi nhánh (kể cả lỗi không phải RequestException) đều trả slot bulkhead và lượt thử half open
+                guard.release(success=success)
+            self.sleep_before_retry(attempt)
+            attempt += 1
+            logger.info("Retry %s %s, attempt %s" % (method, url, attempt))
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions = {}
+
+
+api_client = ApiClient(pool_size=max(settings.API_POOL_SIZE, upstream_max_concurrency()),
+                       timeout=(settings.API_CONNECT_TIMEOUT, settings.API_READ_TIMEOUT),
+                       max_retries=settings.API_MAX_RETRIES,
+                       backoff=settings.API_RETRY_BACKOFF,
+                       backoff_max=settings.API_RETRY_BACKOFF_MAX)
+
+
 def call_api(url: AnyUrl, token_iam: str = None, method: str = 'get', params: dict = None,
-             data: dict = None) -> Response:
-    try:
-        headers = {
-            'Content-Type': 'application/json',
-            'Accept': 'application/json'
-        }
-        if token_iam:
-            headers['Authorization'] = token_iam
-        response = request(method=method, url=url,
-                           headers=headers, json=data, params=params)
-
-        if response.status_code // 100 > 2:
-            logger.warning("Calling URL: %s, message: %s" % (url, response.json()))
-        else:
-            logger.info("Calling URL: %s, message: Success" % (url))
-        logger.info("Body request: " + str(data) + ", params: " + str(params))
-        return response
-    except Exception as e:
-        logger.warning("cannot Connect IAM")
+             data: dict = None, timeout: Union[float, Tuple[float, float]] = None) -> Response:
+    headers = {
+        'Content-Type': 'application/json',
+        'Accept': 'application/json'
+    }
+    if token_iam:
+        headers['Authorization'] = token_iam
+    response = api_client.request(method=method, url=url, headers=headers, json=data, params=params,
+                                  timeout=timeout)
+
+    if response.status_code // 100 > 2:
+        logger.warning("Calling URL: %s, message: %s" % (url, response.text))
+    else:
+        logger.info("Calling URL: %s, message: Success" % (url))
+    logger.info("Body request: " + str(data) + ", params: " + str(params))
+    return response
@@ -0,0 +1,190 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Dict
+
+from app.core.config import settings
+
+logger = logging.getLogger()
+
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker(object):
+    """
+    Open after failure_threshold consecutive failures, reject calls for recovery_timeout seconds,
+    then let a single trial call through (half open): success closes the circuit, failure opens it again
+    """
+
+    def __init__(self, failure_threshold: int, recovery_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = STATE_CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == STATE_CLOSED:
+                return True
+            if self.state == STATE_OPEN and time.monotonic() - self.opened_at >= self.recovery_timeout:
+                self.state = STATE_HALF_OPEN
+            if self.state == STATE_HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def cancel_trial(self):
+        # Lượt thử half open không được gọi (bulkhead đầy), cho lượt sau thử lại
+        with self._lock:
+            self._trial_running = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = STATE_CLOSED
+            self.failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == STATE_HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = STATE_OPEN
+                self.opened_at = time.monotonic()
+
+
+class RetryBudget(object):
+    """
+    Retries are allowed while they stay under ratio of the requests of the last window seconds
+    (at least min_retries), so retries can not multiply the load of a degraded upstream
+    """
+
+    def __init__(self, ratio: float, min_retries: int, window: float = 10):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window
+        self._requests = deque()
+        self._retries = deque()
+        self._lock = threading.Lock()
+
+    def _trim(self, now: float):
+        for events in (self._requests, self._retries):
+            while events and events[0] <= now - self.window:
+                events.popleft()
+
+    def record_request(self):
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            self._requests.append(now)
+
+    def try_retry(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            if len(self._retries) >= max(self.min_retries, self.ratio * len(self._requests)):
+                return False
+            self._retries.append(now)
+            return True
+
+
+class UpstreamGuard(object):
+    """
+    Circuit breaker, bulkhead (max concurrent calls) and retry budget of one upstream service, with metrics
+    """
+
+    def __init__(self, name: str, max_concurrency: int, acquire_timeout: float, failure_threshold: int,
+                 recovery_timeout: float, retry_ratio: float, min_retries: int):
+        self.name = name
+        self.acquire_timeout = acquire_timeout
+        self.breaker = CircuitBreaker(failure_threshold=failure_threshold, recovery_timeout=recovery_timeout)
+        self.retry_budget = RetryBudget(ratio=retry_ratio, min_retries=min_retries)
+        self._bulkhead = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self.metrics = {'calls': 0, 'successes': 0, 'failures': 0, 'rejected_open': 0, 'rejected_bulkhead': 0,
+                        'retries': 0, 'retries_denied': 0, 'in_flight': 0}
+
+    def _count(self, metric: str, value: int = 1):
+        with self._lock:
+            self.metrics[metric] += value
+
+    def acquire(self) -> bool:
+        """
+        Reserve a call slot, False when the circuit is open or the bulkhead is full
+        """
+        if not self.breaker.allow():
+            self._count('rejected_open')
+            return False
+        if not self._bulkhead.acquire(timeout=self.acquire_timeout):
+            self._count('rejected_bulkhead')
+            self.breaker.cancel_trial()
+            return False
+        self.retry_budget.record_request()
+        self._count('calls')
+        self._count('in_flight')
+        return True
+
+    def release(self, success: bool):
+        self._bulkhead.release()
+        self._count('in_flight', -1)
+        if success:
+            self._count('successes')
+            self.breaker.record_success()
+        else:
+            self._count('failures')
+            previous_state = self.breaker.state
+            self.breaker.record_failure()
+            if previous_state != STATE_OPEN and self.breaker.state == STATE_OPEN:
+                logger.warning("Circuit of %s is open after %s failures" % (self.name, self.breaker.failures))
+
+    def try_retry(self) -> bool:
+        if self.retry_budget.try_retry():
+            self._count('retries')
+            return True
+        self._count('retries_denied')
+        return False
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.metrics, state=self.breaker.state)
+
+
+def upstream_max_concurrency() -> int:
+    """
+    Bulkhead size of one upstream: the configured value, else room for the IAM sync and outbox workers
+    plus live traffic, so the background workers can not take every slot
+    """
+    if settings.UPSTREAM_MAX_CONCURRENCY > 0:
+        return settings.UPSTREAM_MAX_CONCURRENCY
+    return settings.IAM_SYNC_CONCURRENCY + settings.IAM_OUTBOX_CONCURRENCY + settings.UPSTREAM_LIVE_CONCURRENCY
+
+
+_guards: Dict[str, UpstreamGuard] = {}
+_guards_lock = threading.Lock()
+
+
+def get_guard(name: str) -> UpstreamGuard:
+    guard = _guards.get(name)
+    if guard is None:
+        with _guards_lock:
+            guard = _guards.get(name)
+            if guard is None:
+                guard = UpstreamGuard(name=name,
+                                      max_concurrency=upstream_max_concurrency(),
+                                      acquire_timeout=settings.UPSTREAM_BULKHEAD_TIMEOUT,
+                                      failure_threshold=settings.UPSTREAM_FAILURE_THRESHOLD,
+                                      recovery_timeout=settings.UPSTREAM_RECOVERY_SECONDS,
+                                      retry_ratio=settings.UPSTREAM_RETRY_BUDGET_RATIO,
+                                      min_retries=settings.UPSTREAM_RETRY_MIN)
+                _guards[name] = guard
+    return guard
+
+
+def get_metrics() -> Dict[str, dict]:
+    return {name: guard.snapshot() for name, guard in list(_guards.items())}
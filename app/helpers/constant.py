@@ -11,3 +11,21 @@ class SearchOperator:
 
     def get_list(self):
         return ['LIKE', 'LIKE_BEGIN', 'EQ', 'GE', 'LE', 'GT', 'LT', 'LIST', 'SEQ']
+
+
+# Cột của file import nhân viên, dùng chung cho validate, bulk load và roster sync
+COLUMNS = ['Fullname', 'StaffCode', 'Email', 'Phone', 'DepartmentID',
+           'DepartmentName', 'TitleName', 'TeamName', 'LineManagerEmail']
+COLUMNS_ERROR = ['Fullname', 'StaffCode', 'Email', 'Phone', 'DepartmentID',
+                 'DepartmentName', 'TitleName', 'TeamName', 'LineManagerEmail', 'DS lỗi (xóa cột này khi import)']
+MAX_UPLOAD_ROWS = 5000
+FULL_NAME = 0
+STAFF_CODE = 1
+EMAIL = 2
+PHONE = 3
+DEPARTMENT_ID = 4
+DEPARTMENT_NAME = 5
+TITLE_NAME = 6
+TEAM_NAME = 7
+LINE_MANAGER_EMAIL = 8
+ERROR = 9
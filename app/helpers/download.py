@@ -0,0 +1,91 @@
+import re
+from datetime import timezone
+from email.utils import format_datetime
+from typing import Optional, Tuple
+
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
+
+from app.helpers.gcs_handler import StorageAbstract
+
+# Object được put_object đặt tên "<dd-mm-YYYY_HH-MM-SS>___<uuid>___<tên file>" hoặc "<sha256>___<tên file>",
+# không bao giờ bị ghi đè
+IMMUTABLE_OBJECT_NAME = re.compile(r'^(\d{2}-\d{2}-\d{4}_\d{2}-\d{2}-\d{2}___|[0-9a-f]{64}___)')
+# private: file tải về có thể chứa dữ liệu nhân viên, không để proxy / CDN dùng chung lưu lại
+IMMUTABLE_CACHE_CONTROL = 'private, max-age=31536000, immutable'
+DEFAULT_CACHE_CONTROL = 'no-cache'
+
+
+def parse_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Inclusive (start, end) of a single "bytes=" range, None to send the whole object.
+    Raise ValueError when the range can not be satisfied
+    """
+    if not range_header or not range_header.startswith('bytes=') or ',' in range_header:
+        return None
+    start, _, end = range_header[len('bytes='):].strip().partition('-')
+    if not start.strip().isdigit() and not end.strip().isdigit():
+        return None
+    if size == 0:
+        # File rỗng không có byte nào để trả về theo range
+        raise ValueError(range_header)
+    if start.strip() == '':
+        # bytes=-N: N byte cuối
+        length = int(end)
+        if length == 0:
+            raise ValueError(range_header)
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = int(end) if end.strip().isdigit() else size - 1
+    if start >= size or end < start:
+        raise ValueError(range_header)
+    return start, min(end, size - 1)
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(',')]
+    return '*' in tags or etag in tags or 'W/' + etag in tags
+
+
+def stream_download(request: Request, storage: StorageAbstract, file_path: str) -> Response:
+    """
+    Download response streamed from storage chunk by chunk, with Range (single range), ETag / If-None-Match
+    and long lived cache headers for immutable object names
+    """
+    stat = storage.stat_object(file_path)
+    etag = '"%s"' % (stat['etag'] or '').strip('"')
+    size = stat['size']
+    headers = {
+        'ETag': etag,
+        'Accept-Ranges': 'bytes',
+        'Cache-Control': IMMUTABLE_CACHE_CONTROL if IMMUTABLE_OBJECT_NAME.match(file_path) else DEFAULT_CACHE_CONTROL,
+    }
+    last_modified = stat.get('last_modified')
+    if last_modified:
+        last_modified = last_modified.astimezone(timezone.utc) if last_modified.tzinfo \
+            else last_modified.replace(tzinfo=timezone.utc)
+        headers['Last-Modified'] = format_datetime(last_modified, usegmt=True)
+
+    if etag_matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers=headers)
+
+    byte_range = None
+    if_range = request.headers.get('if-range')
+    if if_range is None or if_range == etag:
+        try:
+            byte_range = parse_range(request.headers.get('range'), size)
+        except ValueError:
+            return Response(status_code=416, headers=dict(headers, **{'Content-Range': 'bytes */%s' % size}))
+
+    media_type = stat.get('content_type') or 'application/octet-stream'
+    if byte_range is None:
+        headers['Content-Length'] = str(size)
+        return StreamingResponse(storage.stream_object(file_path), media_type=media_type, headers=headers)
+
+    start, end = byte_range
+    headers['Content-Range'] = 'bytes %s-%s/%s' % (start, end, size)
+    headers['Content-Length'] = str(end - start + 1)
+    return StreamingResponse(storage.stream_object(file_path, start=start, end=end), status_code=206,
+                             media_type=media_type, headers=headers)
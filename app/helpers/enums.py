@@ -35,3 +35,38 @@ class SalesRoleName(enum.Enum):
 class AlgorithmsParentNode(enum.Enum):
     SP = "SP"
     HR = "HR"
+
+
+class StaffImportMode(enum.Enum):
+    CREATE = "create"
+    SYNC = "sync"
+
+
+class IamOutboxEvent(enum.Enum):
+    SYNC_STAFF = 'sync_staff'  # tạo user nếu chưa có và cập nhật role
+    UPDATE_ROLE = 'update_role'  # chỉ cập nhật role nếu user đã tồn tại
+    REMOVE_ROLE = 'remove_role'  # gỡ role sale portal của nhân viên đã nghỉ
+
+
+class IamOutboxStatus(enum.Enum):
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    DONE = 'done'
+    FAILED = 'failed'
+
+
+class PresignedUploadStatus(enum.Enum):
+    PENDING = 'pending'  # Đã cấp URL, chưa gọi /upload/complete
+    COMPLETED = 'completed'
+
+
+class SyncRunStatus(enum.Enum):
+    RUNNING = 'running'
+    SUCCESS = 'success'
+    FAILED = 'failed'
+    SKIPPED = 'skipped'  # process khác đang giữ lock
+
+
+class SyncTrigger(enum.Enum):
+    MANUAL = 'manual'
+    PERIODIC = 'periodic'
@@ -0,0 +1,59 @@
+import logging
+from typing import Dict, IO, Iterable, List
+
+import xlsxwriter
+
+logger = logging.getLogger()
+
+
+class ErrorFileWriter(object):
+    """
+    Write import rows and their errors to xlsx with xlsxwriter constant_memory mode: every row is flushed
+    to disk as soon as it is written, so memory does not grow with the number of rows.
+    The error column is the last one, the cell that caused the error is highlighted and commented.
+    """
+
+    def __init__(self, columns: List[str], error_columns: Dict[str, int], only_errors: bool = False):
+        self.columns = columns
+        self.error_index = len(columns) - 1
+        self.error_columns = error_columns
+        self.only_errors = only_errors
+
+    def write(self, rows: Iterable[list], output: IO) -> int:
+        """
+        Write rows to the file object, return the number of data rows written
+        """
+        workbook = xlsxwriter.Workbook(output, {'constant_memory': True, 'strings_to_numbers': False})
+        header_format = workbook.add_format({'bold': True})
+        error_cell_format = workbook.add_format({'bg_color': '#FFC7CE', 'font_color': '#9C0006'})
+        error_text_format = workbook.add_format({'font_color': '#9C0006'})
+        worksheet = workbook.add_worksheet()
+
+        worksheet.write_row(0, 0, self.columns, header_format)
+        row_index = 0
+        for row in rows:
+            error = row[self.error_index] if len(row) > self.error_index else None
+            if self.only_errors and not error:
+                continue
+            row_index += 1
+            error_column = self.error_columns.get(error) if error else None
+            for column_index, value in enumerate(row[:self.error_index]):
+                if column_index == error_column:
+                    worksheet.write_string(row_index, column_index, value, error_cell_format)
+                    worksheet.write_comment(row_index, column_index, error)
+                else:
+                    worksheet.write_string(row_index, column_index, value)
+            if error:
+                worksheet.write_string(row_index, self.error_index, error, error_text_format)
+        workbook.close()
+        return row_index
+
+
+def write_error_file(output_path: str, rows: List[list], columns: List[str], error_columns: Dict[str, int],
+                     only_errors: bool = False) -> int:
+    """
+    Write the error file to output_path, used as a process pool task
+    """
+    with open(output_path, 'wb') as output:
+        return ErrorFileWriter(columns=columns, error_columns=error_columns, only_errors=only_errors) \
+            .write(rows=rows, output=output)
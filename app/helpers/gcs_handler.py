@@ -1,4 +1,7 @@
+import hashlib
+import itertools
 import logging
+import uuid
 from datetime import datetime, timedelta
 
 from google.cloud import storage
@@ -7,9 +10,26 @@ from slugify import slugify
 from app.core import error_code, message
 from app.core.config import settings
 from app.helpers.exception_handler import CustomException
+from app.helpers.multipart_upload import iter_parts, upload_parts
+from app.helpers.upload_stream import UPLOAD_PART_SIZE
 
 logger = logging.getLogger()
 
+STREAM_CHUNK_SIZE = 1024 * 1024
+COMPOSE_MAX_SOURCES = 32
+
+
+def content_digest(file_data) -> str:
+    """
+    sha256 of a seekable file, read chunk by chunk and rewound to where it started
+    """
+    position = file_data.tell()
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: file_data.read(STREAM_CHUNK_SIZE), b''):
+        digest.update(chunk)
+    file_data.seek(position)
+    return digest.hexdigest()
+
 
 class StorageAbstract(object):
 
@@ -25,12 +45,56 @@ class StorageAbstract(object):
     def check_file_name_exists(self, bucket_name, file_name):
         pass
 
-    def put_object(self, file_data, file_name, content_type):
+    def ping(self):
+        """
+        Cheap round trip to the bucket, raise when storage is not reachable
+        """
         pass
 
-    def normalize_file_name(self, file_name):
+    def put_object(self, file_data, file_name, content_type, dedupe=False):
+        pass
+
+    def presigned_put_object(self, object_name, content_type, expires: timedelta) -> dict:
         pass
 
+    def remove_object(self, file_name):
+        pass
+
+    def new_object_name(self, file_name, digest: str = None) -> str:
+        """
+        Object name of a new upload, unique without asking the storage:
+        "<dd-mm-YYYY_HH-MM-SS>___<uuid>___<normalized file name>", or "<sha256>___<normalized file name>"
+        when the content digest is given, so identical uploads share one object
+        """
+        file_name = self.normalize_file_name(file_name)
+        if digest:
+            return f"{digest}___{file_name}"
+        datetime_prefix = datetime.now().strftime("%d-%m-%Y_%H-%M-%S")
+        return f"{datetime_prefix}___{uuid.uuid4().hex}___{file_name}"
+
+    def stream_object(self, file_name, chunk_size=STREAM_CHUNK_SIZE, start=0, end=None):
+        pass
+
+    def stat_object(self, file_name) -> dict:
+        pass
+
+    def normalize_file_name(self, file_name):
+        """
+        Slug of the file name (at most 100 characters) followed by its extension, shared by every backend
+        """
+        try:
+            file_name = " ".join(file_name.strip().split())
+            file_ext = file_name.split('.')[-1]
+            file_name = ".".join(file_name.split('.')[:-1])
+            file_name = slugify(file_name)
+            file_name = file_name[:100]
+            file_name = file_name + '.' + file_ext
+            return file_name
+        except Exception as e:
+            logger.error(str(e))
+            raise CustomException(
+                http_code=400, code=error_code.ERROR_046_STANDARDIZED, message=message.MESSAGE_046_STANDARDIZED)
+
 
 class GoogleCloudHandler(StorageAbstract):
     __instance = None
@@ -58,19 +122,21 @@ class GoogleCloudHandler(StorageAbstract):
         )
         return url
 
-    def check_file_name_exists(self, file_name):
+    def check_file_name_exists(self, bucket_name, file_name):
         try:
-            # blob = storage.Blob(bucket=self.bucket,
-            #                     name=file_name)
-            # print(blob.)
-            # a = self.bucket.get_blob(file_name)
-            # print(a)
-            return False
+            return self.bucket.get_blob(file_name, client=self.client) is not None
         except Exception as e:
             logger.debug(e)
             return False
 
+    def ping(self):
+        if not self.bucket.exists(client=self.client):
+            raise Exception("Bucket %s does not exist" % self.bucket_name)
+
     def download_file_name(self, filename):
+        """
+        Read the whole object into memory, only for small files: use stream_object for downloads
+        """
         blob = storage.Blob(name=filename, bucket=self.bucket)
         file = blob.download_as_bytes(client=self.client)
         return file
@@ -78,18 +144,76 @@ class GoogleCloudHandler(StorageAbstract):
     def get_object(self, filename):
         return self.download_file_name(filename=filename)
 
-    def put_object(self, file_data, file_name, content_type):
-        try:
+    def stat_object(self, file_name) -> dict:
+        blob = self.bucket.get_blob(file_name, client=self.client)
+        if blob is None:
+            raise CustomException(http_code=400, code=error_code.ERROR_045_FORMAT_FILE,
+                                  message=message.MESSAGE_045_FORMAT_FILE)
+        return {
+            'etag': blob.etag,
+            'size': blob.size,
+            'content_type': blob.content_type,
+            'last_modified': blob.updated
+        }
+
+    def stream_object(self, file_name, chunk_size=STREAM_CHUNK_SIZE, start=0, end=None):
+        """
+        Download object (or the inclusive byte range start-end) by byte ranges, only one chunk is kept in memory
+        """
+        blob = self.bucket.get_blob(file_name, client=self.client)
+        if blob is None:
+            raise CustomException(http_code=400, code=error_code.ERROR_045_FORMAT_FILE,
+                                  message=message.MESSAGE_045_FORMAT_FILE)
+        last = blob.size - 1 if end is None else min(end, blob.size - 1)
+        while start <= last:
+            chunk_end = min(start + chunk_size - 1, last)
+            yield blob.download_as_bytes(client=self.client, start=start, end=chunk_end)
+            start = chunk_end + 1
+
+    def upload_object(self, object_name, file_data, content_type):
+        """
+        One upload for objects of a single part, otherwise a parallel composite upload: the parts are uploaded
+        in parallel as temporary objects (each one retried on its own), composed into the object, then deleted
+        """
+        parts = iter_parts(file_data, UPLOAD_PART_SIZE)
+        first_part = next(parts, b'')
+        second_part = next(parts, None)
+        blob = storage.Blob(name=object_name, bucket=self.bucket)
+        if second_part is None:
+            blob.upload_from_string(first_part, content_type=content_type, client=self.client)
+            return
+
+        uploaded = []
+
+        def upload_part(part_number, data):
+            part = storage.Blob(name=f"{object_name}.part-{part_number:05d}", bucket=self.bucket)
+            part.upload_from_string(data, content_type=content_type, client=self.client)
+            uploaded.append(part)
+            return part
 
-            file_name = self.normalize_file_name(file_name)
-            datetime_prefix = datetime.now().strftime("%d-%m-%Y_%H-%M-%S")
-            object_name = f"{datetime_prefix}___{file_name}"
-            # while self.check_file_name_exists(bucket_name=self.bucket_name, file_name=object_name):
-            #     random_prefix = random.randint(1, 1000)
-            #     object_name = f"{datetime_prefix}___{random_prefix}___{file_name}"
-            blob = storage.Blob(name=object_name, bucket=self.bucket)
-            blob.upload_from_file(file_obj=file_data,
-                                  content_type=content_type)
+        try:
+            sources = upload_parts(itertools.chain([first_part, second_part], parts), upload_part)
+            blob.content_type = content_type
+            # Một lần compose nhận tối đa 32 object
+            blob.compose(sources[:COMPOSE_MAX_SOURCES], client=self.client)
+            for index in range(COMPOSE_MAX_SOURCES, len(sources), COMPOSE_MAX_SOURCES - 1):
+                blob.compose([blob] + sources[index:index + COMPOSE_MAX_SOURCES - 1], client=self.client)
+        finally:
+            for part in uploaded:
+                try:
+                    part.delete(client=self.client)
+                except Exception as e:
+                    logger.warning("Cannot delete upload part %s: %s" % (part.name, e))
+
+    def put_object(self, file_data, file_name, content_type, dedupe=False):
+        try:
+            digest = content_digest(file_data) if dedupe else None
+            object_name = self.new_object_name(file_name, digest=digest)
+            if digest and self.check_file_name_exists(bucket_name=self.bucket_name, file_name=object_name):
+                # Cùng nội dung đã được upload trước đó: dùng lại object cũ
+                logger.info("Reuse object %s" % object_name)
+            else:
+                self.upload_object(object_name=object_name, file_data=file_data, content_type=content_type)
             # url = self.presigned_get_object(
             #     bucket_name=self.bucket_name, object_name=object_name)
             data_file = {
@@ -98,19 +222,19 @@ class GoogleCloudHandler(StorageAbstract):
                 'url': object_name
             }
             return data_file
+        except CustomException as e:
+            raise e
         except Exception as e:
             raise Exception(e)
 
-    def normalize_file_name(self, file_name):
-        try:
-            file_name = " ".join(file_name.strip().split())
-            file_ext = file_name.split('.')[-1]
-            file_name = ".".join(file_name.split('.')[:-1])
-            file_name = slugify(file_name)
-            file_name = file_name[:100]
-            file_name = file_name + '.' + file_ext
-            return file_name
-        except Exception as e:
-            logger.error(str(e))
-            raise CustomException(
-                http_code=400, code=error_code.ERROR_046_STANDARDIZED, message=message.MESSAGE_046_STANDARDIZED)
+    def presigned_put_object(self, object_name, content_type, expires: timedelta) -> dict:
+        """
+        V4 signed PUT URL, the client has to send the signed Content-Type header
+        """
+        blob = storage.Blob(name=object_name, bucket=self.bucket)
+        url = blob.generate_signed_url(version='v4', expiration=expires, method='PUT', content_type=content_type,
+                                       client=self.client)
+        return {'url': url, 'method': 'PUT', 'headers': {'Content-Type': content_type}}
+
+    def remove_object(self, file_name):
+        storage.Blob(name=file_name, bucket=self.bucket).delete(client=self.client)
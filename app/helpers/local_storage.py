@@ -0,0 +1,234 @@
+import hashlib
+import json
+import logging
+import mmap
+import os
+import tempfile
+import threading
+from datetime import datetime, timedelta, timezone
+
+from app.core import error_code, message
+from app.core.config import settings
+from app.helpers.exception_handler import CustomException
+from app.helpers.gcs_handler import StorageAbstract, STREAM_CHUNK_SIZE, content_digest
+
+logger = logging.getLogger()
+
+META_DIR = '.meta'
+
+
+def file_not_found() -> CustomException:
+    return CustomException(http_code=400, code=error_code.ERROR_045_FORMAT_FILE,
+                           message=message.MESSAGE_045_FORMAT_FILE)
+
+
+def presigned_upload_not_supported() -> CustomException:
+    # Storage local / memory không có URL để client upload trực tiếp, dùng /upload/minio
+    return CustomException(http_code=400, code=error_code.ERROR_143_PRESIGNED_UPLOAD_NOT_SUPPORTED,
+                           message=message.MESSAGE_143_PRESIGNED_UPLOAD_NOT_SUPPORTED)
+
+
+class LocalStorageHandler(StorageAbstract):
+    """
+    Storage on the local disk (STORAGE_BACKEND=local) for dev, tests and benchmarks without MinIO / GCS.
+    Objects are files in LOCAL_STORAGE_PATH, their content type / etag are kept in a .meta sidecar
+    """
+    __instance = None
+
+    @staticmethod
+    def get_instance():
+        """ Static access method. """
+        if not LocalStorageHandler.__instance:
+            LocalStorageHandler.__instance = LocalStorageHandler(settings.LOCAL_STORAGE_PATH)
+        return LocalStorageHandler.__instance
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self.bucket_name = os.path.basename(self.root)
+        self.make_bucket()
+
+    def make_bucket(self) -> str:
+        os.makedirs(os.path.join(self.root, META_DIR), exist_ok=True)
+        return self.bucket_name
+
+    def ping(self):
+        if not os.access(self.root, os.W_OK):
+            raise Exception("Storage path %s is not writable" % self.root)
+
+    def _path(self, file_name) -> str:
+        # Tên object đến từ request: không cho phép thoát ra ngoài thư mục storage
+        if not file_name or '/' in file_name or '\\' in file_name or file_name.startswith('.'):
+            raise file_not_found()
+        return os.path.join(self.root, file_name)
+
+    def _meta_path(self, file_name) -> str:
+        return os.path.join(self.root, META_DIR, file_name + '.json')
+
+    def presigned_get_object(self, bucket_name, object_name):
+        return object_name
+
+    def check_file_name_exists(self, bucket_name, file_name):
+        try:
+            return os.path.isfile(self._path(file_name))
+        except CustomException:
+            return False
+
+    def put_object(self, file_data, file_name, content_type, dedupe=False):
+        digest = content_digest(file_data) if dedupe else None
+        object_name = self.new_object_name(file_name, digest=digest)
+        path = self._path(object_name)
+        if digest and os.path.isfile(path):
+            logger.info("Reuse object %s" % object_name)
+        else:
+            md5 = hashlib.md5()
+            # Ghi ra file tạm rồi đổi tên: không bao giờ đọc được object đang ghi dở
+            with tempfile.NamedTemporaryFile(dir=self.root, prefix='.upload-', delete=False) as output:
+                try:
+                    for chunk in iter(lambda: file_data.read(STREAM_CHUNK_SIZE), b''):
+                        md5.update(chunk)
+                        output.write(chunk)
+                except Exception:
+                    output.close()
+                    os.remove(output.name)
+                    raise
+            with open(self._meta_path(object_name), 'w') as meta:
+                json.dump({'content_type': content_type, 'etag': md5.hexdigest()}, meta)
+            os.replace(output.name, path)
+        return {
+            'bucket_name': self.bucket_name,
+            'file_name': object_name,
+            'url': object_name
+        }
+
+    def presigned_put_object(self, object_name, content_type, expires: timedelta) -> dict:
+        raise presigned_upload_not_supported()
+
+    def remove_object(self, file_name):
+        os.remove(self._path(file_name))
+        if os.path.exists(self._meta_path(file_name)):
+            os.remove(self._meta_path(file_name))
+
+    def stat_object(self, file_name) -> dict:
+        try:
+            stat = os.stat(self._path(file_name))
+        except OSError:
+            raise file_not_found()
+        meta = {}
+        if os.path.exists(self._meta_path(file_name)):
+            with open(self._meta_path(file_name)) as file:
+                meta = json.load(file)
+        return {
+            'etag': meta.get('etag') or '%x-%x' % (stat.st_size, stat.st_mtime_ns),
+            'size': stat.st_size,
+            'content_type': meta.get('content_type'),
+            'last_modified': datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc)
+        }
+
+    def stream_object(self, file_name, chunk_size=STREAM_CHUNK_SIZE, start=0, end=None):
+        """
+        Read the object through mmap, every chunk is a bytes copy of its range: starlette only sends bytes
+        and the map cannot be closed while a memoryview of it is still referenced
+        """
+        try:
+            file = open(self._path(file_name), 'rb')
+        except OSError:
+            raise file_not_found()
+        with file:
+            size = os.fstat(file.fileno()).st_size
+            if size == 0:
+                return
+            last = size - 1 if end is None else min(end, size - 1)
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                while start <= last:
+                    chunk_end = min(start + chunk_size - 1, last)
+                    yield view[start:chunk_end + 1]
+                    start = chunk_end + 1
+
+    def download_file_name(self, filename):
+        with open(self._path(filename), 'rb') as file:
+            return file.read()
+
+    def get_object(self, filename):
+        return self.download_file_name(filename=filename)
+
+
+class MemoryStorageHandler(StorageAbstract):
+    """
+    In-process storage (STORAGE_BACKEND=memory) for tests and benchmarks, objects are lost on restart
+    """
+    __instance = None
+
+    @staticmethod
+    def get_instance():
+        """ Static access method. """
+        if not MemoryStorageHandler.__instance:
+            MemoryStorageHandler.__instance = MemoryStorageHandler()
+        return MemoryStorageHandler.__instance
+
+    def __init__(self):
+        self.bucket_name = 'memory'
+        self.objects = {}  # object name -> (data, stat)
+        self._lock = threading.Lock()
+
+    def make_bucket(self) -> str:
+        return self.bucket_name
+
+    def ping(self):
+        pass
+
+    def presigned_get_object(self, bucket_name, object_name):
+        return object_name
+
+    def check_file_name_exists(self, bucket_name, file_name):
+        return file_name in self.objects
+
+    def put_object(self, file_data, file_name, content_type, dedupe=False):
+        digest = content_digest(file_data) if dedupe else None
+        object_name = self.new_object_name(file_name, digest=digest)
+        if digest and object_name in self.objects:
+            logger.info("Reuse object %s" % object_name)
+        else:
+            data = b''.join(iter(lambda: file_data.read(STREAM_CHUNK_SIZE), b''))
+            stat = {
+                'etag': hashlib.md5(data).hexdigest(),
+                'size': len(data),
+                'content_type': content_type,
+                'last_modified': datetime.now(timezone.utc)
+            }
+            with self._lock:
+                self.objects[object_name] = (data, stat)
+        return {
+            'bucket_name': self.bucket_name,
+            'file_name': object_name,
+            'url': object_name
+        }
+
+    def presigned_put_object(self, object_name, content_type, expires: timedelta) -> dict:
+        raise presigned_upload_not_supported()
+
+    def remove_object(self, file_name):
+        with self._lock:
+            self.objects.pop(file_name, None)
+
+    def _get(self, file_name):
+        item = self.objects.get(file_name)
+        if item is None:
+            raise file_not_found()
+        return item
+
+    def stat_object(self, file_name) -> dict:
+        return dict(self._get(file_name)[1])
+
+    def stream_object(self, file_name, chunk_size=STREAM_CHUNK_SIZE, start=0, end=None):
+        data = memoryview(self._get(file_name)[0])
+        last = len(data) - 1 if end is None else min(end, len(data) - 1)
+        while start <= last:
+            chunk_end = min(start + chunk_size - 1, last)
+            yield data[start:chunk_end + 1].tobytes()
+            start = chunk_end + 1
+
+    def download_file_name(self, filename):
+        return self._get(filename)[0]
+
+    def get_object(self, filename):
+        return self.download_file_name(filename=filename)
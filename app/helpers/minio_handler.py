@@ -1,14 +1,19 @@
+import io
+import itertools
 import logging
-import random
-from datetime import datetime, timedelta
+from datetime import timedelta
 
 from minio import Minio
-from slugify import slugify
+from minio.datatypes import Part
 
 from app.core import error_code, message
 from app.core.config import settings
 from app.helpers.exception_handler import CustomException
-from app.helpers.gcs_handler import StorageAbstract, GoogleCloudHandler
+from app.helpers.gcs_handler import StorageAbstract, GoogleCloudHandler, STREAM_CHUNK_SIZE, content_digest
+from app.helpers.local_storage import LocalStorageHandler, MemoryStorageHandler
+from app.helpers.multipart_upload import iter_parts, upload_parts
+from app.helpers.storage_proxy import LazyStorage, AsyncStorage
+from app.helpers.upload_stream import UPLOAD_PART_SIZE
 
 logger = logging.getLogger()
 
@@ -50,6 +55,10 @@ class MinioHandler(StorageAbstract):
         )
         return url
 
+    def ping(self):
+        if not self.client.bucket_exists(self.bucket_name):
+            raise Exception("Bucket %s does not exist" % self.bucket_name)
+
     def check_file_name_exists(self, bucket_name, file_name):
         try:
             self.client.stat_object(bucket_name=bucket_name, object_name=file_name)
@@ -58,24 +67,48 @@ class MinioHandler(StorageAbstract):
             logger.debug(e)
             return False
 
-    def put_object(self, file_data, file_name, content_type):
-        try:
-
-            file_name = self.normalize_file_name(file_name)
-            datetime_prefix = datetime.now().strftime("%d-%m-%Y_%H-%M-%S")
-            object_name = f"{datetime_prefix}___{file_name}"
-            while self.check_file_name_exists(bucket_name=self.bucket_name, file_name=object_name):
-                random_prefix = random.randint(1, 1000)
-                object_name = f"{datetime_prefix}___{random_prefix}___{file_name}"
-
+    def upload_object(self, object_name, file_data, content_type):
+        """
+        One PUT for objects of a single part, otherwise a multipart upload with the parts sent in parallel.
+        A failed part is retried on its own under the same upload id, a failed upload is aborted
+        """
+        parts = iter_parts(file_data, UPLOAD_PART_SIZE)
+        first_part = next(parts, b'')
+        second_part = next(parts, None)
+        if second_part is None:
             self.client.put_object(
                 bucket_name=self.bucket_name,
                 object_name=object_name,
-                data=file_data,
+                data=io.BytesIO(first_part),
                 content_type=content_type,
-                length=-1,
-                part_size=10 * 1024 * 1024
+                length=len(first_part)
+            )
+            return
+
+        upload_id = self.client._create_multipart_upload(self.bucket_name, object_name,
+                                                         {'Content-Type': content_type})
+        try:
+            etags = upload_parts(
+                itertools.chain([first_part, second_part], parts),
+                lambda part_number, data: self.client._upload_part(
+                    self.bucket_name, object_name, data, None, upload_id, part_number)
             )
+            self.client._complete_multipart_upload(
+                self.bucket_name, object_name, upload_id,
+                [Part(part_number, etag) for part_number, etag in enumerate(etags, start=1)])
+        except Exception:
+            self.client._abort_multipart_upload(self.bucket_name, object_name, upload_id)
+            raise
+
+    def put_object(self, file_data, file_name, content_type, dedupe=False):
+        try:
+            digest = content_digest(file_data) if dedupe else None
+            object_name = self.new_object_name(file_name, digest=digest)
+            if digest and self.check_file_name_exists(bucket_name=self.bucket_name, file_name=object_name):
+                # Cùng nội dung đã được upload trước đó: dùng lại object cũ
+                logger.info("Reuse object %s" % object_name)
+            else:
+                self.upload_object(object_name=object_name, file_data=file_data, content_type=content_type)
             url = self.presigned_get_object(bucket_name=self.bucket_name, object_name=object_name)
             data_file = {
                 'bucket_name': self.bucket_name,
@@ -83,22 +116,48 @@ class MinioHandler(StorageAbstract):
                 'url': url
             }
             return data_file
+        except CustomException as e:
+            raise e
         except Exception as e:
             raise Exception(e)
 
-    def normalize_file_name(self, file_name):
+    def presigned_put_object(self, object_name, content_type, expires: timedelta) -> dict:
+        """
+        Presigned PUT URL, MinIO does not sign the Content-Type so the size / type are checked on completion
+        """
+        url = self.client.presigned_put_object(bucket_name=self.bucket_name, object_name=object_name,
+                                               expires=expires)
+        return {'url': url, 'method': 'PUT', 'headers': {'Content-Type': content_type}}
+
+    def remove_object(self, file_name):
+        self.client.remove_object(bucket_name=self.bucket_name, object_name=file_name)
+
+    def stat_object(self, file_name) -> dict:
         try:
-            file_name = " ".join(file_name.strip().split())
-            file_ext = file_name.split('.')[-1]
-            file_name = ".".join(file_name.split('.')[:-1])
-            file_name = slugify(file_name)
-            file_name = file_name[:100]
-            file_name = file_name + '.' + file_ext
-            return file_name
+            stat = self.client.stat_object(bucket_name=self.bucket_name, object_name=file_name)
         except Exception as e:
-            logger.error(str(e))
-            raise CustomException(http_code=400, code=error_code.ERROR_046_STANDARDIZED,
-                                  message=message.MESSAGE_046_STANDARDIZED)
+            logger.debug(e)
+            raise CustomException(http_code=400, code=error_code.ERROR_045_FORMAT_FILE,
+                                  message=message.MESSAGE_045_FORMAT_FILE)
+        return {
+            'etag': stat.etag,
+            'size': stat.size,
+            'content_type': stat.content_type,
+            'last_modified': stat.last_modified
+        }
+
+    def stream_object(self, file_name, chunk_size=STREAM_CHUNK_SIZE, start=0, end=None):
+        """
+        Stream object (or the inclusive byte range start-end) from the MinIO response chunk by chunk
+        """
+        length = 0 if end is None else end - start + 1
+        response = self.client.get_object(self.bucket_name, file_name, offset=start, length=length)
+        try:
+            for chunk in response.stream(chunk_size):
+                yield chunk
+        finally:
+            response.close()
+            response.release_conn()
 
 
 def from_file_type_to_mime_type(file_type: str) -> str:
@@ -115,4 +174,16 @@ def from_file_type_to_mime_type(file_type: str) -> str:
     return FILE_TYPE_TO_MIME.get(file_type, 'application/octet-stream')
 
 
-storage = MinioHandler().get_instance()
+def create_storage() -> StorageAbstract:
+    if settings.STORAGE_BACKEND == 'gcs':
+        return GoogleCloudHandler.get_instance()
+    if settings.STORAGE_BACKEND == 'local':
+        return LocalStorageHandler.get_instance()
+    if settings.STORAGE_BACKEND == 'memory':
+        return MemoryStorageHandler.get_instance()
+    return MinioHandler.get_instance()
+
+
+# Client được tạo (và bucket được kiểm tra) ở lần dùng đầu tiên, không phải lúc import
+storage = LazyStorage(create_storage)
+async_storage = AsyncStorage(storage)
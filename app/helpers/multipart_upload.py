@@ -0,0 +1,77 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, Iterator, List, IO
+
+from app.core.config import settings
+
+logger = logging.getLogger()
+
+
+def read_part(file_data: IO, part_size: int) -> bytes:
+    """
+    Read a full part, file-like objects may return less than asked before the end of the stream
+    """
+    chunks, size = [], 0
+    while size < part_size:
+        chunk = file_data.read(part_size - size)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size += len(chunk)
+    return b''.join(chunks)
+
+
+def iter_parts(file_data: IO, part_size: int) -> Iterator[bytes]:
+    return iter(lambda: read_part(file_data, part_size), b'')
+
+
+def upload_part_with_retry(upload_part: Callable[[int, bytes], Any], part_number: int, data: bytes,
+                           max_retries: int) -> Any:
+    attempt = 0
+    while True:
+        try:
+            return upload_part(part_number, data)
+        except Exception as e:
+            if attempt >= max_retries:
+                raise
+            # Part vẫn nằm trong memory nên chỉ cần gửi lại part lỗi, không upload lại cả file
+            logger.warning("Upload part %s failed, retry: %s" % (part_number, e))
+            time.sleep(random.uniform(0, min(settings.UPLOAD_PART_RETRY_BACKOFF_MAX,
+                                             settings.UPLOAD_PART_RETRY_BACKOFF * (2 ** attempt))))
+            attempt += 1
+
+
+def upload_parts(parts: Iterable[bytes], upload_part: Callable[[int, bytes], Any], concurrency: int = None,
+                 max_retries: int = None) -> List[Any]:
+    """
+    Upload the parts on `concurrency` threads and return the upload_part results ordered by part number.
+    The parts are read lazily by the calling thread only, at most concurrency + 1 parts are in memory.
+    Every part is retried on its own, the first part that still fails cancels the rest and is raised
+    """
+    concurrency = max(concurrency or settings.UPLOAD_CONCURRENCY, 1)
+    max_retries = settings.UPLOAD_PART_MAX_RETRIES if max_retries is None else max_retries
+    in_flight = threading.BoundedSemaphore(concurrency)
+    futures = []
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='upload-part') as executor:
+        try:
+            for part_number, data in enumerate(parts, start=1):
+                in_flight.acquire()
+                if any(future.done() and future.exception() for future in futures):
+                    in_flight.release()
+                    for future in futures:
+                        future.cancel()
+                    break
+                future = executor.submit(upload_part_with_retry, upload_part, part_number, data, max_retries)
+                future.add_done_callback(lambda _: in_flight.release())
+                futures.append(future)
+        except Exception:
+            for future in futures:
+                future.cancel()
+            raise
+    errors = [future.exception() for future in futures if not future.cancelled() and future.exception()]
+    if errors:
+        raise errors[0]
+    return [future.result() for future in futures]
@@ -0,0 +1,116 @@
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, List, Sequence
+
+from app.core import error_code, message
+from app.core.config import settings
+from app.helpers.exception_handler import CustomException
+
+logger = logging.getLogger()
+
+
+class ProcessPool(object):
+    """
+    Process pool for CPU-bound work (import parsing, validation, error files) so it does not hold the GIL
+    of the API worker. At most max_workers + max_queue tasks are running or waiting, callers that can not
+    get a slot within queue_timeout get a 503. With max_workers = 0 tasks run inline.
+    Workers are spawned, not forked: the API process has threads (outbox worker, scheduler, DB pool)
+    whose locks must not be copied into the children.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int, queue_timeout: float):
+        self.max_workers = max_workers
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max(max_workers + max_queue, 1))
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                         mp_context=multiprocessing.get_context('spawn'))
+        return self._executor
+
+    def _reset(self, executor: ProcessPoolExecutor):
+        """
+        Drop a broken executor, the next submit starts a new one
+        """
+        with self._lock:
+            if self._executor is executor:
+                logger.warning("Process pool is broken, recreating it")
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise CustomException(http_code=503, code=error_code.ERROR_140_IMPORT_BUSY,
+                                  message=message.MESSAGE_140_IMPORT_BUSY)
+        try:
+            executor = self._get_executor()
+            try:
+                future = executor.submit(fn, *args, **kwargs)
+            except BrokenProcessPool:
+                self._reset(executor)
+                future = self._get_executor().submit(fn, *args, **kwargs)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def result(self, future: Future) -> Any:
+        """
+        Wait for the task, a worker that died (killed by the OOM killer, segfault...) breaks the whole pool:
+        the pool is recreated and the caller gets an error it can retry
+        """
+        try:
+            return future.result()
+        except BrokenProcessPool as e:
+            logger.error("Process pool worker died: %s" % e)
+            executor = self._executor
+            if executor is not None:
+                self._reset(executor)
+            raise CustomException(http_code=500, code=error_code.ERROR_141_IMPORT_WORKER_FAILED,
+                                  message=message.MESSAGE_141_IMPORT_WORKER_FAILED)
+
+    def run(self, fn: Callable, *args, **kwargs) -> Any:
+        if self.max_workers <= 0:
+            return fn(*args, **kwargs)
+        return self.result(self.submit(fn, *args, **kwargs))
+
+    def run_ranges(self, fn: Callable, items: Sequence, *args, min_range_size: int = 500) -> List[Any]:
+        """
+        Call fn(items[start:end], start, *args) for consecutive slices covering items across the workers,
+        every task receives its own slice of items but a full copy of args. Results are returned in slice order
+        """
+        total = len(items)
+        workers = max(self.max_workers, 1)
+        range_size = max(min_range_size, -(-total // workers), 1)
+        ranges = [(start, min(start + range_size, total)) for start in range(0, total, range_size)]
+        if self.max_workers <= 0 or len(ranges) <= 1:
+            return [fn(items[start:end], start, *args) for start, end in ranges]
+        futures = [self.submit(fn, items[start:end], start, *args) for start, end in ranges]
+        return [self.result(future) for future in futures]
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+
+def merge_ranges(results: Sequence[list]) -> list:
+    merged = []
+    for result in results:
+        merged.extend(result)
+    return merged
+
+
+process_pool = ProcessPool(max_workers=settings.IMPORT_PROCESS_POOL_WORKERS,
+                           max_queue=settings.IMPORT_PROCESS_POOL_QUEUE,
+                           queue_timeout=settings.IMPORT_PROCESS_POOL_QUEUE_TIMEOUT)
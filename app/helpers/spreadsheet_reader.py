@@ -0,0 +1,190 @@
+import csv
+import io
+import logging
+import tempfile
+from typing import Iterable, Iterator, List
+
+import pandas as pd
+from openpyxl import load_workbook
+
+from app.core import error_code, message
+from app.helpers.exception_handler import CustomException
+from app.helpers.gcs_handler import STREAM_CHUNK_SIZE
+
+logger = logging.getLogger()
+
+READ_BATCH_SIZE = 500
+SPOOL_MAX_SIZE = 5 * 1024 * 1024
+SUPPORTED_EXTENSIONS = ('xlsx', 'xls', 'csv')
+
+
+class ChunkStream(io.RawIOBase):
+    """
+    Read-only raw stream over an iterator of byte chunks, so the chunks can be decoded by io.TextIOWrapper
+    """
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._buffer = b''
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._buffer:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._buffer = chunk
+        size = min(len(b), len(self._buffer))
+        b[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+
+class SpreadsheetReader(object):
+    """
+    Read an import file from storage chunk by chunk and yield its data rows in batches.
+    Every cell is returned as a string, empty cells as ''. row_numbers keeps the sheet row number
+    of every yielded row (blank rows are skipped).
+    """
+
+    def __init__(self, storage, file_path: str, columns: List[str], max_rows: int = None,
+                 batch_size: int = READ_BATCH_SIZE, local_path: str = None):
+        self.storage = storage
+        self.local_path = local_path
+        self.file_path = file_path
+        self.columns = columns
+        self.max_rows = max_rows
+        self.batch_size = batch_size
+        self.file_ext = file_path.split('.')[-1].lower()
+        self.row_numbers = []
+
+    def validate(self):
+        if self.file_ext not in SUPPORTED_EXTENSIONS:
+            raise CustomException(http_code=400, code=error_code.ERROR_045_FORMAT_FILE,
+                                  message=message.MESSAGE_045_FORMAT_FILE)
+        if self.local_path is None and not self.storage.check_file_name_exists(self.storage.bucket_name, self.file_path):
+            raise CustomException(http_code=400, code=error_code.ERROR_045_FORMAT_FILE,
+                                  message=message.MESSAGE_045_FORMAT_FILE)
+
+    def iter_batches(self) -> Iterator[List[List[str]]]:
+        self.validate()
+        if self.file_ext == 'csv':
+            # newline='': csv module tự xử lý xuống dòng, ô chứa \x0c, \x1c, \u2028... không bị tách dòng
+            rows = csv.reader(io.TextIOWrapper(io.BufferedReader(ChunkStream(self._iter_chunks())),
+                                               encoding='utf-8-sig', newline=''))
+        elif self.file_ext == 'xlsx':
+            rows = self._iter_xlsx_rows()
+        else:
+            rows = self._iter_xls_rows()
+
+        header_checked, total, batch = False, 0, []
+        for row_number, row in enumerate(rows, start=1):
+            if not header_checked:
+                self._check_template(row)
+                header_checked = True
+                continue
+            row = self._normalize_row(row)
+            if not any(row):
+                continue
+            total += 1
+            if self.max_rows is not None and total > self.max_rows:
+                raise CustomException(http_code=400, code=error_code.ERROR_139_FILE_WRONG_TEMPLATE,
+                                      message=message.MESSAGE_139_FILE_WRONG_TEMPLATE)
+            batch.append(row)
+            self.row_numbers.append(row_number)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if not header_checked:
+            raise CustomException(http_code=400, code=error_code.ERROR_139_FILE_WRONG_TEMPLATE,
+                                  message=message.MESSAGE_139_FILE_WRONG_TEMPLATE)
+        if batch:
+            yield batch
+
+    def _check_template(self, header: Iterable):
+        header = [cell for cell in header]
+        while header and self._to_str(header[-1]) == '':
+            header.pop()
+        if len(header) != len(self.columns):
+            raise CustomException(http_code=400, code=error_code.ERROR_139_FILE_WRONG_TEMPLATE,
+                                  message=message.MESSAGE_139_FILE_WRONG_TEMPLATE)
+
+    def _normalize_row(self, row: Iterable) -> List[str]:
+        row = [self._to_str(cell) for cell in row][:len(self.columns)]
+        row.extend([''] * (len(self.columns) - len(row)))
+        return row
+
+    @staticmethod
+    def _to_str(value) -> str:
+        if value is None:
+            return ''
+        if isinstance(value, float):
+            if value != value:  # NaN
+                return ''
+            if value.is_integer():
+                return str(int(value))
+        return str(value)
+
+    def _iter_chunks(self) -> Iterator[bytes]:
+        if self.local_path is None:
+            for chunk in self.storage.stream_object(self.file_path):
+                yield chunk
+            return
+        with open(self.local_path, 'rb') as file:
+            for chunk in iter(lambda: file.read(STREAM_CHUNK_SIZE), b''):
+                yield chunk
+
+    def _spool(self):
+        """
+        Excel files are zip archives and need random access, spool them to a temporary file
+        that only stays in memory while it is small
+        """
+        if self.local_path is not None:
+            return open(self.local_path, 'rb')
+        spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        for chunk in self.storage.stream_object(self.file_path):
+            spool.write(chunk)
+        spool.seek(0)
+        return spool
+
+    def download(self) -> str:
+        """
+        Stream the object to a local temporary file and return its path, the caller removes it
+        """
+        self.validate()
+        with tempfile.NamedTemporaryFile(suffix='.' + self.file_ext, delete=False) as file:
+            for chunk in self.storage.stream_object(self.file_path):
+                file.write(chunk)
+        return file.name
+
+    def _iter_xlsx_rows(self):
+        with self._spool() as spool:
+            workbook = load_workbook(spool, read_only=True, data_only=True)
+            try:
+                for row in workbook.worksheets[0].iter_rows(values_only=True):
+                    yield row
+            finally:
+                workbook.close()
+
+    def _iter_xls_rows(self):
+        # Legacy .xls has no streaming parser, fall back to pandas on the spooled file
+        with self._spool() as spool:
+            converters = {column: str for column in self.columns}
+            dfs = pd.read_excel(spool, sheet_name=0, converters=converters)
+        yield dfs.columns.tolist()
+        for row in dfs.itertuples(index=False, name=None):
+            yield row
+
+
+def read_local_file(local_path: str, file_path: str, columns: List[str], max_rows: int = None):
+    """
+    Parse a downloaded import file, used as a process pool task. Return (rows, row_numbers)
+    """
+    reader = SpreadsheetReader(storage=None, file_path=file_path, columns=columns, max_rows=max_rows,
+                               local_path=local_path)
+    rows = []
+    for batch in reader.iter_batches():
+        rows.extend(batch)
+    return rows, reader.row_numbers
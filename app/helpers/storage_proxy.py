@@ -0,0 +1,72 @@
+import logging
+import threading
+from typing import Callable, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger()
+
+
+class LazyStorage(object):
+    """
+    Build the storage handler on first use instead of at import time: a worker boots even when storage is down,
+    the first call (or warm_up) connects, and a failed construction is retried by the next call
+    """
+
+    def __init__(self, factory: Callable):
+        self._factory = factory
+        self._instance = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        instance = self._instance
+        if instance is None:
+            with self._lock:
+                instance = self._instance
+                if instance is None:
+                    instance = self._factory()
+                    self._instance = instance
+        return instance
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+    def _warm_up(self):
+        try:
+            self.get()
+            logger.info("Storage is ready")
+        except Exception as e:
+            logger.warning("Storage warm up failed, retry on first use: %s" % e)
+
+    def warm_up(self):
+        """
+        Connect in a background thread so that startup does not wait for (or fail on) storage
+        """
+        threading.Thread(target=self._warm_up, name='storage-warm-up', daemon=True).start()
+
+    def check_ready(self) -> Optional[str]:
+        """
+        None when storage answers, otherwise the error
+        """
+        try:
+            self.get().ping()
+            return None
+        except Exception as e:
+            logger.warning("Storage is not ready: %s" % e)
+            return str(e)
+
+
+class AsyncStorage(object):
+    """
+    Async facade for async routes: every storage call (including the lazy client construction) runs in the
+    threadpool, e.g. `await async_storage.put_object(...)`
+    """
+
+    def __init__(self, storage: LazyStorage):
+        self._storage = storage
+
+    def __getattr__(self, name):
+        async def call(*args, **kwargs):
+            return await run_in_threadpool(lambda: getattr(self._storage, name)(*args, **kwargs))
+
+        return call
@@ -0,0 +1,141 @@
+import logging
+from typing import AsyncIterator, Callable, IO, Iterable
+
+from fastapi import FastAPI
+from fastapi.routing import APIRoute
+from starlette.datastructures import UploadFile
+from starlette.formparsers import MultiPartParser
+from starlette.requests import Request
+
+from app.core import error_code, message
+from app.helpers.exception_handler import CustomException
+
+logger = logging.getLogger()
+
+MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+# Phần header / boundary của multipart ngoài nội dung file
+MULTIPART_OVERHEAD = 64 * 1024
+UPLOAD_PART_SIZE = 5 * 1024 * 1024  # Part nhỏ nhất của S3 multipart upload, là một bội số của 256 KB cho GCS
+ALLOWED_UPLOAD_EXTENSIONS = ('jpg', 'png', 'pdf', 'xlsx', 'xls', 'svg', 'doc', 'docx', 'rar', 'zip')
+
+
+def file_too_large() -> CustomException:
+    return CustomException(http_code=400, code=error_code.ERROR_100_FILE_TOO_LARGE,
+                           message=message.MESSAGE_100_FILE_TOO_LARGE)
+
+
+def normalize_upload_name(file_name: str, allowed_extensions: Iterable[str] = ALLOWED_UPLOAD_EXTENSIONS) -> str:
+    file_name = " ".join((file_name or '').strip().split())
+    if file_name.split('.')[-1].lower() not in allowed_extensions:
+        raise CustomException(http_code=400, code=error_code.ERROR_045_FORMAT_FILE,
+                              message=message.MESSAGE_045_FORMAT_FILE)
+    return file_name
+
+
+class SizeLimitedReader(object):
+    """
+    File-like wrapper that raises the file too large error as soon as more than max_size bytes are read
+    """
+
+    def __init__(self, raw: IO, max_size: int):
+        self.raw = raw
+        self.max_size = max_size
+        self.size = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.raw.read(size)
+        self.size += len(data)
+        if self.size > self.max_size:
+            raise file_too_large()
+        return data
+
+    def tell(self) -> int:
+        # GCS resumable upload đọc vị trí bắt đầu của stream
+        return self.size
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        # Dùng khi tính hash nội dung trước khi upload, đếm lại dung lượng từ vị trí mới
+        self.size = self.raw.seek(offset, whence)
+        return self.size
+
+
+async def _limit_stream(stream: AsyncIterator[bytes], max_size: int) -> AsyncIterator[bytes]:
+    total = 0
+    async for chunk in stream:
+        total += len(chunk)
+        if total > max_size:
+            raise file_too_large()
+        yield chunk
+
+
+async def receive_upload(request: Request, field_name: str = 'file', max_size: int = MAX_UPLOAD_SIZE) -> UploadFile:
+    """
+    Parse a multipart upload while it streams in: the Content-Length header is checked before reading the body
+    and the body is cut off once it exceeds the limit. The file part is spooled to a temporary file, so only
+    a small buffer stays in memory
+    """
+    content_length = request.headers.get('content-length')
+    if content_length and content_length.isdigit() and int(content_length) > max_size + MULTIPART_OVERHEAD:
+        raise file_too_large()
+
+    parser = MultiPartParser(request.headers, _limit_stream(request.stream(), max_size + MULTIPART_OVERHEAD))
+    try:
+        form = await parser.parse()
+    except CustomException as e:
+        raise e
+    except Exception as e:
+        # Body không phải multipart hợp lệ (thiếu boundary, bị cắt giữa chừng...)
+        logger.warning("Cannot parse multipart upload: %s" % e)
+        raise CustomException(http_code=400, code=error_code.ERROR_045_FORMAT_FILE,
+                              message=message.MESSAGE_045_FORMAT_FILE)
+    upload = form.get(field_name)
+    if not isinstance(upload, UploadFile):
+        raise CustomException(http_code=400, code=error_code.ERROR_045_FORMAT_FILE,
+                              message=message.MESSAGE_045_FORMAT_FILE)
+    for key, value in form.multi_items():
+        if isinstance(value, UploadFile) and value is not upload:
+            await value.close()
+    return upload
+
+
+def streamed_upload(field_name: str = 'file') -> Callable:
+    """
+    Mark a route that reads its multipart body itself with receive_upload, so the OpenAPI schema
+    still documents the file field (FastAPI only documents File() parameters)
+    """
+
+    def decorator(endpoint: Callable) -> Callable:
+        endpoint.upload_field_name = field_name
+        return endpoint
+
+    return decorator
+
+
+def document_streamed_uploads(application: FastAPI):
+    """
+    Add the multipart requestBody of the routes marked with streamed_upload to the OpenAPI schema
+    """
+    build_openapi = application.openapi
+
+    def openapi() -> dict:
+        if application.openapi_schema:
+            return application.openapi_schema
+        schema = build_openapi()
+        for route in application.routes:
+            field_name = getattr(getattr(route, 'endpoint', None), 'upload_field_name', None)
+            if not isinstance(route, APIRoute) or field_name is None:
+                continue
+            for method in route.methods:
+                operation = schema['paths'].get(route.path_format, {}).get(method.lower())
+                if operation is not None:
+                    operation['requestBody'] = {
+                        'required': True,
+                        'content': {'multipart/form-data': {'schema': {
+                            'type': 'object',
+                            'required': [field_name],
+                            'properties': {field_name: {'type': 'string', 'format': 'binary'}}
+                        }}}
+                    }
+        return schema
+
+    application.openapi = openapi
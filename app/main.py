@@ -8,8 +8,15 @@ from starlette.middleware.cors import CORSMiddleware
 from app.api import router
 from app.core.config import settings
 from app.db.base import vnlife_engine, pv_vnshop_ka_engine
+from app.helpers.api_handler import api_client
 from app.helpers.exception_handler import CustomException, http_exception_handler, fastapi_error_handler
+from app.helpers.minio_handler import storage
+from app.helpers.process_pool import process_pool
+from app.helpers.upload_stream import document_streamed_uploads
 from app.models import Base
+from app.services.srv_iam_outbox import iam_outbox_worker
+from app.services.srv_sync_scheduler import iam_sync_scheduler
+from app.services.srv_upload import presigned_upload_cleaner
 
 logging.config.fileConfig(settings.LOGGING_CONFIG_FILE, disable_existing_loggers=False)
 Base.metadata.create_all(bind=vnlife_engine)
@@ -33,8 +40,21 @@ def get_application(testing: bool = False) -> FastAPI:
     if testing is False:
         application.add_middleware(DBSessionMiddleware, db_url=settings.DATABASE_URL)
     application.include_router(router=router)
+    document_streamed_uploads(application)
     application.add_exception_handler(CustomException, http_exception_handler)
     application.add_exception_handler(Exception, fastapi_error_handler)
+    application.add_event_handler('shutdown', process_pool.shutdown)
+    application.add_event_handler('shutdown', api_client.close)
+    if testing is False:
+        application.add_event_handler('startup', storage.warm_up)
+    if testing is False and settings.IAM_OUTBOX_WORKER_ENABLED:
+        application.add_event_handler('startup', iam_outbox_worker.start)
+        application.add_event_handler('shutdown', iam_outbox_worker.stop)
+    if testing is False:
+        application.add_event_handler('startup', iam_sync_scheduler.start)
+        application.add_event_handler('shutdown', iam_sync_scheduler.stop)
+        application.add_event_handler('startup', presigned_upload_cleaner.start)
+        application.add_event_handler('shutdown', presigned_upload_cleaner.stop)
 
     return application
 
@@ -2,3 +2,7 @@
 # imported by Alembic
 from app.models.model_base import Base  # noqa
 from app.models.model_company import Company
+from app.models.model_sync_watermark import SyncWatermark
+from app.models.model_iam_outbox import IamOutbox
+from app.models.model_sync_run import SyncRun
+from app.models.model_presigned_upload import PresignedUpload
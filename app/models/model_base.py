@@ -19,5 +19,5 @@ class BareBaseModel(Base):
     __abstract__ = True
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    created_at = Column(DateTime, default=get_current_time())
-    updated_at = Column(DateTime, default=get_current_time(), onupdate=get_current_time())
+    created_at = Column(DateTime, default=get_current_time)
+    updated_at = Column(DateTime, default=get_current_time, onupdate=get_current_time)
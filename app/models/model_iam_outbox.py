@@ -0,0 +1,15 @@
+from sqlalchemy import Column, String, Text, Integer, DateTime, JSON
+
+from app.helpers.enums import IamOutboxStatus
+from app.models.model_base import BareBaseModel
+
+
+class IamOutbox(BareBaseModel):
+    event_type = Column(String, nullable=False, comment='loai su kien IAM')
+    email = Column(String, index=True, nullable=False, comment='email nhan vien')
+    payload = Column(JSON, nullable=False, comment='du lieu gui IAM')
+    idempotency_key = Column(String, index=True, nullable=False, comment='hash noi dung su kien')
+    status = Column(String, index=True, nullable=False, default=IamOutboxStatus.PENDING.value)
+    attempts = Column(Integer, nullable=False, default=0, comment='so lan da xu ly')
+    next_attempt_at = Column(DateTime, nullable=True, comment='thoi diem duoc xu ly lai')
+    last_error = Column(Text, nullable=True)
@@ -0,0 +1,12 @@
+from sqlalchemy import Column, String, DateTime
+
+from app.helpers.enums import PresignedUploadStatus
+from app.models.model_base import BareBaseModel
+
+
+class PresignedUpload(BareBaseModel):
+    tenant_id = Column(String, index=True, nullable=False, comment='tenant tren IAM')
+    email = Column(String, nullable=False, comment='email nguoi xin URL upload')
+    object_name = Column(String, unique=True, nullable=False, comment='ten object da cap URL')
+    status = Column(String, index=True, nullable=False, default=PresignedUploadStatus.PENDING.value)
+    expires_at = Column(DateTime, nullable=False, comment='thoi diem URL upload het han')
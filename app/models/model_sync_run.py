@@ -0,0 +1,21 @@
+from sqlalchemy import Column, String, Text, Integer, DateTime, Float
+
+from app.models.model_base import BareBaseModel
+
+
+class SyncRun(BareBaseModel):
+    tenant_id = Column(String, index=True, nullable=False, comment='tenant tren IAM')
+    sync_name = Column(String, nullable=False, comment='ten job dong bo')
+    trigger = Column(String, nullable=False, comment='manual / periodic')
+    status = Column(String, nullable=False, comment='running / success / failed')
+    full = Column(Integer, nullable=False, default=0, comment='1: quet toan bo')
+    started_at = Column(DateTime, nullable=False)
+    finished_at = Column(DateTime, nullable=True)
+    duration_seconds = Column(Float, nullable=True)
+    total = Column(Integer, nullable=False, default=0)
+    created = Column(Integer, nullable=False, default=0)
+    updated = Column(Integer, nullable=False, default=0)
+    unchanged = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    coalesced = Column(Integer, nullable=False, default=0, comment='so lan trigger duoc gop vao lan chay nay')
+    error = Column(Text, nullable=True)
@@ -0,0 +1,11 @@
+from sqlalchemy import Column, String, DateTime, UniqueConstraint
+
+from app.models.model_base import BareBaseModel
+
+
+class SyncWatermark(BareBaseModel):
+    __table_args__ = (UniqueConstraint('tenant_id', 'sync_name'),)
+
+    tenant_id = Column(String, nullable=False, comment='tenant tren IAM')
+    sync_name = Column(String, nullable=False, comment='ten job dong bo')
+    last_synced_at = Column(DateTime, nullable=False, comment='moc updated_at da dong bo xong')
@@ -1,6 +1,6 @@
 import typing
 from pathlib import Path
-from typing import Type, Any, Union
+from typing import Type, Any, Union, Dict, Optional
 
 from fastapi import UploadFile as UploadFileSource
 from pydantic import BaseModel, validator
@@ -40,6 +40,24 @@ class UploadFileResponse(BaseModel):
     url: str
 
 
+class PresignedUploadRequest(BaseModel):
+    file_name: str
+    content_type: Optional[str] = None
+
+
+class PresignedUploadResponse(BaseModel):
+    bucket_name: str
+    file_name: str
+    url: str
+    method: str
+    headers: Dict[str, str]
+    expires_in: int
+
+
+class UploadCompleteRequest(BaseModel):
+    file_name: str
+
+
 class DownloadFileRequest(BaseModel):
     relative_path: str
 
@@ -0,0 +1,56 @@
+from typing import Optional, List
+
+from pydantic import BaseModel, root_validator
+
+from app.core import error_code, message
+from app.helpers.enums import StaffImportMode
+from app.helpers.exception_handler import ValidateException
+from app.schemas.sche_base import MetadataSchema
+
+
+class StaffImportRequest(BaseModel):
+    company_id: int
+    file_path: str
+    mode: StaffImportMode = StaffImportMode.CREATE
+    only_error_rows: bool = False
+
+
+class StaffImportResponse(BaseModel):
+    total_rows: int
+    error_file_path: Optional[str] = None
+
+
+class StaffImportValidateRequest(BaseModel):
+    company_id: int
+    file_path: str
+    mode: StaffImportMode = StaffImportMode.CREATE
+    page: Optional[int] = 1
+    page_size: Optional[int] = 100
+
+    @root_validator()
+    def validate_data(cls, data):
+        page = data.get("page")
+        page_size = data.get("page_size")
+        if page is None or page <= 0:
+            raise ValidateException(
+                error_code.ERROR_003_PAGE_LARGE_THAN_0, message.MESSAGE_003_PAGE_LARGE_THAN_0)
+        if page_size is None or page_size <= 0 or page_size > 1000:
+            raise ValidateException(
+                error_code.ERROR_002_PAGE_SIZE_LARGE_THAN_0, message.MESSAGE_002_PAGE_SIZE_LARGE_THAN_0)
+        return data
+
+
+class StaffImportRowError(BaseModel):
+    row: int
+    column: Optional[str] = None
+    code: str
+    message: str
+
+
+class StaffImportValidateResponse(BaseModel):
+    file_path: str
+    total_rows: int
+    total_errors: int
+    is_valid: bool
+    errors: List[StaffImportRowError] = []
+    metadata: MetadataSchema
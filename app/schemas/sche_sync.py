@@ -0,0 +1,35 @@
+from datetime import datetime
+from typing import Optional, List
+
+from pydantic import BaseModel
+
+
+class SyncTriggerResponse(BaseModel):
+    started: bool
+    coalesced: bool
+
+
+class SyncRunResponse(BaseModel):
+    id: int
+    trigger: str
+    status: str
+    full: bool
+    started_at: datetime
+    finished_at: Optional[datetime]
+    duration_seconds: Optional[float]
+    total: int
+    created: int
+    updated: int
+    unchanged: int
+    failed: int
+    coalesced: int
+    error: Optional[str]
+
+    class Config:
+        orm_mode = True
+
+
+class SyncStatusResponse(BaseModel):
+    running: bool
+    last_run: Optional[SyncRunResponse]
+    runs: List[SyncRunResponse]
@@ -1,4 +1,5 @@
-from typing import List
+from collections import defaultdict
+from typing import Dict, List
 
 from fastapi_sqlalchemy import db
 from sqlalchemy.sql import func
@@ -13,7 +14,6 @@ from app.services.srv_base import BaseService
 
 
 class DepartmentService(BaseService):
-    list_children = []
 
     def __init__(self):
         super().__init__(Department)
@@ -71,15 +71,28 @@ class DepartmentService(BaseService):
 
         return root_departments
 
-    def get_children(self, node_department: Department, all_departments: List[Department]):
+    @staticmethod
+    def build_children_index(all_departments: List[Department]) -> Dict[int, List[Department]]:
+        """
+        parent_id -> children, built once so that every node finds its children without scanning all departments
+        """
+        children_index = defaultdict(list)
+        for department in all_departments:
+            children_index[department.parent_id].append(department)
+        return children_index
+
+    def get_children(self, node_department: Department, all_departments: List[Department],
+                     children_index: Dict[int, List[Department]] = None):
         """
         get children with tree
         """
-        children = list(filter(lambda department: department.parent_id == node_department.id, all_departments))
+        if children_index is None:
+            children_index = self.build_children_index(all_departments)
         children = [{
             'department': child,
-            'children': self.get_children(node_department=child, all_departments=all_departments)
-        } for child in children]
+            'children': self.get_children(node_department=child, all_departments=all_departments,
+                                          children_index=children_index)
+        } for child in children_index.get(node_department.id, [])]
 
         return children
 
@@ -101,39 +114,65 @@ class DepartmentService(BaseService):
         node_department['count_staffs'] = count_staff
         return children, count_staff
 
-    def get_list_children(self, node_department: Department, all_departments: List[Department]):
-        children = list(filter(lambda department: department.parent_id == node_department.id, all_departments))
-        for child in children:
-            self.list_children.append(child)
-            self.get_list_children(node_department=child, all_departments=all_departments)
-
-    def get_list_children_return(self, node_department: Department, all_departments: List[Department]) -> List:
+    def get_list_children(self, node_department: Department, all_departments: List[Department],
+                          children_index: Dict[int, List[Department]] = None) -> List:
+        """
+        All descendants of node_department (depth first, pre-order) in a new list on every call,
+        each department is visited once even if the parent data has a cycle
+        """
+        if children_index is None:
+            children_index = self.build_children_index(all_departments)
         list_children = []
-
-        def recursion(node_department: Department, all_departments: List[Department]):
-            nonlocal list_children
-            children = list(
-                filter(lambda department: department.parent_id == node_department.id, all_departments))
-            for child in children:
-                list_children.append(child)
-                recursion(node_department=child, all_departments=all_departments)
-
-        recursion(node_department=node_department, all_departments=all_departments)
+        visited = {node_department.id}
+        stack = list(reversed(children_index.get(node_department.id, [])))
+        while stack:
+            child = stack.pop()
+            if child.id in visited:
+                continue
+            visited.add(child.id)
+            list_children.append(child)
+            stack.extend(reversed(children_index.get(child.id, [])))
         return list_children
 
+    @staticmethod
+    def get_subtree_staffs(department_ids: List[int]) -> List[dict]:
+        """
+        Active staffs of all the given departments in one query, ordered by department like department_ids
+        """
+        rows = db.session.query(DepartmentStaff) \
+            .join(Staff, DepartmentStaff.staff_id == Staff.id) \
+            .filter(DepartmentStaff.department_id.in_(department_ids), DepartmentStaff.is_active == True) \
+            .filter(Staff.is_active) \
+            .with_entities(
+            DepartmentStaff.department_id,
+            Staff.id,
+            Staff.full_name,
+            Staff.staff_code,
+            Staff.email,
+            Staff.phone_number).all()
+        staffs_by_department = defaultdict(list)
+        for row in rows:
+            staff = row._asdict()
+            staffs_by_department[staff.pop('department_id')].append(staff)
+        return [staff for department_id in department_ids for staff in staffs_by_department[department_id]]
+
     @staticmethod
     def add_list_team(all_staffs):
-        all_staffs = [staff._asdict() for staff in all_staffs]
-        _query_team = db.session.query(Team).filter(
-            Team.is_active).join(StaffTeam)
-        for index, staff in enumerate(all_staffs):
-            teams = _query_team.filter(
-                StaffTeam.staff_id == staff["id"], StaffTeam.is_active).all()
-            staff["team"] = []
-            for team in teams:
-                staff["team"].append(
-                    {"team_id": team.id, "team_name": team.team_name})
-            all_staffs[index] = staff
+        """
+        Add the active teams of every staff, loaded with one query for all staffs
+        """
+        all_staffs = [staff if isinstance(staff, dict) else staff._asdict() for staff in all_staffs]
+        teams_by_staff = defaultdict(list)
+        staff_ids = {staff["id"] for staff in all_staffs}
+        if staff_ids:
+            teams = db.session.query(StaffTeam) \
+                .join(Team, StaffTeam.team_id == Team.id) \
+                .filter(StaffTeam.staff_id.in_(staff_ids), StaffTeam.is_active, Team.is_active) \
+                .with_entities(StaffTeam.staff_id, Team.id, Team.team_name).all()
+            for staff_id, team_id, team_name in teams:
+                teams_by_staff[staff_id].append({"team_id": team_id, "team_name": team_name})
+        for staff in all_staffs:
+            staff["team"] = list(teams_by_staff[staff["id"]])
         return all_staffs
 
     def get_detail(self, id: int):
@@ -159,16 +198,16 @@ class DepartmentService(BaseService):
         # department_data['count_staffs'] = staffs['count']
         # department_data['staff'] = [staff for staff in staffs['data']]
 
+        # Số query không phụ thuộc số phòng ban / nhân viên: cây phòng ban, nhân viên của cả cây, team của nhân viên
         all_departments = self.get_query_all_departments(company_id=department.company_id).all()
-        list_children = self.get_list_children_return(node_department=department, all_departments=all_departments)
-        list_children.append(department)
-        department_data['staff'] = []
-        for child in list_children:
-            staffs = self.get_staffs(department_id=child.id)
-            department_data['staff'].extend(staffs['data'])
+        children_index = self.build_children_index(all_departments)
+        list_children = self.get_list_children(node_department=department, all_departments=all_departments,
+                                               children_index=children_index)
+        department_ids = [child.id for child in list_children] + [department.id]
+        department_data['staff'] = self.add_list_team(all_staffs=self.get_subtree_staffs(department_ids))
         department_data['count_staffs'] = len(department_data['staff'])
-        department_data['staff'] = self.add_list_team(all_staffs=department_data['staff'])
-        department_data['children'] = self.get_children(node_department=department, all_departments=all_departments)
+        department_data['children'] = self.get_children(node_department=department, all_departments=all_departments,
+                                                        children_index=children_index)
 
         return department_data
 
@@ -249,15 +288,14 @@ class DepartmentService(BaseService):
                 raise CustomException(http_code=400,
                                       code=error_code.ERROR_108_PARENT_NOT_YOURSELF,
                                       message=message.MESSAGE_108_PARENT_NOT_YOURSELF)
-            self.list_children = []
             all_departments = self.get_query_all_departments(company_id=exits_department.company_id).all()
-            self.get_list_children(node_department=exits_department, all_departments=all_departments)
-            if req_data.parent_id in [child.id for child in self.list_children]:
+            list_children = self.get_list_children(node_department=exits_department, all_departments=all_departments)
+            if req_data.parent_id in {child.id for child in list_children}:
                 raise CustomException(http_code=400,
                                       code=error_code.ERROR_099_PARENT_ID_BELONG_TO_CHILD_DEPARTMENT,
                                       message=message.MESSAGE_099_PARENT_ID_BELONG_TO_CHILD_DEPARTMENT)
             if not req_data.is_active:
-                for child in self.list_children:
+                for child in list_children:
                     if child.count_staffs > 0:
                         raise CustomException(http_code=400,
                                               code=error_code.ERROR_096_CAN_NOT_DISABLE_DEPARTMENT_WHEN_CHILD_HAVE_STAFF,
@@ -279,7 +317,7 @@ class DepartmentService(BaseService):
                 db.session.query(RoleTitle).filter(RoleTitle.department_id == exits_department.id).update(
                     {"is_active": False})
                 # Khoa toan bo child department
-                department_ids = [child.id for child in self.list_children]
+                department_ids = [child.id for child in list_children]
                 department_ids.append(req_data.id)
                 if not self.lock_list_departments_action(department_ids=department_ids):
                     raise CustomException(http_code=400,
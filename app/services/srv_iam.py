@@ -1,15 +1,28 @@
-from typing import List
+import logging
+from typing import Dict, Iterator, List, Set, Union
 
 from fastapi import Request, HTTPException
 from requests.models import Response
 
 from app.core.config import settings
-from app.core.security import list_email_trust
+from app.core.security import list_email_trust, get_userinfo
 from app.helpers import generate
 from app.helpers.api_handler import call_api
-from app.helpers.exception_handler import CustomException
+from app.helpers.exception_handler import CustomException, ExceptionType
 from app.schemas.sche_staff import StaffIam
 
+logger = logging.getLogger()
+
+
+def get_authorization(request: Union[Request, str]) -> str:
+    """
+    Authorization header of the request, a token string is returned as is so the service
+    can be used outside of the request (background tasks, worker threads)
+    """
+    if isinstance(request, str):
+        return request
+    return request.headers["Authorization"]
+
 
 class IamService(object):
 
@@ -18,23 +31,25 @@ class IamService(object):
         self.all_role_sale_portal = [settings.SALE_ADMIN_ID, settings.SALE_ID,
                                      settings.SALE_LEADER_ID, settings.SALE_MANAGER_ID, settings.ADMINISTRATOR_ID]
 
-    def get_user_by_email(self, request: Request, email: str) -> Response:
+    def get_user_by_email(self, request: Union[Request, str], email: str) -> Response:
         url = self._api_endpoint + '/users'
         params = {
             'email': email
         }
         user_response = call_api(url=url,
-                                 params=params, token_iam=request.headers["Authorization"])
+                                 params=params, token_iam=get_authorization(request))
         return user_response
 
-    def get_id_by_email(self, request: Request, email: str) -> str:
+    def get_id_by_email(self, request: Union[Request, str], email: str) -> str:
         user_response = self.get_user_by_email(request=request, email=email)
-        items = user_response.json().get("items")
+        if user_response.status_code != 200:
+            return None
+        items = user_response.json().get("items") or []
         for item in items:
             if not item.get("revoked"):
                 return item.get("id")
 
-    def check_user_exist(self, request: Request, email: str):
+    def check_user_exist(self, request: Union[Request, str], email: str):
         user_response = self.get_user_by_email(request, email)
         if user_response.status_code != 200:
             return False
@@ -42,57 +57,126 @@ class IamService(object):
             return True
         return False
 
-    def create_user_iam(self, request: Request, user_create_request: StaffIam) -> str:
+    def create_user_iam(self, request: Union[Request, str], user_create_request: StaffIam) -> str:
         url = self._api_endpoint + '/users'
         data = {
             "name": user_create_request.full_name,
             "password": "12345678",
             "email": user_create_request.email,
             "phone_number": user_create_request.phone_number,
-            "tenant_id": "1"
+            "tenant_id": settings.IAM_TENANT_ID
         }
         reps = call_api(
-            url=url, method='post', token_iam=request.headers["Authorization"], data=data)
-        while reps.status_code // 100 > 2 and reps.json().get("error").get("code") == 1019:
+            url=url, method='post', token_iam=get_authorization(request), data=data)
+        attempts = 1
+        while reps.status_code // 100 > 2 and self._error_code(reps) == 1019 \
+                and attempts < settings.IAM_CREATE_USER_MAX_ATTEMPTS:
             data["phone_number"] = generate.generate_phone_number()
-            reps = call_api(url=url, method='post', token_iam=request.headers["Authorization"], data=data)
+            reps = call_api(url=url, method='post', token_iam=get_authorization(request), data=data)
+            attempts += 1
         if reps.status_code // 100 > 2:
             return None
         return reps.json().get("item").get("id")
 
-    def crud_roles(self, request: Request, role_ids: List[int], user_id: str, method: str):
+    @staticmethod
+    def _error_code(reps: Response):
+        try:
+            return (reps.json().get("error") or {}).get("code")
+        except ValueError:
+            return None
+
+    def crud_roles(self, request: Union[Request, str], role_ids: List[int], user_id: str, method: str):
         url = self._api_endpoint + f'/users/{user_id}/roles'
         data = {
             "user_id": user_id,
             "role_ids": role_ids
         }
-        call_api(
-            url=url, method=method, token_iam=request.headers["Authorization"], data=data)
-
-    def get_role_user(self, request: Request, user_id: str):
+        reps = call_api(
+            url=url, method=method, token_iam=get_authorization(request), data=data)
+        if reps.status_code // 100 != 2:
+            logger.warning("Cannot %s roles %s of IAM user %s, status code: %s" % (
+                method, role_ids, user_id, reps.status_code))
+            raise CustomException(http_code=ExceptionType.MS_UNAVAILABLE.http_code,
+                                  code=ExceptionType.MS_UNAVAILABLE.code,
+                                  message=ExceptionType.MS_UNAVAILABLE.message)
+
+    def get_role_user(self, request: Union[Request, str], user_id: str):
         url = self._api_endpoint + f'/users/{user_id}/roles'
         params = {
             "user_id": user_id,
         }
-        reps = call_api(url=url, token_iam=request.headers["Authorization"], params=params)
+        reps = call_api(url=url, token_iam=get_authorization(request), params=params)
         return reps.json()
 
-    def del_all_role(self, request: Request, user_id: str):
+    def _iter_pages(self, request: Union[Request, str], url: str, params: dict = None) -> Iterator[dict]:
+        page, page_size = 1, settings.IAM_PAGE_SIZE
+        while True:
+            reps = call_api(url=url, token_iam=get_authorization(request),
+                            params=dict(params or {}, page=page, pageSize=page_size))
+            if reps.status_code != 200:
+                raise CustomException(http_code=ExceptionType.MS_UNAVAILABLE.http_code,
+                                      code=ExceptionType.MS_UNAVAILABLE.code,
+                                      message=ExceptionType.MS_UNAVAILABLE.message)
+            items = reps.json().get("items") or []
+            for item in items:
+                yield item
+            if len(items) < page_size:
+                return
+            page += 1
+
+    def get_user_directory(self, request: Union[Request, str]) -> Dict[str, dict]:
+        """
+        Page through IAM users and the members of every sale portal role once,
+        return {email: {'id': user id, 'role_ids': set of sale portal role ids}}
+        """
+        directory, emails_by_id = {}, {}
+        for item in self._iter_pages(request, self._api_endpoint + '/users'):
+            if item.get("revoked") or not item.get("email") or item.get("email") in directory:
+                continue
+            directory[item["email"]] = {'id': item.get("id"), 'role_ids': set()}
+            emails_by_id[item.get("id")] = item["email"]
+
+        for role_id in set(self.all_role_sale_portal):
+            for item in self._iter_pages(request, self._api_endpoint + f'/roles/{role_id}/users'):
+                email = item.get("email") or emails_by_id.get(item.get("id"))
+                if email in directory:
+                    directory[email]['role_ids'].add(role_id)
+        return directory
+
+    def del_all_role(self, request: Union[Request, str], user_id: str):
         self.crud_roles(request, role_ids=self.all_role_sale_portal,
                         user_id=user_id, method='delete')
 
-    def update_role(self, request: Request, role_ids: List[int], user_id: str):
-        self.del_all_role(request=request, user_id=user_id)
-
-        self.crud_roles(request=request, role_ids=role_ids,
-                        user_id=user_id, method='post')
+    def get_role_ids(self, request: Union[Request, str], user_id: str) -> Set[int]:
+        return {role.get("id") for role in self.get_role_user(request, user_id).get("items") or []}
+
+    def reconcile_roles(self, request: Union[Request, str], user_id: str, role_ids: List[int],
+                        current_role_ids: Set[int] = None) -> bool:
+        """
+        Send only the sale portal roles to add and to remove, return False when nothing changed.
+        New roles are added before old ones are removed so the user is never left without a role:
+        a failed call raises, the roles are not removed when adding failed
+        """
+        if current_role_ids is None:
+            current_role_ids = self.get_role_ids(request, user_id)
+        desired = {role_id for role_id in role_ids if role_id is not None}
+        current = set(current_role_ids) & set(self.all_role_sale_portal)
+        to_add, to_remove = desired - set(current_role_ids), current - desired
+        if to_add:
+            self.crud_roles(request=request, role_ids=sorted(to_add), user_id=user_id, method='post')
+        if to_remove:
+            self.crud_roles(request=request, role_ids=sorted(to_remove), user_id=user_id, method='delete')
+        return bool(to_add or to_remove)
+
+    def update_role(self, request: Union[Request, str], role_ids: List[int], user_id: str,
+                    current_role_ids: Set[int] = None) -> bool:
+        return self.reconcile_roles(request=request, role_ids=role_ids, user_id=user_id,
+                                    current_role_ids=current_role_ids)
 
     def validate_user_can_create_user(self, request: Request):
         if not request.headers.get("Authorization"):
             raise HTTPException(status_code=403, detail="Not Authorization")
-        resp = call_api(url=settings.AUTHENTICATION_SERVICE + "/userinfo",
-                        token_iam=request.headers["Authorization"])
-        resp = resp.json()
+        resp = get_userinfo(request.headers["Authorization"])
         # if 'email' not in resp or not resp['email'] or resp['email'] == '':
         # raise CustomException(
         # code=, detail="Không Lấy được thông tin nhân viên trên IAM")
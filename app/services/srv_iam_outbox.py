@@ -0,0 +1,220 @@
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import or_, and_
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.base import SessionLocal
+from app.helpers.enums import IamOutboxEvent, IamOutboxStatus
+from app.helpers.time_helper import get_current_time
+from app.models import IamOutbox
+from app.schemas.sche_staff import StaffIamUploadFile
+from app.services.srv_iam import IamService
+from app.services.srv_synchronized import IamSyncEngine, get_role_id_iam
+
+logger = logging.getLogger()
+
+
+def idempotency_key(event_type: IamOutboxEvent, staff: StaffIamUploadFile) -> str:
+    content = '\x1f'.join([event_type.value, staff.email or '', staff.full_name or '', staff.phone_number or '',
+                           staff.role or ''])
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+def enqueue_iam_events(session: Session, event_type: IamOutboxEvent, staffs: List[StaffIamUploadFile]):
+    """
+    Add IAM events to the session, they are committed together with the staff change.
+    An event identical to one still waiting in the outbox is not added again
+    """
+    events = {}
+    for staff in staffs:
+        events[idempotency_key(event_type, staff)] = staff
+    if not events:
+        return
+    waiting = {key for key, in session.query(IamOutbox.idempotency_key).filter(
+        IamOutbox.idempotency_key.in_(list(events.keys())),
+        IamOutbox.status.in_([IamOutboxStatus.PENDING.value, IamOutboxStatus.PROCESSING.value])).all()}
+    now = get_current_time()
+    session.bulk_insert_mappings(IamOutbox, [{
+        'event_type': event_type.value,
+        'email': staff.email,
+        'payload': staff.dict(),
+        'idempotency_key': key,
+        'status': IamOutboxStatus.PENDING.value,
+        'attempts': 0,
+        'next_attempt_at': now,
+        'created_at': now,
+        'updated_at': now
+    } for key, staff in events.items() if key not in waiting])
+
+
+class IamOutboxWorker(object):
+    """
+    Drain the IAM outbox: claim a batch with SELECT ... FOR UPDATE SKIP LOCKED (safe with several API workers),
+    keep only the latest event of every email, apply them with a bounded thread pool and retry failures with
+    exponential backoff until max_attempts. Events stuck in processing longer than the lease are claimed again.
+    Claimed events are copied to plain dicts and the session is closed before calling IAM, the results are
+    written back with a new session. Without start() (tests, one-off drains) events are handled in the calling
+    thread.
+    """
+
+    def __init__(self, batch_size: int = None, concurrency: int = None, max_attempts: int = None,
+                 poll_seconds: float = None, lease_seconds: int = None):
+        self.batch_size = batch_size or settings.IAM_OUTBOX_BATCH_SIZE
+        self.concurrency = concurrency or settings.IAM_OUTBOX_CONCURRENCY
+        self.max_attempts = max_attempts or settings.IAM_OUTBOX_MAX_ATTEMPTS
+        self.poll_seconds = poll_seconds or settings.IAM_OUTBOX_POLL_SECONDS
+        self.lease_seconds = lease_seconds or settings.IAM_OUTBOX_LEASE_SECONDS
+        self.engine = IamSyncEngine(iam_srv=IamService(), token=settings.IAM_SERVICE_TOKEN)
+        self._executor = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def claim(self) -> List[dict]:
+        session = SessionLocal()
+        try:
+            now = get_current_time()
+            events = session.query(IamOutbox).filter(or_(
+                and_(IamOutbox.status == IamOutboxStatus.PENDING.value, IamOutbox.next_attempt_at <= now),
+                and_(IamOutbox.status == IamOutboxStatus.PROCESSING.value,
+                     IamOutbox.updated_at <= now - timedelta(seconds=self.lease_seconds))
+            )).order_by(IamOutbox.id.asc()).limit(self.batch_size).with_for_update(skip_locked=True).all()
+            # Copy ra dict trước khi commit: commit làm expire các object
+            claimed = [{
+                'id': event.id,
+                'event_type': event.event_type,
+                'email': event.email,
+                'payload': event.payload,
+                'attempts': event.attempts
+            } for event in events]
+            for event in events:
+                event.status = IamOutboxStatus.PROCESSING.value
+                event.updated_at = now
+            session.commit()
+            return claimed
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def handle(self, event_type: str, staff: StaffIamUploadFile):
+        if event_type == IamOutboxEvent.SYNC_STAFF.value:
+            if self.engine.sync_staff(staff) == 'failed':
+                raise Exception("Cannot create IAM user %s" % staff.email)
+            return
+        user_id = self.engine.iam_srv.get_id_by_email(self.engine.token, staff.email)
+        if user_id is None:
+            return
+        if event_type == IamOutboxEvent.REMOVE_ROLE.value:
+            self.engine.iam_srv.reconcile_roles(self.engine.token, user_id=user_id, role_ids=[])
+        else:
+            self.engine.iam_srv.update_role(self.engine.token, role_ids=[get_role_id_iam(staff.role)],
+                                            user_id=user_id)
+
+    def _handle_safe(self, event_type: str, staff: StaffIamUploadFile):
+        """
+        Error message of the event, None when it succeeded
+        """
+        try:
+            self.handle(event_type, staff)
+        except Exception as e:
+            return getattr(e, 'message', None) or str(e) or e.__class__.__name__
+        return None
+
+    def process(self, events: List[dict]) -> Dict[int, Optional[str]]:
+        """
+        Handle the latest event of every email, return the error of each handled event id
+        """
+        # Chỉ xử lý event mới nhất của mỗi email, event cũ hơn coi như đã xong
+        latest = {}
+        for event in events:
+            latest[event['email']] = event
+        need_create = {event['email'] for event in events if event['event_type'] == IamOutboxEvent.SYNC_STAFF.value}
+        tasks = {}
+        for email, event in latest.items():
+            event_type = event['event_type']
+            if email in need_create and event_type != IamOutboxEvent.REMOVE_ROLE.value:
+                event_type = IamOutboxEvent.SYNC_STAFF.value
+            tasks[event['id']] = (event_type, StaffIamUploadFile(**event['payload']))
+
+        executor = self._executor
+        if executor is None:
+            return {event_id: self._handle_safe(*task) for event_id, task in tasks.items()}
+        futures = {event_id: executor.submit(self._handle_safe, *task) for event_id, task in tasks.items()}
+        return {event_id: future.result() for event_id, future in futures.items()}
+
+    def save_results(self, events: List[dict], errors: Dict[int, Optional[str]]):
+        now = get_current_time()
+        mappings = []
+        for event in events:
+            mapping = {'id': event['id'], 'updated_at': now}
+            mappings.append(mapping)
+            if event['id'] not in errors:  # đã có event mới hơn của cùng email
+                mapping['status'] = IamOutboxStatus.DONE.value
+                continue
+            error = errors[event['id']]
+            mapping['attempts'] = event['attempts'] + 1
+            mapping['last_error'] = error
+            if error is None:
+                mapping['status'] = IamOutboxStatus.DONE.value
+            elif mapping['attempts'] >= self.max_attempts:
+                mapping['status'] = IamOutboxStatus.FAILED.value
+                logger.warning("IAM outbox event %s failed after %s attempts: %s" % (
+                    event['id'], mapping['attempts'], error))
+            else:
+                mapping['status'] = IamOutboxStatus.PENDING.value
+                mapping['next_attempt_at'] = now + timedelta(seconds=min(2 ** mapping['attempts'], 15 * 60))
+        session = SessionLocal()
+        try:
+            session.bulk_update_mappings(IamOutbox, mappings)
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def drain_once(self) -> int:
+        try:
+            events = self.claim()
+            if not events:
+                return 0
+            self.save_results(events, self.process(events))
+            logger.info("IAM outbox: %s events processed" % len(events))
+            return len(events)
+        except Exception as e:
+            logger.error("IAM outbox drain failed: %s" % e)
+            return 0
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            if self.drain_once() < self.batch_size:
+                self._stop.wait(self.poll_seconds)
+
+    def start(self):
+        if not settings.IAM_SERVICE_TOKEN:
+            logger.error("IAM_SERVICE_TOKEN is empty, IAM outbox worker is not started")
+            return
+        if self._thread is None:
+            self._stop.clear()
+            self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='iam-outbox')
+            self._thread = threading.Thread(target=self.run_forever, name='iam-outbox-worker', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_seconds + 5)
+            self._thread = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+iam_outbox_worker = IamOutboxWorker()
@@ -1,12 +1,10 @@
 import collections
-import copy
-import io
-from io import BytesIO
-from typing import Dict, List, Any
+import logging
+import os
+import tempfile
+from typing import Dict, List, Any, Tuple
 
 import numpy as np
-import pandas as pd
-from fastapi import BackgroundTasks
 from fastapi_sqlalchemy import db
 from pydantic.networks import EmailStr
 from requests.sessions import Request
@@ -14,37 +12,104 @@ from sqlalchemy.orm import aliased
 from sqlalchemy.sql.elements import or_
 
 from app.core import error_code, message
-from app.helpers.enums import StaffContractType, AlgorithmsParentNode
+from app.core.config import settings
+from app.helpers.cache import TTLCache
+from app.helpers.constant import COLUMNS, COLUMNS_ERROR, MAX_UPLOAD_ROWS, FULL_NAME, STAFF_CODE, EMAIL, PHONE, \
+    DEPARTMENT_ID, TITLE_NAME, TEAM_NAME, LINE_MANAGER_EMAIL, ERROR
+from app.helpers.enums import StaffContractType, AlgorithmsParentNode, StaffImportMode, IamOutboxEvent
+from app.helpers.error_file_writer import write_error_file
 from app.helpers.exception_handler import CustomException
-from app.helpers.minio_handler import storage, GoogleCloudHandler
+from app.helpers.minio_handler import storage
 from app.helpers.paging import Page, paginate
+from app.helpers.process_pool import process_pool, merge_ranges
+from app.helpers.spreadsheet_reader import SpreadsheetReader, read_local_file
 from app.helpers.time_helper import get_current_time
 from app.helpers.validate import validate_email, validate_phone
 from app.models import Department, Company, Staff, DepartmentStaff, Team, StaffTeam, CompanyStaff, RoleTitle, Base
+from app.schemas.sche_base import MetadataSchema
 from app.schemas.sche_department import DepartmentUpdateStaffRequest
 from app.schemas.sche_staff import DepartmentStaffItem, ManagerStaffItem, StaffCreateUpdateRequest, StaffItemResponse, \
     StaffListRequest, StaffUploadFileRequest, StaffDetailResponse, ChildrenDetail, StaffIamUploadFile
+from app.schemas.sche_staff_import import StaffImportValidateRequest, StaffImportValidateResponse, StaffImportRowError
 from app.services.srv_base import BaseService
 from app.services.srv_department import DepartmentService
 from app.services.srv_iam import IamService
+from app.services.srv_iam_outbox import enqueue_iam_events
 from app.services.srv_role_title import role_title_service
-from app.services.srv_synchronized import synchronized_upload_excel
+from app.services.srv_staff_bulk_load import StaffBulkLoader
+from app.services.srv_staff_roster import StaffRosterSync
 from app.services.srv_team import TeamService
 
-COLUMNS = ['Fullname', 'StaffCode', 'Email', 'Phone', 'DepartmentID',
-           'DepartmentName', 'TitleName', 'TeamName', 'LineManagerEmail']
-COLUMNS_ERROR = ['Fullname', 'StaffCode', 'Email', 'Phone', 'DepartmentID',
-                 'DepartmentName', 'TitleName', 'TeamName', 'LineManagerEmail', 'DS lỗi (xóa cột này khi import)']
-FULL_NAME = 0
-STAFF_CODE = 1
-EMAIL = 2
-PHONE = 3
-DEPARTMENT_ID = 4
-DEPARTMENT_NAME = 5
-TITLE_NAME = 6
-TEAM_NAME = 7
-LINE_MANAGER_EMAIL = 8
-ERROR = 9
+logger = logging.getLogger()
+
+# Lỗi import: message -> (mã lỗi, cột gây ra lỗi)
+UPLOAD_ERRORS = {
+    'Tên không được để trống': ('FULL_NAME_REQUIRED', FULL_NAME),
+    'Staff Code không được để trống': ('STAFF_CODE_REQUIRED', STAFF_CODE),
+    'Staff Code bị duplicate': ('STAFF_CODE_DUPLICATE', STAFF_CODE),
+    'Staff Code đã tồn tại trong hệ thống': ('STAFF_CODE_EXISTS', STAFF_CODE),
+    'Email không được để trống': ('EMAIL_REQUIRED', EMAIL),
+    'Email sai định dạng ': ('EMAIL_INVALID', EMAIL),
+    'Email bị duplicate': ('EMAIL_DUPLICATE', EMAIL),
+    'Email đã tồn tại trong hệ thống': ('EMAIL_EXISTS', EMAIL),
+    'Số điện thoại sai định dạng': ('PHONE_INVALID', PHONE),
+    'DepartmentID lỗi định dạng hoặc không được bỏ trống': ('DEPARTMENT_ID_INVALID', DEPARTMENT_ID),
+    'DepartmentID không tồn tại hoặc đang bị khóa': ('DEPARTMENT_NOT_FOUND', DEPARTMENT_ID),
+    'Title Name sai định dạng hoặc không được bỏ trống': ('TITLE_NAME_REQUIRED', TITLE_NAME),
+    'Title Name không tồn tại hoặc đã bị khóa': ('TITLE_NAME_NOT_FOUND', TITLE_NAME),
+    'Title Name không thuộc phòng ban': ('TITLE_NAME_NOT_IN_DEPARTMENT', TITLE_NAME),
+    'Team Name không tồn tại hoặc đã bị khóa': ('TEAM_NAME_NOT_FOUND', TEAM_NAME),
+    'Line Manager Email trùng Staff email': ('LINE_MANAGER_IS_SELF', LINE_MANAGER_EMAIL),
+    'Email quản lý sai định dạng': ('LINE_MANAGER_EMAIL_INVALID', LINE_MANAGER_EMAIL),
+    'Line Manager Email không tồn tại trong file và trong hệ thống': ('LINE_MANAGER_NOT_FOUND', LINE_MANAGER_EMAIL),
+    'Line Manager Email không đưọc dưới quyền của nhân viên': ('LINE_MANAGER_IS_SUBORDINATE', LINE_MANAGER_EMAIL),
+}
+UPLOAD_ERROR_COLUMNS = {error: column for error, (_, column) in UPLOAD_ERRORS.items()}
+# Các dòng đã parse của file import kèm lỗi không phụ thuộc DB, key: (file_path, etag)
+# Mỗi entry giữ tối đa MAX_UPLOAD_ROWS dòng nên giới hạn số file
+upload_validation_cache = TTLCache(max_size=16, ttl=settings.UPLOAD_VALIDATION_CACHE_SECONDS)
+
+
+def manager_links(data_rows: list) -> List[Tuple[str, str]]:
+    """
+    (email, line manager email) of every row, the only columns needed to walk the manager tree
+    """
+    return [(row[EMAIL].strip(), row[LINE_MANAGER_EMAIL].strip()) for row in data_rows]
+
+
+def manager_children_index(links: List[Tuple[str, str]]) -> Dict[str, List[Tuple[int, str]]]:
+    children_index = {}
+    for index, (email, manager_email) in enumerate(links):
+        if manager_email != '':
+            children_index.setdefault(manager_email, []).append((index, email))
+    return children_index
+
+
+def find_subordinate_manager_rows(links: List[Tuple[str, str]], start: int,
+                                  children_index: Dict[str, List[Tuple[int, str]]]) -> List[int]:
+    """
+    Indexes of the rows of the slice links (row start onwards) whose line manager is one of their own
+    subordinates in the file. Pure function so it can run on the process pool.
+    """
+    result = []
+    for offset, (email, manager_email) in enumerate(links):
+        if manager_email == '':
+            continue
+        index = start + offset
+        visited, stack, found = set(), [email], False
+        while stack and not found:
+            for child_index, child_email in children_index.get(stack.pop(), []):
+                if child_index == index:  # bỏ qua chính dòng hiện tại
+                    continue
+                if child_email == manager_email:
+                    found = True
+                    break
+                if child_email not in visited:
+                    visited.add(child_email)
+                    stack.append(child_email)
+        if found:
+            result.append(index)
+    return result
 
 
 class StaffService(BaseService):
@@ -118,8 +183,7 @@ class StaffService(BaseService):
         )
         db.session.add(new_department_staff)
 
-    def create(self, request: Request, staff_create_request: StaffCreateUpdateRequest,
-               background_tasks: BackgroundTasks):
+    def create(self, request: Request, staff_create_request: StaffCreateUpdateRequest):
         if len(staff_create_request.companies) < 1:
             raise CustomException(
                 http_code=400, error_code='140', message='Chưa chọn company chính')
@@ -170,9 +234,13 @@ class StaffService(BaseService):
 
         role_title_id = staff_create_request.department.role_title_id
         if role_title_service.check_role_in_VNNG(role_title_id):
-            iam_srv = IamService()
-            iam_srv.validate_user_can_create_user(request)
-            background_tasks.add_task(self.create_role_user, request, iam_srv, staff_create_request, role_title_id)
+            IamService().validate_user_can_create_user(request)
+            enqueue_iam_events(db.session, IamOutboxEvent.SYNC_STAFF, [StaffIamUploadFile(
+                full_name=staff_create_request.full_name,
+                email=staff_create_request.email,
+                phone_number=staff_create_request.phone_number,
+                role=role_title_service.get_role_name(role_title_id)
+            )])
 
         try:
             db.session.commit()
@@ -182,22 +250,6 @@ class StaffService(BaseService):
                 http_code=400, code=error_code.ERROR_999_SERVER, message=message.MESSAGE_999_SERVER)
         return new_staff.id
 
-    def create_role_user(self, request: Request, iam_srv: IamService, staff_create_request: StaffCreateUpdateRequest,
-                         role_title_id):
-        user_id = iam_srv.create_user_iam(request=request, user_create_request=staff_create_request)
-        if user_id is None:
-            user_id = iam_srv.get_id_by_email(request=request, email=staff_create_request.email)
-        role_ids = [role_title_service.get_id_role_in_iam(role_title_id)]
-        iam_srv.update_role(request, role_ids=role_ids, user_id=user_id)
-
-    def update_role_user(self, request: Request, iam_srv: IamService, user_create_request: StaffCreateUpdateRequest,
-                         email: str):
-        user_id = iam_srv.get_id_by_email(request=request, email=email)
-        if user_id:
-            role_title_id = user_create_request.department.role_title_id
-            role_ids = [role_title_service.get_id_role_in_iam(role_title_id)]
-            iam_srv.update_role(request, role_ids=role_ids, user_id=user_id)
-
     def _validate_create(self, data: StaffCreateUpdateRequest):
 
         # validate email
@@ -320,8 +372,7 @@ class StaffService(BaseService):
 
         db.session.add_all(res)
 
-    def update(self, request: Request, staff_update_request: StaffCreateUpdateRequest,
-               background_tasks: BackgroundTasks):
+    def update(self, request: Request, staff_update_request: StaffCreateUpdateRequest):
         staff = self._get_by_id(id=staff_update_request.id)
         if not staff:
             raise CustomException(http_code=400, code=error_code.ERROR_134_STAFF_ID_NOT_FOUND,
@@ -353,8 +404,12 @@ class StaffService(BaseService):
 
             role_title_id = staff_update_request.department.role_title_id
             if role_title_service.check_role_in_VNNG(role_title_id):
-                iam_srv = IamService()
-                background_tasks.add_task(self.update_role_user, request, iam_srv, staff_update_request, staff.email)
+                enqueue_iam_events(db.session, IamOutboxEvent.UPDATE_ROLE, [StaffIamUploadFile(
+                    full_name=staff.full_name,
+                    email=staff.email,
+                    phone_number=staff.phone_number,
+                    role=role_title_service.get_role_name(role_title_id)
+                )])
 
         # check delete staff
         if staff_update_request.is_active == False:
@@ -814,89 +869,160 @@ class StaffService(BaseService):
                 return False
         return True
 
-    def upload_excel(self,request, req_data: StaffUploadFileRequest, background_tasks: BackgroundTasks):
+    def upload_excel(self, request, req_data: StaffUploadFileRequest, mode: StaffImportMode = StaffImportMode.CREATE,
+                     only_error_rows: bool = False):
+        """
+        CREATE: every row is a new staff.
+        SYNC: the file is the full roster of the company, rows are diffed against the current staff and only
+        inserts, updates and deactivations are applied.
+        only_error_rows: the error file only contains the rows that failed validation
+        """
         self._check_company_exists(company_id=req_data.company_id)
-        dfs, self.total_columns = self._upload_excel_read_file(
-            file_path=req_data.file_path)
-        data_rows = dfs.values.tolist()
-        data_rows = self._upload_excel_validate_full_name(data_rows=data_rows)
-        data_rows = self._upload_excel_validate_staff_code(data_rows=data_rows)
-        data_rows = self._upload_excel_validate_staffs(data_rows=data_rows)
-        data_rows = self._upload_excel_validate_phone(data_rows=data_rows)
-        data_rows = self._upload_excel_validate_departments(
-            data_rows=data_rows)
-        data_rows = self._upload_excel_validate_role_name(data_rows=data_rows)
-        data_rows = self._upload_excel_validate_team_name(
-            company_id=req_data.company_id, data_rows=data_rows)
-        data_rows = self._upload_excel_validate_line_manager(
-            company_id=req_data.company_id, data_rows=data_rows)
+        roster_sync, roster = None, None
+        if mode == StaffImportMode.SYNC:
+            roster_sync = StaffRosterSync(session=db.session, company_id=req_data.company_id)
+            roster = roster_sync.load_roster()
+        data_rows, _, cache_key = self._upload_excel_load_rows(
+            company_id=req_data.company_id, file_path=req_data.file_path, roster=roster)
 
         if self.is_upload_excel(data_rows):
-            self._insert_staff_data(
-                company_id=req_data.company_id, data=dfs.values.tolist())
+            changed_rows = data_rows
+            if roster_sync is None:
+                self._insert_staff_data(
+                    company_id=req_data.company_id, data=data_rows)
+            else:
+                inserts, updates, deactivations, unchanged = roster_sync.diff(data_rows=data_rows)
+                self._insert_staff_data(company_id=req_data.company_id, data=inserts)
+                roster_sync.apply_updates(updates=updates)
+                roster_sync.apply_deactivations(staff_ids=deactivations)
+                changed_rows = inserts + [row for row, _ in updates]
+                logger.info("Sync roster company %s: %s inserted, %s updated, %s deactivated, %s unchanged" % (
+                    req_data.company_id, len(inserts), len(updates), len(deactivations), unchanged))
+            enqueue_iam_events(db.session, IamOutboxEvent.SYNC_STAFF, [StaffIamUploadFile(
+                full_name=staff[FULL_NAME],
+                email=staff[EMAIL],
+                phone_number=staff[PHONE],
+                role=staff[TITLE_NAME]
+            ) for staff in changed_rows])
             db.session.commit()
-            staffs = []
-            for staff in data_rows:
-                staffs.append(StaffIamUploadFile(
-                    full_name=staff[FULL_NAME],
-                    email=staff[EMAIL],
-                    phone_number=staff[PHONE],
-                    role=staff[TITLE_NAME]
-                ))
-            background_tasks.add_task(synchronized_upload_excel, request, staffs)
+            upload_validation_cache.delete(cache_key)
             return len(data_rows), None
         else:
             data_file = self._upload_excel_write_error_file(
-                list_data=data_rows)
+                list_data=data_rows, only_error_rows=only_error_rows)
             return len(data_rows), data_file['file_name']
 
-    @staticmethod
-    def _upload_excel_read_file(file_path: str):
-        minio_client = storage
+    def validate_upload_excel(self, req_data: StaffImportValidateRequest) -> StaffImportValidateResponse:
+        """
+        Dry run of upload_excel: validate the file and return the errors of each row as JSON,
+        nothing is written to the database or to storage
+        """
+        self._check_company_exists(company_id=req_data.company_id)
+        roster = None
+        if req_data.mode == StaffImportMode.SYNC:
+            roster = StaffRosterSync(session=db.session, company_id=req_data.company_id).load_roster()
+        data_rows, row_numbers, _ = self._upload_excel_load_rows(
+            company_id=req_data.company_id, file_path=req_data.file_path, roster=roster)
+
+        errors = []
+        for index, row in enumerate(data_rows):
+            if len(row) <= ERROR:
+                continue
+            code, column = UPLOAD_ERRORS.get(row[ERROR], ('UNKNOWN', None))
+            errors.append(StaffImportRowError(
+                row=row_numbers[index],
+                column=COLUMNS[column] if column is not None else None,
+                code=code,
+                message=row[ERROR]
+            ))
+        start = req_data.page_size * (req_data.page - 1)
+        return StaffImportValidateResponse(
+            file_path=req_data.file_path,
+            total_rows=len(data_rows),
+            total_errors=len(errors),
+            is_valid=len(errors) == 0,
+            errors=errors[start:start + req_data.page_size],
+            metadata=MetadataSchema(
+                current_page=req_data.page,
+                page_size=req_data.page_size,
+                total_items=len(errors)
+            )
+        )
 
-        file_ext = file_path.split('.')[-1]
-        if file_ext.lower() not in ('xlsx', 'xls', 'csv'):
-            raise CustomException(http_code=400, code=error_code.ERROR_045_FORMAT_FILE,
-                                  message=message.MESSAGE_045_FORMAT_FILE)
-        column_names = COLUMNS
-        converters = {column: str for column in column_names}
+    def _upload_excel_load_rows(self, company_id: int, file_path: str, roster: dict = None):
+        """
+        Read and validate the rows of the file. The file is streamed from storage, but the rows are collected
+        in memory (at most MAX_UPLOAD_ROWS) because duplicates and line managers are checked across rows.
+        The parsed rows and the checks that only depend on the file (full name, phone) are cached by object key
+        and ETag, so a file that was already validated (e.g. by a dry run) is not read again. The checks against
+        the database always run: staff, departments, role titles or teams may have changed since.
+        """
+        self.total_columns = len(COLUMNS)
+        etag = storage.stat_object(file_path)['etag']
+        cache_key = (file_path, etag)
+        cached = upload_validation_cache.get(cache_key)
+        if cached is None:
+            data_rows, row_numbers = self._upload_excel_parse_file(file_path=file_path)
+            upload_validation_cache.set(cache_key, ([list(row) for row in data_rows], row_numbers))
+        else:
+            # Copy các dòng trong cache: các bước validate bên dưới append lỗi vào từng dòng
+            data_rows, row_numbers = [list(row) for row in cached[0]], cached[1]
 
-        if isinstance(storage, GoogleCloudHandler):
+        data_rows = self._upload_excel_validate_staff_code(data_rows=data_rows, roster=roster)
+        data_rows = self._upload_excel_validate_staffs(data_rows=data_rows, roster=roster)
+        data_rows = self._upload_excel_validate_departments(
+            data_rows=data_rows)
+        data_rows = self._upload_excel_validate_role_name(data_rows=data_rows)
+        data_rows = self._upload_excel_validate_team_name(
+            company_id=company_id, data_rows=data_rows)
+        data_rows = self._upload_excel_validate_line_manager(
+            company_id=company_id, data_rows=data_rows, roster=roster)
+        return data_rows, row_numbers, cache_key
+
+    def _upload_excel_parse_file(self, file_path: str):
+        """
+        Parse the file and run the checks that do not need the database, return (data rows, row numbers)
+        """
+        reader = self._upload_excel_read_file(file_path=file_path)
+        if process_pool.max_workers > 0:
+            # Parse file trên process pool để không giữ GIL của API worker
+            local_path = reader.download()
             try:
-                file = storage.get_object(file_path)
-            except:
-                raise CustomException(http_code=400, code=error_code.ERROR_045_FORMAT_FILE,
-                                      message=message.MESSAGE_045_FORMAT_FILE)
-            dfs = pd.read_excel(io.BytesIO(file),
-                                sheet_name=0, converters=converters)
+                data_rows, row_numbers = process_pool.run(
+                    read_local_file, local_path, file_path, COLUMNS, MAX_UPLOAD_ROWS)
+            finally:
+                os.remove(local_path)
+            data_rows = self._upload_excel_validate_full_name(data_rows=data_rows)
         else:
-            if not minio_client.check_file_name_exists(minio_client.bucket_name, file_path):
-                raise CustomException(http_code=400, code=error_code.ERROR_045_FORMAT_FILE,
-                                      message=message.MESSAGE_045_FORMAT_FILE)
-            file = minio_client.client.get_object(
-                minio_client.bucket_name, file_path)
-
-            dfs = pd.read_excel(io.BytesIO(file.read()),
-                                sheet_name=0, converters=converters)
-        if len(dfs.columns.tolist()) != len(column_names) or len(dfs.values.tolist()) > 5000:
-            raise CustomException(http_code=400, code=error_code.ERROR_139_FILE_WRONG_TEMPLATE,
-                                  message=message.MESSAGE_139_FILE_WRONG_TEMPLATE)
-        return dfs.replace(np.nan, '', regex=True), len(dfs.columns.tolist())
+            data_rows = []
+            for batch in reader.iter_batches():
+                data_rows.extend(self._upload_excel_validate_full_name(data_rows=batch))
+            row_numbers = reader.row_numbers
+        data_rows = self._upload_excel_validate_phone(data_rows=data_rows)
+        return data_rows, row_numbers
 
     @staticmethod
-    def _upload_excel_write_error_file(list_data: List[Any]):
-        output = io.BytesIO()
-        writer = pd.ExcelWriter(output, engine='xlsxwriter')
-        df = pd.DataFrame(list_data,
-                          columns=COLUMNS_ERROR)
-        df.to_excel(writer, index=False)
-        writer.save()
-
-        data_file = storage.put_object(
-            file_name='error_file.xlsx',
-            file_data=BytesIO(output.getvalue()),
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
+    def _upload_excel_read_file(file_path: str) -> SpreadsheetReader:
+        """
+        Reader yielding the data rows of the uploaded file in batches, the file bytes are never held in memory
+        """
+        return SpreadsheetReader(storage=storage, file_path=file_path, columns=COLUMNS, max_rows=MAX_UPLOAD_ROWS)
+
+    @staticmethod
+    def _upload_excel_write_error_file(list_data: List[Any], only_error_rows: bool = False):
+        with tempfile.NamedTemporaryFile(suffix='.xlsx', delete=False) as output:
+            output_path = output.name
+        try:
+            process_pool.run(write_error_file, output_path, list_data, COLUMNS_ERROR, UPLOAD_ERROR_COLUMNS,
+                             only_error_rows)
+            with open(output_path, 'rb') as output:
+                data_file = storage.put_object(
+                    file_name='error_file.xlsx',
+                    file_data=output,
+                    content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+                )
+        finally:
+            os.remove(output_path)
         return data_file
 
     # def check_if_none(self, data_rows, type):
@@ -910,7 +1036,7 @@ class StaffService(BaseService):
                     row.append('Tên không được để trống')
         return data_rows
 
-    def _upload_excel_validate_staff_code(self, data_rows: list) -> list:
+    def _upload_excel_validate_staff_code(self, data_rows: list, roster: dict = None) -> list:
         staff_code = [staff_row[STAFF_CODE] for staff_row in data_rows if len(
             staff_row) == self.total_columns]
         for row in data_rows:
@@ -926,14 +1052,19 @@ class StaffService(BaseService):
         staff_code_exists = db.session.query(Staff).filter(
             Staff.staff_code.in_(staff_code)).all()
         if len(staff_code_exists) > 0:
+            staff_code_owners = {e.staff_code: e.email for e in staff_code_exists}
             for row in data_rows:
-                if row[STAFF_CODE] in [e.staff_code for e in staff_code_exists]:
+                if row[STAFF_CODE] in staff_code_owners:
+                    # Sync roster: staff code của chính nhân viên đó trong công ty thì hợp lệ
+                    if roster is not None and staff_code_owners[row[STAFF_CODE]] == row[EMAIL].strip() \
+                            and row[EMAIL].strip() in roster:
+                        continue
                     if len(row) == ERROR:  # Nếu dòng chưa có lỗi
                         row.append('Staff Code đã tồn tại trong hệ thống')
 
         return data_rows
 
-    def _upload_excel_validate_staffs(self, data_rows: list) -> list:
+    def _upload_excel_validate_staffs(self, data_rows: list, roster: dict = None) -> list:
         staff_emails = [staff_row[EMAIL] for staff_row in data_rows if len(
             staff_row) == self.total_columns]
 
@@ -955,6 +1086,8 @@ class StaffService(BaseService):
             CompanyStaff.email.in_(staff_emails)).all()
         if len(email_exists) > 0:
             for row in data_rows:
+                if roster is not None and row[EMAIL].strip() in roster:
+                    continue
                 if row[EMAIL] in [e.email for e in email_exists]:
                     if len(row) == ERROR:  # Nếu dòng chưa có lỗi
                         row.append('Email đã tồn tại trong hệ thống')
@@ -1120,22 +1253,7 @@ class StaffService(BaseService):
 
         return data_rows
 
-    def get_children_with_excel(self, email: str, data_rows: list) -> list:
-        children = []
-
-        def recursion(data_rows, email):
-            nonlocal children
-            for row in data_rows:
-                if row[LINE_MANAGER_EMAIL].strip() == email and email != '':
-                    email_child = row[EMAIL].strip()
-                    children.append(email_child)
-                    recursion(data_rows=data_rows, email=email_child)
-
-        email = email.strip()
-        recursion(data_rows=data_rows, email=email)
-        return children
-
-    def _upload_excel_validate_line_manager(self, company_id: int, data_rows: list) -> list:
+    def _upload_excel_validate_line_manager(self, company_id: int, data_rows: list, roster: dict = None) -> list:
         for row in data_rows:
             if row[LINE_MANAGER_EMAIL].strip() == '':
                 continue
@@ -1153,7 +1271,15 @@ class StaffService(BaseService):
                                          CompanyStaff.email.in_(
                                              manager_emails),
                                          CompanyStaff.company_id == company_id).all()]
-        for row in data_rows:
+        if roster is not None:
+            # Sync roster: nhân viên không có trong file sẽ bị inactive, quản lý phải nằm trong file
+            list_manager_email_exists = [email for email in list_manager_email_exists if email not in roster]
+        # Kiểm tra quản lý nằm dưới quyền nhân viên, chia theo khoảng dòng chạy trên process pool,
+        # index quản lý - nhân viên của cả file được gửi kèm mỗi khoảng
+        links = manager_links(data_rows)
+        subordinate_manager_rows = set(merge_ranges(process_pool.run_ranges(
+            find_subordinate_manager_rows, links, manager_children_index(links))))
+        for index, row in enumerate(data_rows):
             if row[LINE_MANAGER_EMAIL].strip() == '':
                 continue
             if row[LINE_MANAGER_EMAIL].strip() not in list_manager_email_exists and row[
@@ -1161,11 +1287,7 @@ class StaffService(BaseService):
                 if len(row) == self.total_columns:
                     row.append(
                         'Line Manager Email không tồn tại trong file và trong hệ thống')
-            copy_data_rows_with_not_current_row = copy.deepcopy(data_rows)
-            copy_data_rows_with_not_current_row.remove(row)
-            children = self.get_children_with_excel(
-                data_rows=copy_data_rows_with_not_current_row, email=row[EMAIL])
-            if row[LINE_MANAGER_EMAIL].strip() in children:
+            if index in subordinate_manager_rows:
                 if len(row) == self.total_columns:
                     row.append(
                         'Line Manager Email không đưọc dưới quyền của nhân viên')
@@ -1177,6 +1299,8 @@ class StaffService(BaseService):
 
     def _insert_staff_data(self, company_id: int, data: list):
         """
+        On PostgreSQL the rows are COPY-loaded and resolved set-based by StaffBulkLoader,
+        other databases fall back to the ORM bulk operations below.
         Includes 5 step:
         => Bulk insert staff
         => bulk insert company-staff
@@ -1184,6 +1308,10 @@ class StaffService(BaseService):
         => bulk insert department-staff
         => bulk insert team-staff
         """
+        if StaffBulkLoader.is_supported(db.session):
+            StaffBulkLoader(session=db.session, company_id=company_id).insert(data)
+            return
+
         # 1. Bulk insert staff
         staff_list_mappings = [Staff(
             full_name=staff[0],
@@ -0,0 +1,158 @@
+import csv
+import io
+import logging
+from typing import Dict, List
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.helpers.constant import FULL_NAME, STAFF_CODE, EMAIL, PHONE, DEPARTMENT_ID, TITLE_NAME, TEAM_NAME, \
+    LINE_MANAGER_EMAIL
+from app.helpers.enums import StaffContractType
+from app.helpers.time_helper import get_current_time
+from app.models import Staff, CompanyStaff, DepartmentStaff, StaffTeam, RoleTitle, Team
+
+logger = logging.getLogger()
+
+STAGING_TABLE = 'staff_import_staging'
+STAGING_COLUMNS = ['row_number', 'full_name', 'staff_code', 'email', 'phone_number', 'department_id',
+                   'role_title_name', 'team_names', 'manager_email']
+
+
+class StaffBulkLoader(object):
+    """
+    Load validated import rows with PostgreSQL COPY into a temporary staging table, then resolve ids,
+    managers, role titles and teams with set-based SQL. Everything runs in the caller's transaction.
+    """
+
+    def __init__(self, session: Session, company_id: int):
+        self.session = session
+        self.company_id = company_id
+        self.now = get_current_time()
+
+    @staticmethod
+    def is_supported(session: Session) -> bool:
+        return session.get_bind().dialect.name == 'postgresql'
+
+    def insert(self, data: List[list]) -> Dict[str, int]:
+        """
+        Includes 5 step:
+        => COPY rows into staging
+        => insert staff, write back ids to staging
+        => set line manager
+        => insert company-staff, department-staff
+        => insert staff-team
+        """
+        if not data:
+            return {}
+        self.stage(data)
+        self._insert_staff()
+        self._update_managers()
+        self._insert_company_staff()
+        self._insert_department_staff()
+        self._insert_staff_team()
+        rows = self.session.execute(text(f'SELECT email, staff_id FROM {STAGING_TABLE}')).fetchall()
+        return {row.email: row.staff_id for row in rows}
+
+    def stage(self, data: List[list]):
+        self.session.execute(text(
+            f'CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} ('
+            'row_number integer, full_name text, staff_code text, email text, phone_number text, '
+            'department_id integer, role_title_name text, team_names text, manager_email text, '
+            'staff_id integer'
+            ') ON COMMIT DROP'
+        ))
+        self.session.execute(text(f'TRUNCATE {STAGING_TABLE}'))
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for index, row in enumerate(data):
+            writer.writerow([
+                index,
+                row[FULL_NAME].strip(),
+                row[STAFF_CODE].strip(),
+                row[EMAIL].strip(),
+                row[PHONE].strip(),
+                row[DEPARTMENT_ID].strip(),
+                row[TITLE_NAME].strip(),
+                row[TEAM_NAME],
+                row[LINE_MANAGER_EMAIL].strip(),
+            ])
+        buffer.seek(0)
+
+        cursor = self.session.connection().connection.cursor()
+        try:
+            cursor.copy_expert(
+                f'COPY {STAGING_TABLE} ({", ".join(STAGING_COLUMNS)}) FROM STDIN WITH (FORMAT csv)', buffer)
+        finally:
+            cursor.close()
+        self.session.execute(text(f'ANALYZE {STAGING_TABLE}'))
+
+    def _default_columns(self, model) -> Dict[str, str]:
+        """
+        Column defaults of the ORM models are not applied to raw SQL, set them explicitly
+        """
+        columns = model.__table__.c
+        defaults = {}
+        if 'is_active' in columns:
+            defaults['is_active'] = 'true'
+        for column in ('created_at', 'updated_at'):
+            if column in columns:
+                defaults[column] = ':now'
+        return defaults
+
+    def _insert_sql(self, model, columns: Dict[str, str], source: str) -> str:
+        columns = dict(columns, **self._default_columns(model))
+        return (f'INSERT INTO {model.__tablename__} ({", ".join(columns.keys())}) '
+                f'SELECT {", ".join(columns.values())} {source}')
+
+    def _insert_staff(self):
+        insert_sql = self._insert_sql(Staff, {
+            'full_name': 'st.full_name',
+            'staff_code': 'st.staff_code',
+            'email': 'st.email',
+            'phone_number': 'st.phone_number',
+            'company_id': ':company_id',
+            'contract_type': ':contract_type',
+        }, f'FROM {STAGING_TABLE} st ORDER BY st.row_number')
+        self.session.execute(text(
+            f'WITH inserted AS ({insert_sql} RETURNING id, email) '
+            f'UPDATE {STAGING_TABLE} st SET staff_id = inserted.id FROM inserted WHERE inserted.email = st.email'
+        ), {'company_id': self.company_id, 'contract_type': StaffContractType.OFFICIAL.value, 'now': self.now})
+
+    def _update_managers(self):
+        self.session.execute(text(
+            f'UPDATE {Staff.__tablename__} s SET manager_id = m.id '
+            f'FROM {STAGING_TABLE} st JOIN {Staff.__tablename__} m '
+            'ON m.email = st.manager_email AND m.company_id = :company_id '
+            "WHERE s.id = st.staff_id AND COALESCE(st.manager_email, '') <> ''"
+        ), {'company_id': self.company_id})
+
+    def _insert_company_staff(self):
+        self.session.execute(text(self._insert_sql(CompanyStaff, {
+            'company_id': ':company_id',
+            'staff_id': 'st.staff_id',
+            'email': 'st.email',
+        }, f'FROM {STAGING_TABLE} st')), {'company_id': self.company_id, 'now': self.now})
+
+    def _insert_department_staff(self):
+        self.session.execute(text(self._insert_sql(DepartmentStaff, {
+            'department_id': 'st.department_id',
+            'staff_id': 'st.staff_id',
+            'role_title_id': 'rt.id',
+        }, f'FROM {STAGING_TABLE} st '
+           f'LEFT JOIN LATERAL (SELECT r.id FROM {RoleTitle.__tablename__} r '
+           'WHERE r.department_id = st.department_id AND r.is_active '
+           'AND lower(r.role_title_name) = lower(st.role_title_name) ORDER BY r.id LIMIT 1) rt ON true')),
+            {'now': self.now})
+
+    def _insert_staff_team(self):
+        self.session.execute(text(self._insert_sql(StaffTeam, {
+            'team_id': 't.id',
+            'staff_id': 'st.staff_id',
+        }, f'FROM {STAGING_TABLE} st '
+           "CROSS JOIN LATERAL unnest(string_to_array(COALESCE(st.team_names, ''), ',')) AS tn(team_name) "
+           f'JOIN LATERAL (SELECT tm.id FROM {Team.__tablename__} tm '
+           'WHERE tm.company_id = :company_id AND tm.is_active '
+           'AND lower(tm.team_name) = lower(trim(tn.team_name)) ORDER BY tm.id LIMIT 1) t ON true '
+           "WHERE trim(tn.team_name) <> ''")), {'company_id': self.company_id, 'now': self.now})
@@ -0,0 +1,221 @@
+import hashlib
+import logging
+from typing import Dict, List, Tuple
+
+from sqlalchemy import and_
+from sqlalchemy.orm import Session, aliased
+
+from app.helpers.enums import IamOutboxEvent
+from app.helpers.time_helper import get_current_time
+from app.models import Staff, CompanyStaff, DepartmentStaff, StaffTeam, RoleTitle, Team
+from app.schemas.sche_staff import StaffIamUploadFile
+from app.services.srv_iam_outbox import enqueue_iam_events
+from app.helpers.constant import FULL_NAME, STAFF_CODE, EMAIL, PHONE, DEPARTMENT_ID, TITLE_NAME, \
+    TEAM_NAME, LINE_MANAGER_EMAIL
+
+logger = logging.getLogger()
+
+
+def split_team_names(team_names: str) -> List[str]:
+    return [item.strip() for item in team_names.split(',') if item.strip() != '']
+
+
+def roster_row_hash(full_name: str, staff_code: str, phone_number: str, department_id, role_title_name: str,
+                    team_names: List[str], manager_email: str, is_active: bool = True) -> str:
+    normalized = [
+        (full_name or '').strip(),
+        (staff_code or '').strip(),
+        (phone_number or '').strip(),
+        str(department_id or ''),
+        (role_title_name or '').strip().lower(),
+        ','.join(sorted(team.strip().lower() for team in team_names)),
+        (manager_email or '').strip().lower(),
+        '1' if is_active else '0',
+    ]
+    return hashlib.sha1('\x1f'.join(normalized).encode('utf-8')).hexdigest()
+
+
+def file_row_hash(row: list) -> str:
+    return roster_row_hash(full_name=row[FULL_NAME], staff_code=row[STAFF_CODE], phone_number=row[PHONE],
+                           department_id=row[DEPARTMENT_ID].strip(), role_title_name=row[TITLE_NAME],
+                           team_names=split_team_names(row[TEAM_NAME]), manager_email=row[LINE_MANAGER_EMAIL])
+
+
+class StaffRosterSync(object):
+    """
+    Diff an import file against the company's current staff and apply the result with bulk statements:
+    new emails are inserted, changed rows are updated, staff missing from the file are deactivated
+    and unchanged rows are skipped.
+    """
+
+    def __init__(self, session: Session, company_id: int):
+        self.session = session
+        self.company_id = company_id
+        self.roster = None
+
+    def load_roster(self) -> Dict[str, dict]:
+        """
+        Current state of every staff of the company keyed by email, loaded with 2 queries
+        """
+        ParentStaff = aliased(Staff)
+        rows = self.session.query(Staff) \
+            .outerjoin(DepartmentStaff, and_(DepartmentStaff.staff_id == Staff.id, DepartmentStaff.is_active)) \
+            .outerjoin(RoleTitle, RoleTitle.id == DepartmentStaff.role_title_id) \
+            .outerjoin(ParentStaff, ParentStaff.id == Staff.manager_id) \
+            .filter(Staff.company_id == self.company_id) \
+            .with_entities(
+            Staff.id,
+            Staff.email,
+            Staff.full_name,
+            Staff.staff_code,
+            Staff.phone_number,
+            Staff.is_active,
+            DepartmentStaff.department_id,
+            RoleTitle.role_title_name,
+            ParentStaff.email.label('manager_email')
+        ).order_by(Staff.id.asc(), DepartmentStaff.id.asc()).all()
+
+        staff_teams = {}
+        for staff_id, team_name in self.session.query(StaffTeam.staff_id, Team.team_name) \
+                .join(Team, Team.id == StaffTeam.team_id) \
+                .filter(Team.company_id == self.company_id, Team.is_active, StaffTeam.is_active).all():
+            staff_teams.setdefault(staff_id, []).append(team_name)
+
+        roster = {}
+        for row in rows:
+            if row.email in roster:
+                continue
+            roster[row.email] = {
+                'id': row.id,
+                'full_name': row.full_name,
+                'staff_code': row.staff_code,
+                'phone_number': row.phone_number,
+                'is_active': row.is_active,
+                'department_id': row.department_id,
+                'role_title_name': row.role_title_name,
+                'team_names': staff_teams.get(row.id, []),
+                'hash': roster_row_hash(full_name=row.full_name, staff_code=row.staff_code,
+                                        phone_number=row.phone_number, department_id=row.department_id,
+                                        role_title_name=row.role_title_name,
+                                        team_names=staff_teams.get(row.id, []),
+                                        manager_email=row.manager_email, is_active=row.is_active),
+            }
+        self.roster = roster
+        return roster
+
+    def diff(self, data_rows: List[list]) -> Tuple[List[list], List[Tuple[list, dict]], List[int], int]:
+        """
+        Return (rows to insert, (row, current) pairs to update, staff ids to deactivate, number of unchanged rows)
+        """
+        roster = self.roster if self.roster is not None else self.load_roster()
+        inserts, updates, unchanged = [], [], 0
+        file_emails = set()
+        for row in data_rows:
+            email = row[EMAIL].strip()
+            file_emails.add(email)
+            current = roster.get(email)
+            if current is None:
+                inserts.append(row)
+            elif current['hash'] != file_row_hash(row):
+                updates.append((row, current))
+            else:
+                unchanged += 1
+        deactivations = [current['id'] for email, current in roster.items()
+                         if email not in file_emails and current['is_active']]
+        return inserts, updates, deactivations, unchanged
+
+    def apply_updates(self, updates: List[Tuple[list, dict]]):
+        if not updates:
+            return
+        now = get_current_time()
+        manager_emails = {row[LINE_MANAGER_EMAIL].strip() for row, _ in updates if row[LINE_MANAGER_EMAIL].strip()}
+        managers = dict(self.session.query(Staff.email, Staff.id).filter(
+            Staff.company_id == self.company_id, Staff.email.in_(manager_emails)).all()) if manager_emails else {}
+
+        department_ids = {int(row[DEPARTMENT_ID]) for row, _ in updates}
+        role_titles = {}
+        for role_title in self.session.query(RoleTitle).filter(
+                RoleTitle.department_id.in_(department_ids), RoleTitle.is_active).order_by(RoleTitle.id.asc()).all():
+            role_titles.setdefault((role_title.department_id, role_title.role_title_name.lower()), role_title.id)
+
+        teams = {}
+        for team in self.session.query(Team).filter(
+                Team.company_id == self.company_id, Team.is_active).order_by(Team.id.asc()).all():
+            teams.setdefault(team.team_name.lower(), team.id)
+
+        staff_update_mappings, department_changed, team_changed, reactivated = [], [], [], []
+        for row, current in updates:
+            staff_update_mappings.append({
+                'id': current['id'],
+                'full_name': row[FULL_NAME].strip(),
+                'staff_code': row[STAFF_CODE].strip(),
+                'phone_number': row[PHONE].strip(),
+                'manager_id': managers.get(row[LINE_MANAGER_EMAIL].strip()),
+                'is_active': True,
+                'updated_at': now
+            })
+            if not current['is_active']:
+                reactivated.append(current['id'])
+            if str(current['department_id'] or '') != row[DEPARTMENT_ID].strip() \
+                    or (current['role_title_name'] or '').lower() != row[TITLE_NAME].strip().lower() \
+                    or not current['is_active']:
+                department_changed.append((row, current))
+            if sorted(team.lower() for team in current['team_names']) != \
+                    sorted(team.lower() for team in split_team_names(row[TEAM_NAME])) or not current['is_active']:
+                team_changed.append((row, current))
+
+        # 1. Bulk update staff
+        self.session.bulk_update_mappings(Staff, staff_update_mappings)
+
+        # 2. Re-activate company-staff of re-activated staff
+        if reactivated:
+            self.session.query(CompanyStaff).filter(
+                CompanyStaff.staff_id.in_(reactivated), CompanyStaff.company_id == self.company_id
+            ).update({'is_active': True}, synchronize_session=False)
+
+        # 3. Replace department-staff of staff whose department / title changed
+        if department_changed:
+            self.session.query(DepartmentStaff).filter(
+                DepartmentStaff.staff_id.in_([current['id'] for _, current in department_changed]),
+                DepartmentStaff.is_active
+            ).update({'is_active': False}, synchronize_session=False)
+            self.session.bulk_insert_mappings(DepartmentStaff, [{
+                'department_id': int(row[DEPARTMENT_ID]),
+                'staff_id': current['id'],
+                'role_title_id': role_titles.get((int(row[DEPARTMENT_ID]), row[TITLE_NAME].strip().lower())),
+                'is_active': True
+            } for row, current in department_changed])
+
+        # 4. Replace staff-team of staff whose teams changed
+        if team_changed:
+            self.session.query(StaffTeam).filter(
+                StaffTeam.staff_id.in_([current['id'] for _, current in team_changed]),
+                StaffTeam.is_active
+            ).update({'is_active': False}, synchronize_session=False)
+            self.session.bulk_insert_mappings(StaffTeam, [{
+                'team_id': teams.get(team_name.lower()),
+                'staff_id': current['id'],
+                'is_active': True
+            } for row, current in team_changed for team_name in split_team_names(row[TEAM_NAME])])
+
+    def apply_deactivations(self, staff_ids: List[int]):
+        """
+        Deactivate the staff and queue the removal of their IAM roles in the outbox, in the same transaction
+        """
+        if not staff_ids:
+            return
+        for model in (CompanyStaff, StaffTeam, DepartmentStaff):
+            self.session.query(model).filter(model.staff_id.in_(staff_ids), model.is_active) \
+                .update({'is_active': False}, synchronize_session=False)
+        self.session.query(Staff).filter(Staff.id.in_(staff_ids)) \
+            .update({'is_active': False, 'updated_at': get_current_time()}, synchronize_session=False)
+
+        # Gỡ role IAM qua outbox, chỉ gửi đi khi giao dịch đã commit
+        roster = self.roster if self.roster is not None else self.load_roster()
+        deactivated = set(staff_ids)
+        enqueue_iam_events(self.session, IamOutboxEvent.REMOVE_ROLE, [StaffIamUploadFile(
+            full_name=current['full_name'],
+            email=email,
+            phone_number=current['phone_number'] or '',
+            role=current['role_title_name'] or ''
+        ) for email, current in roster.items() if current['id'] in deactivated])
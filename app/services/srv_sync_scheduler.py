@@ -0,0 +1,178 @@
+import logging
+import threading
+import time
+import zlib
+from datetime import timedelta
+from typing import List, Optional
+
+from fastapi_sqlalchemy import db
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.db.base import SessionLocal
+from app.helpers.enums import SyncRunStatus, SyncTrigger
+from app.helpers.time_helper import get_current_time
+from app.models import SyncRun
+from app.services.srv_synchronized import synchronized_srv, IAM_SYNC_NAME
+
+logger = logging.getLogger()
+
+
+class IamSyncScheduler(object):
+    """
+    Run the IAM sync single-flight per tenant: a thread lock guards this process and a PostgreSQL advisory
+    lock guards the other API workers. Triggers that arrive while a sync is running are coalesced into
+    one follow-up run. Every run is recorded in SyncRun for the status endpoint.
+    Every API worker has its own periodic loop: a periodic run is dropped without a SyncRun record when another
+    worker holds the lock or already ran within the interval, so the tenant is synced once per interval.
+    """
+
+    def __init__(self, interval_seconds: int = 0, session_factory: sessionmaker = SessionLocal):
+        self.interval_seconds = interval_seconds
+        self.session_factory = session_factory
+        self.lock_key = zlib.crc32(('%s:%s' % (IAM_SYNC_NAME, settings.IAM_TENANT_ID)).encode('utf-8')) - 2 ** 31
+        self._lock = threading.Lock()
+        self._running = False
+        self._follow_up = None
+        self._coalesced = 0
+        self._stop = threading.Event()
+        self._periodic_thread = None
+        self._sync_thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def trigger(self, token: str, full: bool = False, trigger: SyncTrigger = SyncTrigger.MANUAL) -> dict:
+        with self._lock:
+            if self._running:
+                # Gộp vào một lần chạy tiếp theo, lần quét toàn bộ được ưu tiên
+                full = full or (self._follow_up is not None and self._follow_up[1])
+                self._follow_up = (token, full, trigger)
+                self._coalesced += 1
+                return {'started': False, 'coalesced': True}
+            self._running = True
+            self._sync_thread = threading.Thread(target=self._run_loop, args=(token, full, trigger),
+                                                 name='iam-sync', daemon=True)
+            self._sync_thread.start()
+        return {'started': True, 'coalesced': False}
+
+    def _run_loop(self, token: str, full: bool, trigger: SyncTrigger):
+        while True:
+            try:
+                self.run_once(token, full, trigger)
+            except Exception as e:
+                logger.error("IAM sync run failed: %s" % e)
+            with self._lock:
+                if self._follow_up is None or self._stop.is_set():
+                    self._follow_up = None
+                    self._running = False
+                    return
+                token, full, trigger = self._follow_up
+                self._follow_up = None
+
+    def _try_lock(self, connection) -> bool:
+        if connection.dialect.name != 'postgresql':
+            return True
+        return bool(connection.execute(text('SELECT pg_try_advisory_lock(:key)'), {'key': self.lock_key}).scalar())
+
+    def _unlock(self, connection):
+        if connection.dialect.name == 'postgresql':
+            connection.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': self.lock_key})
+
+    def _ran_recently(self, session) -> bool:
+        """
+        A run of any API worker started within the interval, checked while holding the advisory lock
+        """
+        since = get_current_time() - timedelta(seconds=self.interval_seconds * 0.9)
+        return session.query(SyncRun.id).filter(
+            SyncRun.tenant_id == settings.IAM_TENANT_ID, SyncRun.sync_name == IAM_SYNC_NAME,
+            SyncRun.status != SyncRunStatus.SKIPPED.value, SyncRun.started_at >= since
+        ).first() is not None
+
+    def run_once(self, token: str, full: bool = False,
+                 trigger: SyncTrigger = SyncTrigger.MANUAL) -> Optional[SyncRun]:
+        session = self.session_factory()
+        # Advisory lock gắn với connection nên giữ riêng một connection trong suốt lần chạy
+        lock_connection = session.get_bind().connect()
+        acquired = False
+        try:
+            acquired = self._try_lock(lock_connection)
+            if trigger == SyncTrigger.PERIODIC and (not acquired or self._ran_recently(session)):
+                logger.info("IAM sync already ran in another process, skip periodic run")
+                return None
+            with self._lock:
+                coalesced, self._coalesced = self._coalesced, 0
+            run = SyncRun(
+                tenant_id=settings.IAM_TENANT_ID,
+                sync_name=IAM_SYNC_NAME,
+                trigger=trigger.value,
+                status=SyncRunStatus.RUNNING.value if acquired else SyncRunStatus.SKIPPED.value,
+                full=1 if full else 0,
+                started_at=get_current_time(),
+                coalesced=coalesced
+            )
+            session.add(run)
+            session.commit()
+            if not acquired:
+                logger.info("IAM sync is running in another process, skip")
+                session.refresh(run)  # run vẫn đọc được sau khi đóng session
+                return run
+
+            started = time.monotonic()
+            try:
+                with db():
+                    report = synchronized_srv(token, full=full)
+                run.total = report['total']
+                run.created = report['created']
+                run.updated = report['updated']
+                run.unchanged = report['unchanged']
+                run.failed = report['failed']
+                run.status = SyncRunStatus.SUCCESS.value if report['failed'] == 0 else SyncRunStatus.FAILED.value
+            except Exception as e:
+                run.status = SyncRunStatus.FAILED.value
+                run.error = getattr(e, 'message', None) or str(e)
+                logger.error("IAM sync failed: %s" % run.error)
+            run.finished_at = get_current_time()
+            run.duration_seconds = round(time.monotonic() - started, 3)
+            session.commit()
+            session.refresh(run)
+            return run
+        finally:
+            if acquired:
+                self._unlock(lock_connection)
+            lock_connection.close()
+            session.close()
+
+    def _run_periodic(self):
+        while not self._stop.wait(self.interval_seconds):
+            self.trigger(token=settings.IAM_SERVICE_TOKEN, trigger=SyncTrigger.PERIODIC)
+
+    def start(self):
+        if self.interval_seconds > 0 and self._periodic_thread is None:
+            self._stop.clear()
+            self._periodic_thread = threading.Thread(target=self._run_periodic, name='iam-sync-periodic',
+                                                     daemon=True)
+            self._periodic_thread.start()
+
+    def stop(self):
+        """
+        Stop the periodic loop and wait for the sync in progress, a coalesced follow-up run is dropped
+        """
+        self._stop.set()
+        if self._periodic_thread is not None:
+            self._periodic_thread.join(timeout=5)
+            self._periodic_thread = None
+        with self._lock:
+            sync_thread, self._sync_thread = self._sync_thread, None
+        if sync_thread is not None:
+            sync_thread.join()
+
+    def get_runs(self, limit: int = 10) -> List[SyncRun]:
+        return db.session.query(SyncRun).filter(
+            SyncRun.tenant_id == settings.IAM_TENANT_ID, SyncRun.sync_name == IAM_SYNC_NAME
+        ).order_by(SyncRun.id.desc()).limit(limit).all()
+
+
+iam_sync_scheduler = IamSyncScheduler(interval_seconds=settings.IAM_SYNC_INTERVAL_SECONDS)
@@ -1,76 +1,199 @@
-from typing import List
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from typing import Dict, List, Union
 
 from fastapi import Request
 from fastapi_sqlalchemy import db
+from sqlalchemy import or_
 
 from app.core.config import settings
 from app.helpers.enums import SalesRoleName
-from app.models import Staff, RoleTitle, DepartmentStaff
-from app.schemas.sche_staff import StaffIam, StaffIamUploadFile
-from app.services.srv_iam import IamService
+from app.helpers.exception_handler import CustomException
+from app.helpers.time_helper import get_current_time
+from app.models import Staff, RoleTitle, DepartmentStaff, SyncWatermark
+from app.schemas.sche_staff import StaffIamUploadFile
+from app.services.srv_iam import IamService, get_authorization
 
 STAFF = 0
 DEPARMENT_STAFF = 2
 ROLE_TITLE = 2
+IAM_SYNC_NAME = 'iam'
 
+logger = logging.getLogger()
 
-def synchronized_srv(request: Request):
-    print("Start")
-    create_user, update_user = set(), []
-    iam_srv = IamService()
-    # iam_srv.validate_user_can_create_user(request)
-    tables = db.session.query(Staff, DepartmentStaff, RoleTitle) \
+
+class IamSyncEngine(object):
+    """
+    Synchronize staffs to IAM with a bounded number of concurrent workers. Every staff is independent
+    (lookup user, create when missing, add / remove the roles that differ), so staffs run in parallel over
+    the pooled IAM connections. Progress and throughput are logged while running.
+    """
+
+    def __init__(self, iam_srv: IamService, token: str, concurrency: int = None):
+        self.iam_srv = iam_srv
+        self.token = token
+        self.concurrency = max(concurrency or settings.IAM_SYNC_CONCURRENCY, 1)
+        self.report = {'total': 0, 'created': 0, 'updated': 0, 'unchanged': 0, 'failed': 0}
+
+    def sync_staff(self, staff: StaffIamUploadFile) -> str:
+        user_id = self.iam_srv.get_id_by_email(self.token, staff.email)
+        if user_id is None:
+            return self.create_staff(staff)
+        changed = self.iam_srv.update_role(self.token, role_ids=[get_role_id_iam(staff.role)], user_id=user_id)
+        return 'updated' if changed else 'unchanged'
+
+    def create_staff(self, staff: StaffIamUploadFile) -> str:
+        user_id = self.iam_srv.create_user_iam(request=self.token, user_create_request=staff)
+        current_role_ids = set()  # user vừa tạo chưa có role
+        if user_id is None:
+            user_id = self.iam_srv.get_id_by_email(self.token, staff.email)
+            current_role_ids = None
+        if user_id is None:
+            return 'failed'
+        self.iam_srv.update_role(self.token, role_ids=[get_role_id_iam(staff.role)], user_id=user_id,
+                                 current_role_ids=current_role_ids)
+        return 'created'
+
+    def apply_change(self, staff: StaffIamUploadFile, user: dict = None) -> str:
+        """
+        Apply a change found by reconcile: create the missing user or replace its roles
+        """
+        if user is None:
+            return self.create_staff(staff)
+        changed = self.iam_srv.update_role(self.token, role_ids=[get_role_id_iam(staff.role)], user_id=user['id'],
+                                           current_role_ids=user['role_ids'])
+        return 'updated' if changed else 'unchanged'
+
+    def _sync_one(self, fn, staff: StaffIamUploadFile, *args) -> str:
+        try:
+            return fn(staff, *args)
+        except Exception as e:
+            logger.warning("Synchronize staff %s to IAM failed: %s" % (staff.email, e))
+            return 'failed'
+
+    def run(self, staffs: List[StaffIamUploadFile]) -> dict:
+        return self._run([(self.sync_staff, staff) for staff in staffs], total=len(staffs))
+
+    def reconcile(self, staffs: List[StaffIamUploadFile], directory: Dict[str, dict]) -> dict:
+        """
+        Join staffs against the IAM user directory locally, only creates and role changes call IAM
+        """
+        tasks = []
+        for staff in staffs:
+            user = directory.get(staff.email)
+            if user is not None and user['role_ids'] == {get_role_id_iam(staff.role)}:
+                continue
+            tasks.append((self.apply_change, staff, user))
+        self.report['unchanged'] = len(staffs) - len(tasks)
+        return self._run(tasks, total=len(staffs))
+
+    def _run(self, tasks: list, total: int) -> dict:
+        started_at = time.monotonic()
+        self.report['total'] = total
+        progress_step = max(len(tasks) // 10, 1)
+        done = 0
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = [executor.submit(self._sync_one, *task) for task in tasks]
+            for future in as_completed(futures):
+                result = future.result()
+                self.report[result] += 1
+                done += 1
+                if done % progress_step == 0 or done == len(tasks):
+                    elapsed = time.monotonic() - started_at
+                    logger.info("Synchronize IAM: %s/%s staffs, %.1f staffs/s" % (
+                        done, len(tasks), done / elapsed if elapsed > 0 else 0))
+        self.report['seconds'] = round(time.monotonic() - started_at, 3)
+        logger.info("Synchronize IAM finished: %s" % self.report)
+        return self.report
+
+
+def gather_sales_staffs(since: datetime = None) -> List[StaffIamUploadFile]:
+    """
+    Active staffs holding a sales role, read once from the database so the workers do not use the session.
+    With since, only staffs whose staff, department assignment or role title changed after it
+    """
+    query = db.session.query(Staff, DepartmentStaff, RoleTitle) \
         .filter(Staff.id == DepartmentStaff.staff_id) \
         .filter(DepartmentStaff.role_title_id == RoleTitle.id) \
         .filter(Staff.is_active) \
         .filter(DepartmentStaff.is_active) \
-        .filter(RoleTitle.role_title_name.in_(SalesRoleName.get_list_value())).all()
+        .filter(RoleTitle.role_title_name.in_(SalesRoleName.get_list_value()))
+    if since is not None:
+        query = query.filter(or_(Staff.updated_at > since, DepartmentStaff.updated_at > since,
+                                 RoleTitle.updated_at > since))
+    tables = query.all()
 
+    staffs, emails = [], set()
     for table in tables:
         staff = table[STAFF]
-        exist_user = iam_srv.get_id_by_email(request, staff.email)
-        if exist_user is None:
-            create_user.add(table)
+        if staff.email in emails:
+            continue
+        emails.add(staff.email)
+        staffs.append(StaffIamUploadFile(
+            email=staff.email,
+            full_name=staff.full_name,
+            phone_number=staff.phone_number,
+            role=table[ROLE_TITLE].role_title_name
+        ))
+    return staffs
+
+
+def get_watermark(sync_name: str = IAM_SYNC_NAME) -> SyncWatermark:
+    return db.session.query(SyncWatermark).filter(
+        SyncWatermark.tenant_id == settings.IAM_TENANT_ID, SyncWatermark.sync_name == sync_name).first()
+
+
+def save_watermark(synced_at: datetime, sync_name: str = IAM_SYNC_NAME):
+    watermark = get_watermark(sync_name)
+    if watermark is None:
+        watermark = SyncWatermark(tenant_id=settings.IAM_TENANT_ID, sync_name=sync_name)
+        db.session.add(watermark)
+    elif watermark.last_synced_at >= synced_at:  # mốc không bao giờ lùi lại
+        return
+    watermark.last_synced_at = synced_at
+    db.session.commit()
+
+
+def synchronized_srv(request: Union[Request, str], bulk: bool = True, full: bool = False):
+    """
+    Synchronize sales staffs to IAM. Only changes since the tenant watermark are processed unless full is set
+    or no sync finished yet; the watermark only moves forward when every staff synced successfully.
+    updated_at is written with the clock of each API worker, the watermark is saved
+    IAM_SYNC_WATERMARK_OVERLAP_SECONDS before the start of the run so a skewed clock does not skip changes
+    """
+    engine = IamSyncEngine(iam_srv=IamService(), token=get_authorization(request))
+    # Mốc lấy trước khi query: bản ghi thay đổi trong lúc đồng bộ sẽ được xử lý ở lần sau
+    started_at = get_current_time()
+    watermark = None if full else get_watermark()
+    since = watermark.last_synced_at if watermark else None
+    staffs = gather_sales_staffs(since=since)
+    logger.info("Synchronize IAM %s: %s staffs changed since %s" % (
+        'incremental' if since else 'full', len(staffs), since))
+
+    report = None
+    # Directory chỉ đáng lấy khi quét toàn bộ, đồng bộ tăng dần thường chỉ vài nhân viên
+    if bulk and since is None:
+        try:
+            directory = engine.iam_srv.get_user_directory(engine.token)
+        except CustomException as e:
+            logger.warning("Cannot load IAM user directory, fall back to per staff lookup: %s" % e.message)
         else:
-            roles = iam_srv.get_role_user(request, exist_user).get("items")
-            role_name = table[ROLE_TITLE].role_title_name
-            if not check_role_update(roles, role_name, iam_srv):
-                update_user.append({"user_id": exist_user, "roles": get_role_id_iam(role_name)})
-
-    for user in create_user:
-        staff_iam_create = StaffIam(
-            email=user[STAFF].email,
-            full_name=user[STAFF].full_name,
-            phone_number=user[STAFF].phone_number
-        )
-        user_id = iam_srv.create_user_iam(request=request, user_create_request=staff_iam_create)
-        # print(type(user_create))
-        update_user.append({"user_id": user_id, "roles": get_role_id_iam(user[ROLE_TITLE].role_title_name)})
-    for user in update_user:
-        iam_srv.update_role(request=request, role_ids=[user.get("roles")], user_id=user.get("user_id"))
-    print("Finished")
+            report = engine.reconcile(staffs, directory)
+    if report is None:
+        report = engine.run(staffs)
+
+    if report['failed'] == 0:
+        save_watermark(started_at - timedelta(seconds=settings.IAM_SYNC_WATERMARK_OVERLAP_SECONDS))
+    else:
+        logger.warning("Synchronize IAM: %s staffs failed, watermark stays at %s" % (report['failed'], since))
+    return report
 
 
 def synchronized_upload_excel(request, staffs: List[StaffIamUploadFile]):
-    iam_srv = IamService()
-    for staff in staffs:
-        user_id = iam_srv.create_user_iam(request=request, user_create_request=staff)
-        if user_id is None:
-            user_id = iam_srv.get_id_by_email(request=request, email=staff.email)
-        role_ids = [get_role_id_iam(staff.role)]
-        iam_srv.update_role(request, role_ids=role_ids, user_id=user_id)
-
-
-def check_role_update(roles: list, user_role: str, iam_srv: IamService):
-    for role in roles:
-        id_role = role.get("id")
-        if id_role in iam_srv.all_role_sale_portal:
-            if (user_role == SalesRoleName.SALE.value and id_role == settings.SALE_ID) \
-                    or (user_role == SalesRoleName.SALE_ADMIN.value and id_role == settings.SALE_ADMIN_ID) \
-                    or (user_role == SalesRoleName.SALE_LEADER.value and id_role == settings.SALE_LEADER_ID) \
-                    or (user_role == SalesRoleName.SALE_MANAGER.value and id_role == settings.SALE_MANAGER_ID):
-                return True
-    return False
+    engine = IamSyncEngine(iam_srv=IamService(), token=get_authorization(request))
+    return engine.run(staffs)
 
 
 def get_role_id_iam(role_name):
@@ -0,0 +1,145 @@
+import logging
+import threading
+from datetime import timedelta
+from typing import List
+
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core import error_code, message
+from app.core.config import settings
+from app.db.base import SessionLocal
+from app.helpers.download import IMMUTABLE_OBJECT_NAME
+from app.helpers.enums import PresignedUploadStatus
+from app.helpers.exception_handler import CustomException
+from app.helpers.minio_handler import storage, from_file_type_to_mime_type
+from app.helpers.time_helper import get_current_time
+from app.helpers.upload_stream import MAX_UPLOAD_SIZE, file_too_large, normalize_upload_name
+from app.models import PresignedUpload
+
+logger = logging.getLogger()
+
+
+def upload_not_registered() -> CustomException:
+    return CustomException(http_code=400, code=error_code.ERROR_142_UPLOAD_NOT_REGISTERED,
+                           message=message.MESSAGE_142_UPLOAD_NOT_REGISTERED)
+
+
+def create_presigned_upload(session: Session, email: str, file_name: str, content_type: str = None) -> dict:
+    """
+    Issue a presigned PUT URL for a new object and remember the object name with the caller,
+    /upload/complete only accepts object names issued here to the same caller
+    """
+    file_name = normalize_upload_name(file_name)
+    content_type = content_type or from_file_type_to_mime_type(file_name.split('.')[-1].lower())
+    object_name = storage.new_object_name(file_name)
+    expires_in = settings.UPLOAD_PRESIGNED_EXPIRE_SECONDS
+    presigned = storage.presigned_put_object(object_name=object_name, content_type=content_type,
+                                             expires=timedelta(seconds=expires_in))
+    session.add(PresignedUpload(tenant_id=settings.IAM_TENANT_ID, email=email, object_name=object_name,
+                                status=PresignedUploadStatus.PENDING.value,
+                                expires_at=get_current_time() + timedelta(seconds=expires_in)))
+    session.commit()
+    return dict(presigned, bucket_name=storage.bucket_name, file_name=object_name, expires_in=expires_in)
+
+
+def complete_presigned_upload(session: Session, email: str, object_name: str) -> dict:
+    """
+    Register a file uploaded with a presigned URL: the object name must have been issued to the caller
+    and not be completed yet, an object over MAX_UPLOAD_SIZE is deleted
+    """
+    if not IMMUTABLE_OBJECT_NAME.match(object_name or ''):
+        raise CustomException(http_code=400, code=error_code.ERROR_045_FORMAT_FILE,
+                              message=message.MESSAGE_045_FORMAT_FILE)
+    upload = session.query(PresignedUpload).filter(
+        PresignedUpload.object_name == object_name,
+        PresignedUpload.tenant_id == settings.IAM_TENANT_ID,
+        PresignedUpload.email == email,
+        PresignedUpload.status == PresignedUploadStatus.PENDING.value
+    ).with_for_update().first()
+    if upload is None:
+        raise upload_not_registered()
+
+    stat = storage.stat_object(object_name)
+    if stat['size'] > MAX_UPLOAD_SIZE:
+        storage.remove_object(object_name)
+        session.delete(upload)
+        session.commit()
+        raise file_too_large()
+    upload.status = PresignedUploadStatus.COMPLETED.value
+    session.commit()
+    return {
+        'bucket_name': storage.bucket_name,
+        'file_name': object_name,
+        'url': storage.presigned_get_object(bucket_name=storage.bucket_name, object_name=object_name)
+    }
+
+
+class PresignedUploadCleaner(object):
+    """
+    Delete the objects of presigned uploads that were never completed, once their URL has expired
+    for longer than the grace period (an upload started just before expiry can still finish)
+    """
+
+    def __init__(self, interval_seconds: int = None, grace_seconds: int = None, batch_size: int = 500,
+                 session_factory: sessionmaker = SessionLocal):
+        self.interval_seconds = settings.UPLOAD_PRESIGNED_CLEANUP_INTERVAL_SECONDS \
+            if interval_seconds is None else interval_seconds
+        self.grace_seconds = settings.UPLOAD_PRESIGNED_CLEANUP_GRACE_SECONDS if grace_seconds is None \
+            else grace_seconds
+        self.batch_size = batch_size
+        self.session_factory = session_factory
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _remove_objects(self, uploads: List[PresignedUpload]) -> List[int]:
+        removed_ids = []
+        for upload in uploads:
+            try:
+                if storage.check_file_name_exists(storage.bucket_name, upload.object_name):
+                    storage.remove_object(upload.object_name)
+                removed_ids.append(upload.id)
+            except Exception as e:
+                # Giữ lại bản ghi để lần dọn sau xoá tiếp
+                logger.warning("Cannot remove expired upload %s: %s" % (upload.object_name, e))
+        return removed_ids
+
+    def run_once(self) -> int:
+        session = self.session_factory()
+        try:
+            deadline = get_current_time() - timedelta(seconds=self.grace_seconds)
+            uploads = session.query(PresignedUpload).filter(
+                PresignedUpload.status == PresignedUploadStatus.PENDING.value,
+                PresignedUpload.expires_at < deadline
+            ).order_by(PresignedUpload.id.asc()).limit(self.batch_size).all()
+            removed_ids = self._remove_objects(uploads)
+            if removed_ids:
+                session.query(PresignedUpload).filter(PresignedUpload.id.in_(removed_ids)) \
+                    .delete(synchronize_session=False)
+                session.commit()
+                logger.info("Removed %s expired presigned uploads" % len(removed_ids))
+            return len(removed_ids)
+        except Exception as e:
+            session.rollback()
+            logger.error("Presigned upload cleanup failed: %s" % e)
+            return 0
+        finally:
+            session.close()
+
+    def run_forever(self):
+        while not self._stop.wait(self.interval_seconds):
+            self.run_once()
+
+    def start(self):
+        if self.interval_seconds > 0 and self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run_forever, name='presigned-upload-cleaner', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+presigned_upload_cleaner = PresignedUploadCleaner()
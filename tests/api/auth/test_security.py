@@ -0,0 +1,135 @@
+import time
+from types import SimpleNamespace
+
+import jwt
+import pytest
+
+from app.core import security
+from tests.api import APITestCase
+
+rsa = pytest.importorskip('cryptography.hazmat.primitives.asymmetric.rsa')
+
+
+class FakeResponse(object):
+    def __init__(self, data: dict, status_code: int = 200):
+        self.data = data
+        self.status_code = status_code
+
+    def json(self):
+        return self.data
+
+
+class FakeJwksClient(object):
+    def __init__(self, keys: dict):
+        self.keys = keys
+        self.calls = 0
+
+    def get_signing_keys(self):
+        self.calls += 1
+        return [SimpleNamespace(key_id=kid, key=key) for kid, key in self.keys.items()]
+
+
+class TestSecurity(APITestCase):
+    ISSUE_KEY = "O2OSTAFF-320"
+
+    @staticmethod
+    def setup_auth(monkeypatch, jwks_client=None, userinfo: dict = None):
+        """
+        Xoá cache, thay JWKS client và /userinfo bằng fake, trả về danh sách các lần gọi /userinfo
+        """
+        security.userinfo_cache.clear()
+        security.jwks_cache.clear()
+        monkeypatch.setattr(security, '_jwks_fetched_at', float('-inf'))
+        monkeypatch.setattr(security, 'jwks_client', jwks_client)
+        calls = []
+
+        def call_api(url, token_iam=None, **kwargs):
+            calls.append(token_iam)
+            return FakeResponse(userinfo or {'email': 'remote@example.com'})
+
+        monkeypatch.setattr(security, 'call_api', call_api)
+        return calls
+
+    @staticmethod
+    def rsa_token(private_key, kid: str = 'k1', exp: float = None, **claims) -> str:
+        payload = dict({'email': 'local@example.com', 'exp': int(exp or time.time() + 600)}, **claims)
+        return jwt.encode(payload, private_key, algorithm='RS256', headers={'kid': kid})
+
+    def test_verify_locally_with_jwks(self, monkeypatch):
+        """
+            Test verify token bằng JWKS tại local
+            Step by step:
+            - Token RS256 có kid nằm trong JWKS
+            - Gọi get_userinfo 2 lần
+            - Đầu ra mong muốn:
+                . Trả về claims của token, không gọi /userinfo
+                . JWKS chỉ được tải 1 lần, lần sau dùng cache
+        """
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        jwks_client = FakeJwksClient({'k1': private_key.public_key()})
+        calls = self.setup_auth(monkeypatch, jwks_client=jwks_client)
+        token = self.rsa_token(private_key)
+
+        first = security.get_userinfo('Bearer %s' % token)
+        security.userinfo_cache.clear()
+        second = security.get_userinfo('Bearer %s' % token)
+
+        assert first['email'] == second['email'] == 'local@example.com'
+        assert calls == []
+        assert jwks_client.calls == 1
+
+    def test_algorithm_is_pinned(self, monkeypatch):
+        """
+            Test token dùng thuật toán không được cấu hình (HS256)
+            Đầu ra mong muốn: không verify tại local, lấy userinfo từ /userinfo
+        """
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        calls = self.setup_auth(monkeypatch, jwks_client=FakeJwksClient({'k1': private_key.public_key()}))
+        token = jwt.encode({'email': 'forged@example.com'}, 'secret', algorithm='HS256', headers={'kid': 'k1'})
+
+        userinfo = security.get_userinfo('Bearer %s' % token)
+
+        assert userinfo['email'] == 'remote@example.com'
+        assert calls == ['Bearer %s' % token]
+
+    def test_unknown_kid_refetch_is_rate_limited(self, monkeypatch):
+        """
+            Test token có kid không có trong JWKS
+            Step by step:
+            - Gọi get_userinfo 3 lần với 3 token có kid lạ
+            - Đầu ra mong muốn:
+                . Fallback sang /userinfo
+                . JWKS chỉ được tải lại 1 lần trong JWKS_REFRESH_MIN_SECONDS
+        """
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        jwks_client = FakeJwksClient({'k1': private_key.public_key()})
+        calls = self.setup_auth(monkeypatch, jwks_client=jwks_client)
+
+        for index in range(3):
+            security.get_userinfo('Bearer %s' % self.rsa_token(private_key, kid='unknown-%s' % index))
+
+        assert len(calls) == 3
+        assert jwks_client.calls == 1
+
+    def test_fallback_and_cache_ttl(self, monkeypatch):
+        """
+            Test không có JWKS: lấy userinfo từ /userinfo và cache theo exp của token
+            Step by step:
+            - Token hết hạn sau 30 giây
+            - Gọi get_userinfo 2 lần
+            - Đầu ra mong muốn:
+                . /userinfo chỉ được gọi 1 lần
+                . Thời gian cache không vượt quá exp của token
+        """
+        calls = self.setup_auth(monkeypatch)
+        token = jwt.encode({'email': 'remote@example.com', 'exp': int(time.time() + 30)}, 'secret',
+                           algorithm='HS256')
+
+        security.get_userinfo('Bearer %s' % token)
+        userinfo = security.get_userinfo('Bearer %s' % token)
+
+        assert userinfo['email'] == 'remote@example.com'
+        assert len(calls) == 1
+        assert 0 < security._cache_ttl({'exp': time.time() + 30}) <= 30
+        assert security._cache_ttl({}) == security.settings.USERINFO_CACHE_SECONDS
+        assert security._cache_ttl({'exp': time.time() - 1}) <= 0
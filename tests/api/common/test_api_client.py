@@ -0,0 +1,132 @@
+from types import SimpleNamespace
+from typing import Tuple
+
+import pytest
+import requests
+
+from app.helpers import api_handler
+from app.helpers.api_handler import ApiClient
+from app.helpers.circuit_breaker import UpstreamGuard
+from app.helpers.exception_handler import CustomException
+from tests.api import APITestCase
+
+URL = 'http://iam.local/users'
+
+
+class StubSession(object):
+    """
+    Session giả: trả lần lượt các kết quả cho trước (status code hoặc exception), ghi lại các lần gọi
+    """
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.calls = []
+
+    def request(self, method, url, timeout=None, **kwargs):
+        self.calls.append((method, timeout))
+        result = self.results.pop(0) if len(self.results) > 1 else self.results[0]
+        if isinstance(result, Exception):
+            raise result
+        return SimpleNamespace(status_code=result, close=lambda: None)
+
+
+class TestApiClient(APITestCase):
+    ISSUE_KEY = "O2OSTAFF-320"
+
+    @staticmethod
+    def create_client(monkeypatch, session: StubSession, max_retries: int = 2, backoff: float = 0.1,
+                      backoff_max: float = 0.5) -> Tuple[ApiClient, list]:
+        """
+        ApiClient dùng session giả, guard không giới hạn retry, time.sleep được thay bằng hàm ghi lại thời gian chờ
+        """
+        client = ApiClient(pool_size=1, timeout=(1.5, 7), max_retries=max_retries, backoff=backoff,
+                           backoff_max=backoff_max)
+        guard = UpstreamGuard(name='Iam service', max_concurrency=1, acquire_timeout=0, failure_threshold=100,
+                              recovery_timeout=30, retry_ratio=1, min_retries=100)
+        sleeps = []
+        monkeypatch.setattr(api_handler, 'get_guard', lambda name: guard)
+        monkeypatch.setattr(api_handler, 'time', SimpleNamespace(sleep=sleeps.append))
+        monkeypatch.setattr(client, 'get_session', lambda url: session)
+        return client, sleeps
+
+    def test_retry_only_idempotent_methods(self, monkeypatch):
+        """
+            Test retry theo method
+            Step by step:
+            - Upstream luôn trả về 503, max_retries = 2
+            - Gọi GET, PUT, DELETE, POST, PATCH
+            - Gọi POST khi upstream mất kết nối
+            - Đầu ra mong muốn:
+                . GET, PUT, DELETE: gọi 3 lần (1 lần + 2 lần retry)
+                . POST, PATCH: gọi 1 lần, trả về response 503
+                . POST mất kết nối: gọi 1 lần, lỗi 990
+        """
+        calls = {}
+        for method in ('GET', 'PUT', 'DELETE', 'POST', 'PATCH'):
+            session = StubSession(503)
+            client, _ = self.create_client(monkeypatch, session)
+            response = client.request(method, URL)
+            calls[method] = (len(session.calls), response.status_code)
+
+        session = StubSession(requests.ConnectionError('connection refused'))
+        client, _ = self.create_client(monkeypatch, session)
+        with pytest.raises(CustomException) as e:
+            client.request('POST', URL)
+
+        assert calls == {'GET': (3, 503), 'PUT': (3, 503), 'DELETE': (3, 503), 'POST': (1, 503),
+                         'PATCH': (1, 503)}
+        assert len(session.calls) == 1
+        assert e.value.code == '990'
+
+    @pytest.mark.parametrize('status_code, total_calls', [(502, 2), (503, 2), (504, 2), (500, 1), (404, 1)])
+    def test_retry_gateway_errors(self, monkeypatch, status_code, total_calls):
+        """
+            Test retry theo status code
+            Step by step:
+            - Lần gọi đầu trả về status_code, lần sau trả về 200
+            - Đầu ra mong muốn:
+                . 502, 503, 504: được retry, trả về 200
+                . Status code khác: không retry, trả về status code đó
+        """
+        session = StubSession(status_code, 200)
+        client, _ = self.create_client(monkeypatch, session)
+
+        response = client.request('GET', URL)
+
+        assert len(session.calls) == total_calls
+        assert response.status_code == (200 if total_calls == 2 else status_code)
+
+    def test_backoff_within_backoff_max(self, monkeypatch):
+        """
+            Test thời gian chờ giữa các lần retry
+            Step by step:
+            - Upstream luôn mất kết nối, max_retries = 6, backoff = 0.1, backoff_max = 0.5
+            - Đầu ra mong muốn:
+                . Chờ 6 lần, lần thứ n chờ trong khoảng [0, min(backoff_max, backoff * 2^n)]
+                . Hết retry: lỗi 990
+        """
+        session = StubSession(requests.ConnectionError('connection refused'))
+        client, sleeps = self.create_client(monkeypatch, session, max_retries=6, backoff=0.1, backoff_max=0.5)
+
+        with pytest.raises(CustomException):
+            client.request('GET', URL)
+
+        assert len(session.calls) == 7
+        assert len(sleeps) == 6
+        for attempt, sleep in enumerate(sleeps):
+            assert 0 <= sleep <= min(0.5, 0.1 * 2 ** attempt)
+
+    def test_timeout_reaches_session(self, monkeypatch):
+        """
+            Test timeout truyền xuống session
+            Đầu ra mong muốn:
+                . Không truyền timeout: session nhận (connect, read) timeout của client
+                . Truyền timeout: session nhận timeout đó, kể cả ở lần retry
+        """
+        session = StubSession(503, 200, 503, 200)
+        client, _ = self.create_client(monkeypatch, session)
+
+        client.request('GET', URL)
+        client.request('GET', URL, timeout=(0.5, 30))
+
+        assert session.calls == [('GET', (1.5, 7)), ('GET', (1.5, 7)), ('GET', (0.5, 30)), ('GET', (0.5, 30))]
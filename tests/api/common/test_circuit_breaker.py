@@ -0,0 +1,157 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.config import settings
+from app.helpers import api_handler, circuit_breaker
+from app.helpers.api_handler import ApiClient
+from app.helpers.circuit_breaker import (STATE_CLOSED, STATE_HALF_OPEN, STATE_OPEN, CircuitBreaker, UpstreamGuard,
+                                         upstream_max_concurrency)
+from tests.api import APITestCase
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def create_guard(max_concurrency: int = 1) -> UpstreamGuard:
+    return UpstreamGuard(name='Iam service', max_concurrency=max_concurrency, acquire_timeout=0,
+                         failure_threshold=2, recovery_timeout=30, retry_ratio=0.2, min_retries=0)
+
+
+class TestCircuitBreaker(APITestCase):
+    ISSUE_KEY = "O2OSTAFF-320"
+
+    @staticmethod
+    def create_breaker(monkeypatch):
+        clock = FakeClock()
+        monkeypatch.setattr(circuit_breaker, 'time', SimpleNamespace(monotonic=clock))
+        return CircuitBreaker(failure_threshold=2, recovery_timeout=30), clock
+
+    def test_open_after_consecutive_failures(self, monkeypatch):
+        """
+            Test mở circuit
+            Step by step:
+            - 1 lỗi, 1 thành công, rồi 2 lỗi liên tiếp
+            - Đầu ra mong muốn:
+                . Thành công reset số lỗi, circuit vẫn đóng sau 2 lỗi không liên tiếp
+                . Circuit mở sau 2 lỗi liên tiếp và từ chối request
+        """
+        breaker, _ = self.create_breaker(monkeypatch)
+
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        state_after_one = breaker.state
+        breaker.record_failure()
+
+        assert state_after_one == STATE_CLOSED
+        assert breaker.state == STATE_OPEN
+        assert breaker.allow() is False
+
+    def test_half_open_lets_single_trial(self, monkeypatch):
+        """
+            Test circuit half open
+            Step by step:
+            - Mở circuit, chờ hết recovery_timeout
+            - Đầu ra mong muốn:
+                . Chưa hết recovery_timeout: từ chối
+                . Hết recovery_timeout: chỉ 1 request thử được đi qua
+                . Lượt thử bị huỷ (bulkhead đầy): request sau được thử lại
+        """
+        breaker, clock = self.create_breaker(monkeypatch)
+        breaker.record_failure()
+        breaker.record_failure()
+
+        clock.now += 29
+        before_timeout = breaker.allow()
+        clock.now += 1
+        first, second = breaker.allow(), breaker.allow()
+        breaker.cancel_trial()
+
+        assert before_timeout is False
+        assert (first, second) == (True, False)
+        assert breaker.state == STATE_HALF_OPEN
+        assert breaker.allow() is True
+
+    def test_trial_result_closes_or_reopens(self, monkeypatch):
+        """
+            Test kết quả của lượt thử half open
+            Đầu ra mong muốn:
+                . Lượt thử lỗi: circuit mở lại ngay (không cần đủ failure_threshold), tính lại recovery_timeout
+                . Lượt thử thành công: circuit đóng, số lỗi về 0
+        """
+        breaker, clock = self.create_breaker(monkeypatch)
+        breaker.record_failure()
+        breaker.record_failure()
+        clock.now += 30
+        breaker.allow()
+        breaker.record_failure()
+
+        assert breaker.state == STATE_OPEN
+        assert breaker.opened_at == clock.now
+        assert breaker.allow() is False
+
+        clock.now += 30
+        breaker.allow()
+        breaker.record_success()
+
+        assert (breaker.state, breaker.failures) == (STATE_CLOSED, 0)
+        assert breaker.allow() is True
+
+
+class TestUpstreamGuard(APITestCase):
+    ISSUE_KEY = "O2OSTAFF-320"
+
+    def test_bulkhead_full(self):
+        """
+            Test bulkhead hết slot
+            Đầu ra mong muốn: request thứ 2 bị từ chối, có slot lại sau khi request đầu release
+        """
+        guard = create_guard(max_concurrency=1)
+
+        first, second = guard.acquire(), guard.acquire()
+        guard.release(success=True)
+
+        assert (first, second) == (True, False)
+        assert guard.acquire() is True
+        assert guard.snapshot()['rejected_bulkhead'] == 1
+
+    def test_release_on_unexpected_error(self, monkeypatch):
+        """
+            Test ApiClient khi session ném lỗi không phải RequestException
+            Đầu ra mong muốn: lỗi được ném ra, slot bulkhead được trả lại, lỗi được tính cho circuit
+        """
+        guard = create_guard(max_concurrency=1)
+        client = ApiClient(pool_size=1, timeout=(1, 1), max_retries=0, backoff=0, backoff_max=0)
+
+        class BrokenSession(object):
+            def request(self, **kwargs):
+                raise ValueError('bad payload')
+
+        monkeypatch.setattr(api_handler, 'get_guard', lambda name: guard)
+        monkeypatch.setattr(client, 'get_session', lambda url: BrokenSession())
+
+        with pytest.raises(ValueError):
+            client.request('GET', 'http://iam.local/users')
+
+        assert guard.snapshot()['in_flight'] == 0
+        assert guard.snapshot()['failures'] == 1
+        assert guard.acquire() is True
+
+    def test_bulkhead_size_leaves_room_for_live_traffic(self, monkeypatch):
+        """
+            Test kích thước bulkhead mặc định
+            Đầu ra mong muốn: đủ cho worker đồng bộ IAM, worker outbox và request của người dùng
+        """
+        monkeypatch.setattr(settings, 'UPSTREAM_MAX_CONCURRENCY', 0)
+        default_size = upstream_max_concurrency()
+        monkeypatch.setattr(settings, 'UPSTREAM_MAX_CONCURRENCY', 5)
+
+        assert default_size == settings.IAM_SYNC_CONCURRENCY + settings.IAM_OUTBOX_CONCURRENCY + \
+            settings.UPSTREAM_LIVE_CONCURRENCY
+        assert upstream_max_concurrency() == 5
@@ -0,0 +1,135 @@
+import io
+
+import pytest
+from starlette.testclient import TestClient
+
+from app.api.base import api_common
+from app.core.config import settings
+from app.helpers.download import IMMUTABLE_CACHE_CONTROL, etag_matches, parse_range
+from app.helpers.local_storage import MemoryStorageHandler
+from tests.api import APITestCase
+
+DOWNLOAD_URL = f"{settings.BASE_API_PREFIX}/common/download/minio"
+DATA = bytes(range(100))
+
+
+class TestParseRange(APITestCase):
+    ISSUE_KEY = "O2OSTAFF-319"
+
+    def test_parse_range(self):
+        """
+            Test đọc header Range
+            Đầu ra mong muốn:
+                . Không có Range, nhiều range hoặc đơn vị khác bytes: trả về None (gửi toàn bộ file)
+                . bytes=a-b, bytes=a-, bytes=-n: khoảng byte (start, end) tính cả end, end không vượt quá file
+        """
+        assert parse_range(None, 100) is None
+        assert parse_range('items=0-1', 100) is None
+        assert parse_range('bytes=0-1,5-6', 100) is None
+        assert parse_range('bytes=-', 100) is None
+        assert parse_range('bytes=10-19', 100) == (10, 19)
+        assert parse_range('bytes=90-', 100) == (90, 99)
+        assert parse_range('bytes=90-200', 100) == (90, 99)
+        assert parse_range('bytes=-10', 100) == (90, 99)
+        assert parse_range('bytes=-200', 100) == (0, 99)
+
+    @pytest.mark.parametrize('range_header, size', [
+        ('bytes=100-', 100),
+        ('bytes=20-10', 100),
+        ('bytes=-0', 100),
+        ('bytes=0-', 0),
+        ('bytes=-10', 0),
+    ])
+    def test_unsatisfiable_range(self, range_header, size):
+        """
+            Test Range không đáp ứng được, kể cả với file rỗng
+            Đầu ra mong muốn: ValueError
+        """
+        with pytest.raises(ValueError):
+            parse_range(range_header, size)
+
+    def test_etag_matches(self):
+        """
+            Test so sánh header If-None-Match với ETag
+            Đầu ra mong muốn: khớp với *, ETag trong danh sách và weak ETag
+        """
+        assert etag_matches(None, '"abc"') is False
+        assert etag_matches('"xyz"', '"abc"') is False
+        assert etag_matches('*', '"abc"') is True
+        assert etag_matches('"xyz", "abc"', '"abc"') is True
+        assert etag_matches('W/"abc"', '"abc"') is True
+
+
+class TestDownloadFile(APITestCase):
+    ISSUE_KEY = "O2OSTAFF-319"
+
+    @staticmethod
+    def upload(monkeypatch, data: bytes = DATA) -> str:
+        storage = MemoryStorageHandler()
+        monkeypatch.setattr(api_common, 'storage', storage)
+        return storage.put_object(file_data=io.BytesIO(data), file_name='bao cao.pdf',
+                                  content_type='application/pdf')['file_name']
+
+    def test_download_whole_file(self, client: TestClient, monkeypatch):
+        """
+            Test api download file
+            Đầu ra mong muốn: status code 200, đủ nội dung, ETag và Cache-Control private immutable
+        """
+        file_name = self.upload(monkeypatch)
+
+        resp = client.get(f"{DOWNLOAD_URL}/{file_name}")
+
+        assert resp.status_code == 200
+        assert resp.content == DATA
+        assert resp.headers['ETag']
+        assert resp.headers['Cache-Control'] == IMMUTABLE_CACHE_CONTROL == 'private, max-age=31536000, immutable'
+
+    def test_not_modified(self, client: TestClient, monkeypatch):
+        """
+            Test api download file với If-None-Match bằng ETag của file
+            Đầu ra mong muốn: status code 304, không có nội dung
+        """
+        file_name = self.upload(monkeypatch)
+        etag = client.get(f"{DOWNLOAD_URL}/{file_name}").headers['ETag']
+
+        resp = client.get(f"{DOWNLOAD_URL}/{file_name}", headers={'If-None-Match': etag})
+
+        assert resp.status_code == 304
+        assert resp.content == b''
+
+    def test_partial_content(self, client: TestClient, monkeypatch):
+        """
+            Test api download một đoạn file
+            Step by step:
+            - Download với Range bytes=10-19
+            - Download với Range và If-Range là ETag cũ
+            - Đầu ra mong muốn:
+                . Range: status code 206, Content-Range và nội dung đúng đoạn byte
+                . If-Range không khớp: status code 200, trả về toàn bộ file
+        """
+        file_name = self.upload(monkeypatch)
+
+        resp = client.get(f"{DOWNLOAD_URL}/{file_name}", headers={'Range': 'bytes=10-19'})
+        stale = client.get(f"{DOWNLOAD_URL}/{file_name}", headers={'Range': 'bytes=10-19', 'If-Range': '"old"'})
+
+        assert resp.status_code == 206
+        assert resp.headers['Content-Range'] == 'bytes 10-19/100'
+        assert resp.content == DATA[10:20]
+        assert stale.status_code == 200
+        assert stale.content == DATA
+
+    def test_range_not_satisfiable(self, client: TestClient, monkeypatch):
+        """
+            Test api download với Range ngoài file, và với file rỗng
+            Đầu ra mong muốn: status code 416, Content-Range là bytes */<dung lượng>
+        """
+        file_name = self.upload(monkeypatch)
+        resp = client.get(f"{DOWNLOAD_URL}/{file_name}", headers={'Range': 'bytes=100-'})
+
+        empty_file_name = self.upload(monkeypatch, data=b'')
+        empty = client.get(f"{DOWNLOAD_URL}/{empty_file_name}", headers={'Range': 'bytes=-10'})
+
+        assert resp.status_code == 416
+        assert resp.headers['Content-Range'] == 'bytes */100'
+        assert empty.status_code == 416
+        assert empty.headers['Content-Range'] == 'bytes */0'
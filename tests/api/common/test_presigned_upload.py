@@ -0,0 +1,140 @@
+from datetime import timedelta
+
+from fastapi import FastAPI
+from fastapi_sqlalchemy import db
+from starlette.testclient import TestClient
+
+from app.core.config import settings
+from app.core.security import oauth2_scheme
+from app.helpers.enums import PresignedUploadStatus
+from app.helpers.local_storage import MemoryStorageHandler
+from app.helpers.time_helper import get_current_time
+from app.models import PresignedUpload
+from app.services import srv_upload
+from app.services.srv_upload import PresignedUploadCleaner
+from tests.api import APITestCase
+from tests.conftest import TestingSessionLocal
+
+PRESIGNED_URL = f"{settings.BASE_API_PREFIX}/common/upload/presigned"
+COMPLETE_URL = f"{settings.BASE_API_PREFIX}/common/upload/complete"
+HEADERS = {'Authorization': 'Bearer testing'}
+
+
+class PresignedMemoryStorage(MemoryStorageHandler):
+    def presigned_put_object(self, object_name, content_type, expires: timedelta) -> dict:
+        return {'url': 'memory://%s' % object_name, 'method': 'PUT', 'headers': {'Content-Type': content_type}}
+
+    def client_put(self, object_name: str, data: bytes):
+        """
+        Client upload thẳng lên storage bằng URL presigned
+        """
+        self.objects[object_name] = (data, {'etag': 'etag', 'size': len(data), 'content_type': 'application/pdf',
+                                            'last_modified': get_current_time()})
+
+
+class TestPresignedUpload(APITestCase):
+    ISSUE_KEY = "O2OSTAFF-319"
+
+    @staticmethod
+    def use_storage(app: FastAPI, monkeypatch, caller: dict) -> PresignedMemoryStorage:
+        """
+        Storage memory hỗ trợ URL presigned, người gọi api là caller['email']
+        """
+        storage = PresignedMemoryStorage()
+        monkeypatch.setattr(srv_upload, 'storage', storage)
+        app.dependency_overrides[oauth2_scheme] = lambda: caller['email']
+        return storage
+
+    @staticmethod
+    def uploads():
+        with db():
+            return {upload.object_name: (upload.email, upload.status)
+                    for upload in db.session.query(PresignedUpload).all()}
+
+    def test_complete_only_issued_object(self, app: FastAPI, client: TestClient, monkeypatch):
+        """
+            Test api complete file upload qua URL presigned
+            Step by step:
+            - a@example.com xin URL upload, upload file lên storage
+            - b@example.com gọi complete với file của a, gọi complete với tên file không được cấp
+            - a@example.com gọi complete 2 lần
+            - Đầu ra mong muốn:
+                . Người khác và tên file không được cấp: lỗi 142
+                . a complete lần đầu thành công, bản ghi chuyển sang completed
+                . Complete lần 2: lỗi 142
+        """
+        caller = {'email': 'a@example.com'}
+        storage = self.use_storage(app, monkeypatch, caller)
+
+        presigned = client.post(PRESIGNED_URL, json={'file_name': 'bao cao.pdf'}, headers=HEADERS).json()['data']
+        object_name = presigned['file_name']
+        storage.client_put(object_name, b'%PDF')
+        forged_name = object_name.replace('bao-cao', 'khac')
+        storage.client_put(forged_name, b'%PDF')
+
+        caller['email'] = 'b@example.com'
+        other_caller = client.post(COMPLETE_URL, json={'file_name': object_name}, headers=HEADERS)
+        not_issued = client.post(COMPLETE_URL, json={'file_name': forged_name}, headers=HEADERS)
+        caller['email'] = 'a@example.com'
+        completed = client.post(COMPLETE_URL, json={'file_name': object_name}, headers=HEADERS)
+        again = client.post(COMPLETE_URL, json={'file_name': object_name}, headers=HEADERS)
+
+        assert presigned['method'] == 'PUT'
+        assert (other_caller.status_code, other_caller.json()['code']) == (400, '142')
+        assert not_issued.json()['code'] == '142'
+        assert completed.status_code == 200
+        assert completed.json()['data']['file_name'] == object_name
+        assert again.json()['code'] == '142'
+        assert self.uploads() == {object_name: ('a@example.com', PresignedUploadStatus.COMPLETED.value)}
+
+    def test_oversized_file_is_removed(self, app: FastAPI, client: TestClient, monkeypatch):
+        """
+            Test api complete file lớn hơn giới hạn
+            Đầu ra mong muốn: lỗi 100, file bị xoá khỏi storage, bản ghi upload bị xoá
+        """
+        storage = self.use_storage(app, monkeypatch, {'email': 'a@example.com'})
+        monkeypatch.setattr(srv_upload, 'MAX_UPLOAD_SIZE', 10)
+
+        object_name = client.post(PRESIGNED_URL, json={'file_name': 'bao cao.pdf'},
+                                  headers=HEADERS).json()['data']['file_name']
+        storage.client_put(object_name, b'x' * 11)
+        resp = client.post(COMPLETE_URL, json={'file_name': object_name}, headers=HEADERS)
+
+        assert resp.json()['code'] == '100'
+        assert object_name not in storage.objects
+        assert self.uploads() == {}
+
+    def test_cleaner_removes_expired_pending_uploads(self, monkeypatch):
+        """
+            Test dọn file upload presigned không được complete
+            Step by step:
+            - Upload pending đã hết hạn quá grace: một file đã upload, một file chưa upload
+            - Upload pending chưa hết grace, upload completed đã hết hạn
+            - Chạy cleaner một lần
+            - Đầu ra mong muốn:
+                . 2 upload pending hết hạn bị xoá cả file và bản ghi
+                . Upload chưa hết grace và upload completed được giữ lại
+        """
+        storage = PresignedMemoryStorage()
+        monkeypatch.setattr(srv_upload, 'storage', storage)
+        now = get_current_time()
+        uploads = {
+            'expired-uploaded': (PresignedUploadStatus.PENDING, now - timedelta(hours=2)),
+            'expired-not-uploaded': (PresignedUploadStatus.PENDING, now - timedelta(hours=2)),
+            'in-grace': (PresignedUploadStatus.PENDING, now - timedelta(minutes=5)),
+            'completed': (PresignedUploadStatus.COMPLETED, now - timedelta(hours=2)),
+        }
+        with db():
+            for object_name, (status, expires_at) in uploads.items():
+                db.session.add(PresignedUpload(tenant_id=settings.IAM_TENANT_ID, email='a@example.com',
+                                               object_name=object_name, status=status.value, expires_at=expires_at))
+            db.session.commit()
+        for object_name in ('expired-uploaded', 'in-grace', 'completed'):
+            storage.client_put(object_name, b'data')
+
+        removed = PresignedUploadCleaner(interval_seconds=0, grace_seconds=60 * 60,
+                                         session_factory=TestingSessionLocal).run_once()
+
+        assert removed == 2
+        assert sorted(storage.objects) == ['completed', 'in-grace']
+        assert sorted(self.uploads()) == ['completed', 'in-grace']
@@ -0,0 +1,144 @@
+import asyncio
+import io
+
+import pytest
+from starlette.testclient import TestClient
+
+from app.api.base import api_common
+from app.core.config import settings
+from app.helpers.exception_handler import CustomException
+from app.helpers.local_storage import MemoryStorageHandler
+from app.helpers.storage_proxy import AsyncStorage
+from app.helpers.upload_stream import MULTIPART_OVERHEAD, SizeLimitedReader, _limit_stream
+from tests.api import APITestCase
+
+UPLOAD_URL = f"{settings.BASE_API_PREFIX}/common/upload/minio"
+
+
+async def read_stream(chunks: list, max_size: int) -> bytes:
+    async def stream():
+        for chunk in chunks:
+            yield chunk
+
+    return b''.join([chunk async for chunk in _limit_stream(stream(), max_size)])
+
+
+class TestSizeLimitedReader(APITestCase):
+    ISSUE_KEY = "O2OSTAFF-319"
+
+    def test_read_until_limit(self):
+        """
+            Test đọc file qua SizeLimitedReader
+            Step by step:
+            - Đọc file 10 byte với giới hạn 10 byte, rồi với giới hạn 9 byte
+            - Đầu ra mong muốn:
+                . Giới hạn 10 byte: đọc đủ nội dung, tell() trả về số byte đã đọc
+                . Giới hạn 9 byte: lỗi 100 khi đọc vượt giới hạn
+        """
+        reader = SizeLimitedReader(io.BytesIO(b'0123456789'), max_size=10)
+        data = reader.read(4) + reader.read()
+
+        assert data == b'0123456789'
+        assert reader.tell() == 10
+
+        reader = SizeLimitedReader(io.BytesIO(b'0123456789'), max_size=9)
+        with pytest.raises(CustomException) as e:
+            reader.read()
+        assert (e.value.http_code, e.value.code) == (400, '100')
+
+    def test_seek_recounts_size(self):
+        """
+            Test seek về đầu file sau khi đọc hết
+            Đầu ra mong muốn: dung lượng được đếm lại từ vị trí mới, đọc lại lần 2 không bị báo quá dung lượng
+        """
+        reader = SizeLimitedReader(io.BytesIO(b'0123456789'), max_size=10)
+        reader.read()
+        reader.seek(0)
+
+        assert reader.tell() == 0
+        assert reader.read() == b'0123456789'
+
+    def test_limit_stream(self):
+        """
+            Test giới hạn dung lượng body khi stream
+            Đầu ra mong muốn: body đúng giới hạn đọc được đủ, body vượt giới hạn bị cắt bằng lỗi 100
+        """
+        assert asyncio.run(read_stream([b'abc', b'def'], max_size=6)) == b'abcdef'
+        with pytest.raises(CustomException) as e:
+            asyncio.run(read_stream([b'abc', b'def', b'g'], max_size=6))
+        assert e.value.code == '100'
+
+
+class TestUploadFile(APITestCase):
+    ISSUE_KEY = "O2OSTAFF-319"
+
+    @staticmethod
+    def use_memory_storage(monkeypatch, max_size: int = None):
+        storage = MemoryStorageHandler()
+        monkeypatch.setattr(api_common, 'async_storage', AsyncStorage(storage))
+        if max_size is not None:
+            monkeypatch.setattr(api_common, 'MAX_UPLOAD_SIZE', max_size)
+        return storage
+
+    def test_upload_success(self, client: TestClient, monkeypatch):
+        """
+            Test api upload file
+            Đầu ra mong muốn: status code 200, file được lưu đủ nội dung
+        """
+        storage = self.use_memory_storage(monkeypatch)
+
+        resp = client.post(UPLOAD_URL, files={'file': ('Danh sach.xlsx', b'x' * 1024, 'application/octet-stream')})
+        data = resp.json()
+
+        assert resp.status_code == 200
+        assert storage.stat_object(data['data']['file_name'])['size'] == 1024
+
+    def test_content_length_too_large(self, client: TestClient, monkeypatch):
+        """
+            Test api upload file có Content-Length lớn hơn giới hạn
+            Đầu ra mong muốn: lỗi 100 trước khi đọc body, không có file nào được lưu
+        """
+        storage = self.use_memory_storage(monkeypatch, max_size=1024)
+        body = b'x' * (1024 + MULTIPART_OVERHEAD + 1)
+
+        resp = client.post(UPLOAD_URL, data=body, headers={'Content-Type': 'multipart/form-data; boundary=abc'})
+
+        assert resp.status_code == 400
+        assert resp.json()['code'] == '100'
+        assert storage.objects == {}
+
+    def test_file_larger_than_limit_while_streaming(self, client: TestClient, monkeypatch):
+        """
+            Test api upload file lớn hơn giới hạn nhưng body vẫn nằm trong phần dư cho header multipart
+            Đầu ra mong muốn: lỗi 100 khi đẩy file lên storage, không có file nào được lưu
+        """
+        storage = self.use_memory_storage(monkeypatch, max_size=1024)
+
+        resp = client.post(UPLOAD_URL, files={'file': ('Danh sach.xlsx', b'x' * 2048, 'application/octet-stream')})
+
+        assert resp.status_code == 400
+        assert resp.json()['code'] == '100'
+        assert storage.objects == {}
+
+    def test_malformed_multipart(self, client: TestClient, monkeypatch):
+        """
+            Test api upload file với body không phải multipart
+            Đầu ra mong muốn: lỗi 045 với status code 400, không phải lỗi 500
+        """
+        self.use_memory_storage(monkeypatch)
+
+        resp = client.post(UPLOAD_URL, data=b'not a multipart body', headers={'Content-Type': 'multipart/form-data'})
+
+        assert resp.status_code == 400
+        assert resp.json()['code'] == '045'
+
+    def test_file_field_in_openapi(self, client: TestClient):
+        """
+            Test tài liệu OpenAPI của api upload file
+            Đầu ra mong muốn: request body multipart có field file dạng binary
+        """
+        schema = client.get('/openapi.json').json()
+        body = schema['paths'][UPLOAD_URL]['post']['requestBody']['content']['multipart/form-data']['schema']
+
+        assert body['required'] == ['file']
+        assert body['properties']['file'] == {'type': 'string', 'format': 'binary'}
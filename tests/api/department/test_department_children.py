@@ -0,0 +1,59 @@
+from types import SimpleNamespace
+
+from app.services.srv_department import DepartmentService
+from tests.api import APITestCase
+
+
+def department(department_id: int, parent_id: int = None):
+    return SimpleNamespace(id=department_id, parent_id=parent_id)
+
+
+class TestDepartmentListChildren(APITestCase):
+    ISSUE_KEY = "O2OSTAFF-284"
+
+    def test_pre_order_depth_first(self):
+        """
+            Test lấy toàn bộ phòng ban con, không qua API
+            Step by step:
+            - Cây: 1 -> (2 -> (4, 5), 3 -> 6), phòng ban 7 không thuộc cây
+            - Đầu ra mong muốn: duyệt theo chiều sâu, cha trước con, con theo thứ tự trong danh sách
+        """
+        departments = [department(1), department(2, 1), department(3, 1), department(4, 2), department(5, 2),
+                       department(6, 3), department(7)]
+
+        children = DepartmentService().get_list_children(node_department=departments[0],
+                                                         all_departments=departments)
+
+        assert [child.id for child in children] == [2, 4, 5, 3, 6]
+
+    def test_new_list_on_every_call(self):
+        """
+            Test gọi get_list_children nhiều lần với cùng một service
+            Đầu ra mong muốn: mỗi lần gọi trả về list mới, không cộng dồn kết quả của lần gọi trước
+        """
+        departments = [department(1), department(2, 1), department(3, 2), department(4)]
+        service = DepartmentService()
+        children_index = service.build_children_index(departments)
+
+        first = service.get_list_children(departments[0], departments, children_index=children_index)
+        second = service.get_list_children(departments[1], departments, children_index=children_index)
+        third = service.get_list_children(departments[0], departments)
+
+        assert [child.id for child in first] == [2, 3]
+        assert [child.id for child in second] == [3]
+        assert [child.id for child in third] == [2, 3]
+        assert first is not third
+
+    def test_parent_cycle(self):
+        """
+            Test dữ liệu parent_id bị vòng lặp
+            Step by step:
+            - 1 -> 2 -> 3 -> 1, 3 -> 4
+            - Đầu ra mong muốn: hàm dừng, mỗi phòng ban xuất hiện một lần, không trả về chính phòng ban gốc
+        """
+        departments = [department(1, 3), department(2, 1), department(3, 2), department(4, 3)]
+
+        children = DepartmentService().get_list_children(node_department=departments[0],
+                                                         all_departments=departments)
+
+        assert [child.id for child in children] == [2, 3, 4]
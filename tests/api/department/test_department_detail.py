@@ -7,7 +7,7 @@ from starlette.responses import JSONResponse
 from starlette.testclient import TestClient
 
 from app.core.config import settings
-from app.models import DepartmentStaff
+from app.models import DepartmentStaff, StaffTeam
 from app.schemas.sche_base import ResponseSchemaBase
 from tests.api import APITestCase
 from tests.faker import fake
@@ -206,6 +206,43 @@ class TestGetDepartmentDetailAPI(APITestCase):
         assert data.get('data')['company']['id'] == company.id
         assert len(data.get('data')['staff']) == number_staffs
 
+    def test_000_response_subtree_staff_with_teams(self, client: TestClient):
+        """
+            Test api get Department Detail response code 000 với nhân viên của cả cây phòng ban
+            Step by step:
+            - Tạo 3 cấp Department, mỗi Department có 1 staff
+            - Thêm staff của Department cấp cuối vào 1 team
+            - Gọi API Department Detail với id của Department gốc
+            - Đầu ra mong muốn:
+                . status code: 200
+                . code: 000
+                . detail có 3 staff, staff của Department cấp cuối có 1 team
+        """
+        company = fake.company_provider()
+        department = fake.department({'company_id': company.id, 'is_active': True})
+        department_child = fake.department({'company_id': company.id, 'parent_id': department.id, 'is_active': True})
+        department_grandchild = fake.department({
+            'company_id': company.id, 'parent_id': department_child.id, 'is_active': True})
+        staffs = [fake.add_staff_to_department(
+            company=company, staff=fake.staff_provider({'company_id': company.id, 'is_active': True}),
+            department=item) for item in [department, department_child, department_grandchild]]
+        team = fake.team({'company_id': company.id, 'is_active': True})
+        with db():
+            db.session.add(StaffTeam(staff_id=staffs[-1].id, team_id=team.id, is_active=True))
+            db.session.commit()
+
+        resp = client.get(f"{settings.BASE_API_PREFIX}/departments/{department.id}")
+        data = resp.json()
+        staff_teams = {staff['id']: staff['team'] for staff in data.get('data')['staff']}
+
+        assert resp.status_code == 200
+        assert data.get('code') == '000'
+        assert data.get('data')['count_staffs'] == 3
+        assert set(staff_teams.keys()) == {staff.id for staff in staffs}
+        assert [item['team_id'] for item in staff_teams[staffs[-1].id]] == [team.id]
+        assert staff_teams[staffs[0].id] == []
+        assert data.get('data')['children'][0]['children'][0]['department']['id'] == department_grandchild.id
+
     def test_091_response_department_not_exits(self, client: TestClient):
         """
             Test api get Department Detail response code 091
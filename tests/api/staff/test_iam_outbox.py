@@ -0,0 +1,128 @@
+from datetime import timedelta
+
+from fastapi_sqlalchemy import db
+
+from app.core.config import settings
+from app.helpers.enums import IamOutboxEvent, IamOutboxStatus
+from app.helpers.time_helper import get_current_time
+from app.models import IamOutbox
+from app.schemas.sche_staff import StaffIamUploadFile
+from app.services import srv_iam_outbox
+from app.services.srv_iam_outbox import IamOutboxWorker, enqueue_iam_events
+from tests.api import APITestCase
+from tests.conftest import TestingSessionLocal
+
+
+def iam_staff(email: str, role: str = 'sale') -> StaffIamUploadFile:
+    return StaffIamUploadFile(full_name=email, email=email, phone_number='0912345678', role=role)
+
+
+class TestIamOutboxWorker(APITestCase):
+    ISSUE_KEY = "O2OSTAFF-320"
+
+    @staticmethod
+    def create_worker(monkeypatch, failing_emails=(), max_attempts: int = 3):
+        """
+        Worker dùng DB test, handle được thay bằng hàm ghi lại các event, email trong failing_emails bị lỗi
+        """
+        monkeypatch.setattr(srv_iam_outbox, 'SessionLocal', TestingSessionLocal)
+        worker = IamOutboxWorker(batch_size=100, concurrency=2, max_attempts=max_attempts)
+        handled = []
+
+        def handle(event_type, staff):
+            handled.append((event_type, staff.email))
+            if staff.email in failing_emails:
+                raise Exception('IAM error')
+
+        worker.handle = handle
+        return worker, handled
+
+    @staticmethod
+    def outbox_status():
+        with db():
+            return {(event.email, event.event_type): (event.status, event.attempts, event.last_error)
+                    for event in db.session.query(IamOutbox).all()}
+
+    def test_drain_latest_event_of_each_email(self, monkeypatch):
+        """
+            Test xử lý outbox IAM
+            Step by step:
+            - Thêm event sync_staff rồi update_role cho email a, remove_role cho email b, update_role cho email c
+            - IAM lỗi với email c
+            - Chạy drain_once
+            - Đầu ra mong muốn:
+                . Email a chỉ xử lý event mới nhất, bằng sync_staff vì user có thể chưa được tạo
+                . Email b xử lý remove_role
+                . Event của a, b done, event của c quay về pending với attempts = 1 và lỗi
+        """
+        with db():
+            enqueue_iam_events(db.session, IamOutboxEvent.SYNC_STAFF, [iam_staff('a@example.com')])
+            enqueue_iam_events(db.session, IamOutboxEvent.UPDATE_ROLE, [iam_staff('a@example.com', 'team-lead')])
+            enqueue_iam_events(db.session, IamOutboxEvent.REMOVE_ROLE, [iam_staff('b@example.com')])
+            enqueue_iam_events(db.session, IamOutboxEvent.UPDATE_ROLE, [iam_staff('c@example.com')])
+            db.session.commit()
+        worker, handled = self.create_worker(monkeypatch, failing_emails={'c@example.com'})
+
+        processed = worker.drain_once()
+        status = self.outbox_status()
+
+        assert processed == 4
+        assert sorted(handled) == [(IamOutboxEvent.REMOVE_ROLE.value, 'b@example.com'),
+                                   (IamOutboxEvent.SYNC_STAFF.value, 'a@example.com'),
+                                   (IamOutboxEvent.UPDATE_ROLE.value, 'c@example.com')]
+        assert status[('a@example.com', IamOutboxEvent.SYNC_STAFF.value)][0] == IamOutboxStatus.DONE.value
+        assert status[('a@example.com', IamOutboxEvent.UPDATE_ROLE.value)] == (IamOutboxStatus.DONE.value, 1, None)
+        assert status[('b@example.com', IamOutboxEvent.REMOVE_ROLE.value)] == (IamOutboxStatus.DONE.value, 1, None)
+        assert status[('c@example.com', IamOutboxEvent.UPDATE_ROLE.value)] == \
+            (IamOutboxStatus.PENDING.value, 1, 'IAM error')
+        assert worker.drain_once() == 0  # event lỗi chỉ được xử lý lại sau backoff
+
+    def test_failed_after_max_attempts(self, monkeypatch):
+        """
+            Test event lỗi quá số lần cho phép
+            Đầu ra mong muốn: event chuyển sang failed
+        """
+        with db():
+            enqueue_iam_events(db.session, IamOutboxEvent.UPDATE_ROLE, [iam_staff('c@example.com')])
+            db.session.commit()
+        worker, _ = self.create_worker(monkeypatch, failing_emails={'c@example.com'}, max_attempts=1)
+
+        worker.drain_once()
+
+        assert self.outbox_status()[('c@example.com', IamOutboxEvent.UPDATE_ROLE.value)] == \
+            (IamOutboxStatus.FAILED.value, 1, 'IAM error')
+
+    def test_expired_lease_is_claimed_again(self, monkeypatch):
+        """
+            Test event processing quá thời gian lease
+            Đầu ra mong muốn: claim trả lại event dưới dạng dict, dùng được sau khi session đã đóng
+        """
+        with db():
+            enqueue_iam_events(db.session, IamOutboxEvent.UPDATE_ROLE, [iam_staff('d@example.com')])
+            db.session.query(IamOutbox).update({
+                'status': IamOutboxStatus.PROCESSING.value,
+                'updated_at': get_current_time() - timedelta(seconds=settings.IAM_OUTBOX_LEASE_SECONDS + 1)
+            }, synchronize_session=False)
+            db.session.commit()
+        worker, _ = self.create_worker(monkeypatch)
+
+        events = worker.claim()
+
+        assert [(event['email'], event['event_type'], event['attempts']) for event in events] == [
+            ('d@example.com', IamOutboxEvent.UPDATE_ROLE.value, 0)]
+        assert self.outbox_status()[('d@example.com', IamOutboxEvent.UPDATE_ROLE.value)][0] == \
+            IamOutboxStatus.PROCESSING.value
+
+    def test_not_started_without_service_token(self, monkeypatch):
+        """
+            Test khởi động worker khi chưa cấu hình IAM_SERVICE_TOKEN
+            Đầu ra mong muốn: worker không chạy, không tạo thread pool
+        """
+        monkeypatch.setattr(settings, 'IAM_SERVICE_TOKEN', '')
+        worker = IamOutboxWorker()
+
+        worker.start()
+
+        assert worker._thread is None
+        assert worker._executor is None
+        worker.stop()
@@ -0,0 +1,173 @@
+import threading
+import time
+from datetime import timedelta
+
+from fastapi_sqlalchemy import db
+from starlette.testclient import TestClient
+
+from app.core.config import settings
+from app.helpers.enums import SyncRunStatus, SyncTrigger
+from app.helpers.time_helper import get_current_time
+from app.models import SyncRun
+from app.services import srv_sync_scheduler
+from app.services.srv_sync_scheduler import IamSyncScheduler
+from app.services.srv_synchronized import IAM_SYNC_NAME
+from tests.api import APITestCase
+from tests.conftest import TestingSessionLocal
+
+HEADERS = {'Authorization': 'Bearer testing'}
+REPORT = {'total': 2, 'created': 1, 'updated': 1, 'unchanged': 0, 'failed': 0}
+
+
+class TestIamSyncScheduler(APITestCase):
+    ISSUE_KEY = "O2OSTAFF-320"
+
+    @staticmethod
+    def use_fake_sync(monkeypatch):
+        """
+        synchronized_srv được thay bằng hàm ghi lại các lần gọi
+        """
+        calls = []
+
+        def synchronized_srv(token, full=False):
+            calls.append((token, full))
+            return REPORT
+
+        monkeypatch.setattr(srv_sync_scheduler, 'synchronized_srv', synchronized_srv)
+        return calls
+
+    @staticmethod
+    def sync_runs():
+        with db():
+            return [(run.trigger, run.status) for run in db.session.query(SyncRun).order_by(SyncRun.id.asc()).all()]
+
+    def test_run_once_records_sync_run(self, monkeypatch):
+        """
+            Test chạy đồng bộ IAM một lần
+            Đầu ra mong muốn: SyncRun success với số liệu của lần đồng bộ
+        """
+        calls = self.use_fake_sync(monkeypatch)
+
+        run = IamSyncScheduler(session_factory=TestingSessionLocal).run_once('Bearer testing', full=True)
+
+        assert calls == [('Bearer testing', True)]
+        assert (run.status, run.total, run.created, run.updated, run.full) == \
+            (SyncRunStatus.SUCCESS.value, 2, 1, 1, 1)
+        assert self.sync_runs() == [(SyncTrigger.MANUAL.value, SyncRunStatus.SUCCESS.value)]
+
+    def test_periodic_run_skipped_when_ran_recently(self, monkeypatch):
+        """
+            Test đồng bộ định kỳ khi API worker khác vừa chạy
+            Step by step:
+            - Tạo SyncRun bắt đầu 10 giây trước
+            - Chạy đồng bộ định kỳ với interval 60 giây, rồi với interval 5 giây
+            - Đầu ra mong muốn:
+                . Interval 60 giây: không đồng bộ, không ghi thêm SyncRun
+                . Interval 5 giây: đồng bộ bình thường
+        """
+        calls = self.use_fake_sync(monkeypatch)
+        with db():
+            db.session.add(SyncRun(tenant_id=settings.IAM_TENANT_ID, sync_name=IAM_SYNC_NAME,
+                                   trigger=SyncTrigger.PERIODIC.value, status=SyncRunStatus.SUCCESS.value,
+                                   full=0, started_at=get_current_time() - timedelta(seconds=10)))
+            db.session.commit()
+
+        skipped = IamSyncScheduler(interval_seconds=60, session_factory=TestingSessionLocal).run_once(
+            'Bearer testing', trigger=SyncTrigger.PERIODIC)
+        run = IamSyncScheduler(interval_seconds=5, session_factory=TestingSessionLocal).run_once(
+            'Bearer testing', trigger=SyncTrigger.PERIODIC)
+
+        assert skipped is None
+        assert run.status == SyncRunStatus.SUCCESS.value
+        assert len(calls) == 1
+        assert self.sync_runs() == [(SyncTrigger.PERIODIC.value, SyncRunStatus.SUCCESS.value)] * 2
+
+    def test_trigger_coalesces_into_one_follow_up(self, monkeypatch):
+        """
+            Test gọi đồng bộ khi đang có lần đồng bộ chạy
+            Step by step:
+            - Lần đồng bộ đầu bị chặn cho đến khi test cho phép chạy tiếp
+            - Gọi thêm 2 lần, một lần full
+            - Đầu ra mong muốn:
+                . 2 lần gọi sau được gộp vào 1 lần chạy tiếp theo, lần chạy đó là full
+        """
+        scheduler = IamSyncScheduler(session_factory=TestingSessionLocal)
+        release, finished, calls = threading.Event(), threading.Event(), []
+
+        def run_once(token, full=False, trigger=SyncTrigger.MANUAL):
+            calls.append(full)
+            if len(calls) == 1:
+                release.wait(5)
+            else:
+                finished.set()
+
+        monkeypatch.setattr(scheduler, 'run_once', run_once)
+
+        first = scheduler.trigger('Bearer testing')
+        second = scheduler.trigger('Bearer testing', full=True)
+        third = scheduler.trigger('Bearer testing')
+        release.set()
+        finished.wait(5)
+
+        assert first == {'started': True, 'coalesced': False}
+        assert second == third == {'started': False, 'coalesced': True}
+        assert calls == [False, True]
+
+    def test_stop_joins_periodic_thread(self):
+        """
+            Test dừng scheduler
+            Đầu ra mong muốn: thread đồng bộ định kỳ đã kết thúc khi stop() trả về
+        """
+        scheduler = IamSyncScheduler(interval_seconds=3600)
+        scheduler.start()
+        thread = scheduler._periodic_thread
+
+        scheduler.stop()
+
+        assert thread.is_alive() is False
+        assert scheduler._periodic_thread is None
+
+    def test_stop_waits_for_running_sync(self, monkeypatch):
+        """
+            Test dừng scheduler khi đang có lần đồng bộ chạy
+            Step by step:
+            - Lần đồng bộ đầu chạy chậm, gọi thêm 1 lần được gộp vào lần chạy tiếp theo
+            - Gọi stop()
+            - Đầu ra mong muốn:
+                . stop() trả về sau khi lần đồng bộ đang chạy kết thúc
+                . Lần chạy tiếp theo bị bỏ, scheduler không còn running
+        """
+        scheduler = IamSyncScheduler(session_factory=TestingSessionLocal)
+        started, calls = threading.Event(), []
+
+        def run_once(token, full=False, trigger=SyncTrigger.MANUAL):
+            started.set()
+            time.sleep(0.2)
+            calls.append(full)
+
+        monkeypatch.setattr(scheduler, 'run_once', run_once)
+
+        scheduler.trigger('Bearer testing')
+        started.wait(5)
+        thread = scheduler._sync_thread
+        scheduler.trigger('Bearer testing', full=True)
+        scheduler.stop()
+
+        assert thread.is_alive() is False
+        assert calls == [False]
+        assert scheduler.running is False
+
+    def test_status_endpoint_is_mounted(self, client: TestClient, monkeypatch):
+        """
+            Test api GET trạng thái đồng bộ IAM
+            Đầu ra mong muốn: status code 200, trả về lần đồng bộ gần nhất
+        """
+        self.use_fake_sync(monkeypatch)
+        IamSyncScheduler(session_factory=TestingSessionLocal).run_once('Bearer testing')
+
+        resp = client.get(f"{settings.BASE_API_PREFIX}/common/synchronized/status", headers=HEADERS)
+        data = resp.json()
+
+        assert resp.status_code == 200
+        assert data['data']['running'] is False
+        assert data['data']['last_run']['status'] == SyncRunStatus.SUCCESS.value
@@ -0,0 +1,108 @@
+from datetime import timedelta
+
+from fastapi_sqlalchemy import db
+
+from app.core.config import settings
+from app.helpers.enums import SalesRoleName
+from app.helpers.time_helper import get_current_time
+from app.models import Staff, DepartmentStaff, RoleTitle, SyncWatermark
+from app.services import srv_synchronized
+from app.services.srv_synchronized import gather_sales_staffs, get_watermark, synchronized_srv
+from tests.api import APITestCase
+from tests.faker import fake
+
+
+class TestStaffIamSync(APITestCase):
+    ISSUE_KEY = "O2OSTAFF-320"
+
+    @staticmethod
+    def create_sales_staffs(total: int = 2):
+        """
+        Tạo company, department, role title sale và các nhân viên sale, mọi bản ghi có updated_at 2 ngày trước
+        """
+        company = fake.company_provider()
+        department = fake.department({'company_id': company.id, 'is_active': True})
+        role_title = fake.role_title_provider({
+            'company_id': company.id, 'department_id': department.id, 'is_active': True,
+            'role_title_name': SalesRoleName.SALE.value})
+        staffs = [fake.add_staff_to_department(company=company, staff=None, department=department,
+                                               role_title=role_title) for _ in range(total)]
+        old = get_current_time() - timedelta(days=2)
+        with db():
+            staff_ids = [staff.id for staff in staffs]
+            db.session.query(Staff).filter(Staff.id.in_(staff_ids)).update(
+                {'updated_at': old}, synchronize_session=False)
+            db.session.query(DepartmentStaff).filter(DepartmentStaff.staff_id.in_(staff_ids)).update(
+                {'updated_at': old}, synchronize_session=False)
+            db.session.query(RoleTitle).filter(RoleTitle.id == role_title.id).update(
+                {'updated_at': old}, synchronize_session=False)
+            db.session.commit()
+        return staffs
+
+    @staticmethod
+    def reset_watermark():
+        with db():
+            db.session.query(SyncWatermark).filter(SyncWatermark.tenant_id == settings.IAM_TENANT_ID).delete()
+            db.session.commit()
+
+    def test_incremental_selection(self):
+        """
+            Test lấy nhân viên sale thay đổi sau một mốc thời gian
+            Step by step:
+            - Tạo 2 nhân viên sale có updated_at 2 ngày trước
+            - Cập nhật nhân viên thứ 2
+            - Đầu ra mong muốn:
+                . Không có mốc: lấy cả 2 nhân viên
+                . Mốc 1 ngày trước: chỉ lấy nhân viên thứ 2
+        """
+        staffs = self.create_sales_staffs()
+        emails = {staff.email for staff in staffs}
+        with db():
+            db.session.query(Staff).filter(Staff.id == staffs[1].id).update(
+                {'updated_at': get_current_time()}, synchronize_session=False)
+            db.session.commit()
+
+            all_emails = {staff.email for staff in gather_sales_staffs()} & emails
+            changed_emails = {staff.email for staff in gather_sales_staffs(
+                since=get_current_time() - timedelta(days=1))} & emails
+
+        assert all_emails == emails
+        assert changed_emails == {staffs[1].email}
+
+    def test_watermark_only_moves_after_success(self, monkeypatch):
+        """
+            Test lưu mốc đồng bộ IAM
+            Step by step:
+            - Xoá mốc đồng bộ của tenant
+            - Đồng bộ có 1 nhân viên lỗi
+            - Đồng bộ thành công
+            - Đồng bộ thành công với thời điểm bắt đầu sớm hơn mốc đã lưu
+            - Đầu ra mong muốn:
+                . Lần lỗi không lưu mốc
+                . Lần thành công lưu mốc = thời điểm bắt đầu - IAM_SYNC_WATERMARK_OVERLAP_SECONDS
+                . Lần đồng bộ sau lấy nhân viên thay đổi từ mốc đã lưu, mốc không bị lùi lại
+        """
+        self.reset_watermark()
+        started_at = get_current_time()
+        reports, since_values = [{'failed': 1}, {'failed': 0}, {'failed': 0}], []
+        monkeypatch.setattr(srv_synchronized, 'get_current_time', lambda: started_at)
+        monkeypatch.setattr(srv_synchronized.IamSyncEngine, 'run', lambda engine, staffs: reports.pop(0))
+        monkeypatch.setattr(srv_synchronized, 'gather_sales_staffs',
+                            lambda since=None: since_values.append(since) or [])
+
+        with db():
+            synchronized_srv('Bearer testing', bulk=False)
+            after_failure = get_watermark()
+
+            synchronized_srv('Bearer testing', bulk=False)
+            after_success = get_watermark().last_synced_at
+
+            started_at = started_at - timedelta(hours=1)
+            synchronized_srv('Bearer testing', bulk=False)
+            after_older_run = get_watermark().last_synced_at
+
+        expected = started_at + timedelta(hours=1) - timedelta(seconds=settings.IAM_SYNC_WATERMARK_OVERLAP_SECONDS)
+        assert after_failure is None
+        assert after_success == expected
+        assert since_values == [None, None, expected]
+        assert after_older_run == expected
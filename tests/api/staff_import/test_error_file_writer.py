@@ -0,0 +1,61 @@
+from openpyxl import load_workbook
+
+from app.helpers.error_file_writer import write_error_file
+from tests.api import APITestCase
+
+COLUMNS = ['Fullname', 'StaffCode', 'Email', 'Error']
+ERROR_COLUMNS = {'Email không hợp lệ': 2, 'Lỗi không rõ cột': None}
+ROWS = [
+    ['Nguyen Van A', 'NV01', 'a@example.com'],
+    ['Nguyen Van B', 'NV02', 'b-example.com', 'Email không hợp lệ'],
+    ['Nguyen Van C', '0123', 'c@example.com', 'Lỗi không rõ cột'],
+]
+
+
+class TestErrorFileWriter(APITestCase):
+    ISSUE_KEY = "O2OSTAFF-319"
+
+    @staticmethod
+    def read_back(path: str):
+        return load_workbook(path).active
+
+    def test_highlight_and_comment_error_cell(self, tmp_path):
+        """
+            Test ghi file lỗi
+            Step by step:
+            - Ghi 3 dòng: 1 dòng hợp lệ, 1 dòng lỗi email, 1 dòng lỗi không gắn với cột nào
+            - Đọc lại file bằng openpyxl
+            - Đầu ra mong muốn:
+                . Header và dữ liệu giữ nguyên dạng chuỗi (mã '0123' không bị đổi thành số)
+                . Ô email của dòng lỗi được tô màu và có comment là nội dung lỗi
+                . Cột lỗi là cột cuối, dòng hợp lệ không có lỗi
+        """
+        path = str(tmp_path / 'error_file.xlsx')
+
+        total = write_error_file(path, ROWS, COLUMNS, ERROR_COLUMNS)
+        sheet = self.read_back(path)
+        values = [list(row) for row in sheet.iter_rows(values_only=True)]
+
+        assert total == 3
+        assert values[0] == COLUMNS
+        assert values[1] == ROWS[0] + [None]
+        assert values[2] == ROWS[1]
+        assert values[3] == ROWS[2]
+        assert sheet['C3'].fill.fgColor.rgb == 'FFFFC7CE'
+        assert sheet['C3'].comment.text == 'Email không hợp lệ'
+        assert sheet['B3'].comment is None
+        assert sheet['C2'].fill.fgColor.rgb != 'FFFFC7CE'
+        assert all(cell.comment is None for cell in sheet[4])
+
+    def test_only_error_rows(self, tmp_path):
+        """
+            Test ghi file lỗi chỉ gồm các dòng lỗi
+            Đầu ra mong muốn: dòng hợp lệ bị bỏ qua, chỉ còn header và 2 dòng lỗi
+        """
+        path = str(tmp_path / 'error_file.xlsx')
+
+        total = write_error_file(path, ROWS, COLUMNS, ERROR_COLUMNS, only_errors=True)
+        values = [list(row) for row in self.read_back(path).iter_rows(values_only=True)]
+
+        assert total == 2
+        assert values == [COLUMNS, ROWS[1], ROWS[2]]
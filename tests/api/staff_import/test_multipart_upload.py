@@ -0,0 +1,156 @@
+import io
+import threading
+import time
+
+import pytest
+
+from app.core.config import settings
+from app.helpers.multipart_upload import iter_parts, read_part, upload_part_with_retry, upload_parts
+from tests.api import APITestCase
+
+
+class TrickleReader(object):
+    """
+    File-like trả về tối đa 3 byte mỗi lần read, giống stream mạng
+    """
+
+    def __init__(self, data: bytes):
+        self.raw = io.BytesIO(data)
+
+    def read(self, size: int = -1) -> bytes:
+        return self.raw.read(min(size, 3) if size > 0 else 3)
+
+
+class FakeUploadPart(object):
+    """
+    upload_part giả: ghi lại part đã upload, số lần gọi của mỗi part và số part upload cùng lúc lớn nhất
+    """
+
+    def __init__(self, fail_attempts: dict = None, delay: float = 0):
+        self.fail_attempts = fail_attempts or {}  # part number -> số lần lỗi trước khi thành công, -1: luôn lỗi
+        self.delay = delay
+        self.attempts = {}
+        self.uploaded = []
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, part_number: int, data: bytes):
+        with self.lock:
+            self.attempts[part_number] = self.attempts.get(part_number, 0) + 1
+            attempt = self.attempts[part_number]
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            # Part sau xong trước part trước để kiểm tra thứ tự kết quả
+            time.sleep(self.delay / part_number)
+            failures = self.fail_attempts.get(part_number, 0)
+            if failures == -1 or attempt <= failures:
+                raise IOError('upload part %s failed' % part_number)
+            with self.lock:
+                self.uploaded.append(part_number)
+            return 'etag-%s-%s' % (part_number, data[:1].decode())
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+class TestMultipartUpload(APITestCase):
+    ISSUE_KEY = "O2OSTAFF-319"
+
+    @pytest.fixture(autouse=True)
+    def no_backoff(self, monkeypatch):
+        monkeypatch.setattr(settings, 'UPLOAD_PART_RETRY_BACKOFF', 0)
+        monkeypatch.setattr(settings, 'UPLOAD_PART_RETRY_BACKOFF_MAX', 0)
+
+    def test_read_full_parts(self):
+        """
+            Test chia file thành các part
+            Đầu ra mong muốn: mỗi part đủ part_size dù stream trả về từng đoạn nhỏ, part cuối là phần còn lại
+        """
+        data = b'abcdefghij'
+
+        assert read_part(TrickleReader(data), 7) == b'abcdefg'
+        assert list(iter_parts(TrickleReader(data), 4)) == [b'abcd', b'efgh', b'ij']
+        assert list(iter_parts(io.BytesIO(b''), 4)) == []
+
+    def test_results_ordered_by_part_number(self):
+        """
+            Test upload 6 part song song, part sau upload xong trước part trước
+            Đầu ra mong muốn: kết quả theo thứ tự part number, không vượt quá concurrency part cùng lúc
+        """
+        upload_part = FakeUploadPart(delay=0.05)
+        parts = [bytes([ord('a') + index]) * 4 for index in range(6)]
+
+        results = upload_parts(parts, upload_part, concurrency=3, max_retries=0)
+
+        assert results == ['etag-%s-%s' % (index + 1, chr(ord('a') + index)) for index in range(6)]
+        assert sorted(upload_part.uploaded) == [1, 2, 3, 4, 5, 6]
+        assert upload_part.max_active <= 3
+
+    def test_retry_only_failed_part(self):
+        """
+            Test part lỗi được upload lại
+            Step by step:
+            - Part 2 lỗi 2 lần rồi thành công, max_retries = 2
+            - Part 1 luôn lỗi, max_retries = 1
+            - Đầu ra mong muốn:
+                . Chỉ part 2 được gọi lại, upload thành công
+                . Part 1 lỗi sau 2 lần gọi, lỗi được ném ra
+        """
+        upload_part = FakeUploadPart(fail_attempts={2: 2})
+
+        results = upload_parts([b'a', b'b', b'c'], upload_part, concurrency=2, max_retries=2)
+
+        assert results == ['etag-1-a', 'etag-2-b', 'etag-3-c']
+        assert upload_part.attempts == {1: 1, 2: 3, 3: 1}
+
+        failing = FakeUploadPart(fail_attempts={1: -1})
+        with pytest.raises(IOError):
+            upload_part_with_retry(failing, 1, b'a', max_retries=1)
+        assert failing.attempts == {1: 2}
+
+    def test_first_failure_stops_reading_parts(self):
+        """
+            Test part lỗi hết số lần retry
+            Step by step:
+            - Part 1 luôn lỗi, concurrency = 1, file có 5 part
+            - Đầu ra mong muốn:
+                . Lỗi của part 1 được ném ra
+                . Không upload thêm part nào, chỉ đọc tối đa concurrency + 1 part
+        """
+        upload_part = FakeUploadPart(fail_attempts={1: -1})
+        read = []
+
+        def parts():
+            for index in range(5):
+                read.append(index)
+                yield b'x'
+
+        with pytest.raises(IOError):
+            upload_parts(parts(), upload_part, concurrency=1, max_retries=0)
+
+        assert upload_part.uploaded == []
+        assert list(upload_part.attempts) == [1]
+        assert len(read) <= 2
+
+    def test_parts_in_memory_are_bounded(self):
+        """
+            Test số part nằm trong memory khi upload chậm hơn đọc file
+            Đầu ra mong muốn: số part đã đọc nhưng chưa upload xong không vượt quá concurrency + 1
+        """
+        upload_part = FakeUploadPart(delay=0.02)
+        read, max_pending = [], []
+
+        def parts():
+            for index in range(12):
+                with upload_part.lock:
+                    pending = len(read) - len(upload_part.uploaded)
+                max_pending.append(pending + 1)
+                read.append(index)
+                yield b'y'
+
+        upload_parts(parts(), upload_part, concurrency=2, max_retries=0)
+
+        assert len(upload_part.uploaded) == 12
+        assert max(max_pending) <= 2 + 1
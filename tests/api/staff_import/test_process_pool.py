@@ -0,0 +1,106 @@
+import os
+import time
+
+import pytest
+
+from app.helpers.exception_handler import CustomException
+from app.helpers.process_pool import ProcessPool, merge_ranges
+from app.services.srv_staff import find_subordinate_manager_rows, manager_children_index
+from tests.api import APITestCase
+
+
+def subordinate_rows(links: list, pool: ProcessPool = None, min_range_size: int = 500) -> list:
+    pool = pool or ProcessPool(max_workers=0, max_queue=0, queue_timeout=1)
+    return merge_ranges(pool.run_ranges(find_subordinate_manager_rows, links, manager_children_index(links),
+                                        min_range_size=min_range_size))
+
+
+class TestFindSubordinateManagerRows(APITestCase):
+    ISSUE_KEY = "O2OSTAFF-319"
+
+    def test_chain_and_cycle(self):
+        """
+            Test tìm dòng có line manager là cấp dưới của chính nhân viên
+            Step by step:
+            - a quản lý b, b quản lý c, c có manager là a: hợp lệ
+            - d có manager là f, f có manager là e, e có manager là d: vòng lặp
+            - g có manager là chính g, h không có manager
+            - Đầu ra mong muốn:
+                . Chuỗi a, b, c không lỗi
+                . Cả 3 dòng của vòng lặp d, e, f bị lỗi, hàm dừng được với dữ liệu có vòng lặp
+                . g, h không lỗi (dòng trùng chính nó được kiểm tra riêng)
+        """
+        links = [('a', ''), ('b', 'a'), ('c', 'b'),
+                 ('d', 'f'), ('e', 'd'), ('f', 'e'),
+                 ('g', 'g'), ('h', '')]
+
+        assert subordinate_rows(links) == [3, 4, 5]
+
+    def test_slices_give_same_result(self):
+        """
+            Test chia dòng thành nhiều khoảng
+            Đầu ra mong muốn: kết quả giống khi chạy 1 khoảng, index là index trong toàn bộ file
+        """
+        links = [('m%s' % index, 'm%s' % (index + 1)) for index in range(9)] + [('m9', 'm0')] + \
+                [('x%s' % index, 'm0') for index in range(5)]
+
+        children_index = manager_children_index(links)
+        sliced = merge_ranges([find_subordinate_manager_rows(links[start:start + 4], start, children_index)
+                               for start in range(0, len(links), 4)])
+
+        assert sliced == subordinate_rows(links) == list(range(10))
+
+
+class TestProcessPool(APITestCase):
+    ISSUE_KEY = "O2OSTAFF-319"
+
+    def test_run_ranges_sends_only_the_slice(self):
+        """
+            Test run_ranges trên process pool 2 worker
+            Đầu ra mong muốn: mỗi task chỉ nhận phần dữ liệu của mình, kết quả theo đúng thứ tự
+        """
+        pool = ProcessPool(max_workers=2, max_queue=4, queue_timeout=5)
+        links = [('s%s' % index, '') for index in range(7)]
+        try:
+            slices = pool.run_ranges(dict.fromkeys, links, min_range_size=2)
+            rows = subordinate_rows([('a', 'b'), ('b', 'a'), ('c', '')], pool=pool, min_range_size=1)
+        finally:
+            pool.shutdown()
+
+        assert slices == [dict.fromkeys(links[:4], 0), dict.fromkeys(links[4:], 4)]
+        assert rows == [0, 1]
+
+    def test_queue_full(self):
+        """
+            Test process pool hết slot
+            Đầu ra mong muốn: lỗi 140 với status code 503
+        """
+        pool = ProcessPool(max_workers=1, max_queue=0, queue_timeout=0.1)
+        try:
+            future = pool.submit(time.sleep, 1)
+            with pytest.raises(CustomException) as e:
+                pool.run(abs, -1)
+            future.result()
+        finally:
+            pool.shutdown()
+
+        assert e.value.http_code == 503
+        assert e.value.code == '140'
+
+    def test_broken_pool_is_recreated(self):
+        """
+            Test worker bị kill khi đang xử lý
+            Đầu ra mong muốn:
+                . Lỗi 141
+                . Pool được tạo lại, task tiếp theo chạy bình thường
+        """
+        pool = ProcessPool(max_workers=1, max_queue=1, queue_timeout=5)
+        try:
+            with pytest.raises(CustomException) as e:
+                pool.run(os._exit, 1)
+            result = pool.run(abs, -1)
+        finally:
+            pool.shutdown()
+
+        assert e.value.code == '141'
+        assert result == 1
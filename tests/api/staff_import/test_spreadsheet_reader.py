@@ -0,0 +1,117 @@
+import pytest
+from openpyxl import Workbook
+
+from app.helpers.exception_handler import CustomException
+from app.helpers.spreadsheet_reader import SpreadsheetReader
+from tests.api import APITestCase
+
+COLUMNS = ['Fullname', 'StaffCode', 'Email']
+
+
+class ChunkedStorage(object):
+    """
+    Storage trả file theo từng chunk 3 byte, để kiểm tra ký tự nhiều byte / dòng bị cắt giữa các chunk
+    """
+    bucket_name = 'test'
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def check_file_name_exists(self, bucket_name, file_name):
+        return True
+
+    def stream_object(self, file_name, chunk_size=3, start=0, end=None):
+        for index in range(0, len(self.data), chunk_size):
+            yield self.data[index:index + chunk_size]
+
+
+class TestSpreadsheetReader(APITestCase):
+    ISSUE_KEY = "O2OSTAFF-319"
+
+    @staticmethod
+    def read_all(reader: SpreadsheetReader):
+        return [row for batch in reader.iter_batches() for row in batch]
+
+    def test_csv_special_characters_in_cells(self):
+        """
+            Test đọc file csv có ký tự đặc biệt trong ô
+            Step by step:
+            - File csv có BOM, ô chứa \\x0c, \\u2028, xuống dòng trong dấu nháy, dòng trống, số dòng CRLF
+            - Đọc file theo chunk 3 byte
+            - Đầu ra mong muốn:
+                . Mỗi dòng dữ liệu giữ nguyên nội dung các ô, dòng trống bị bỏ qua
+                . row_numbers là số dòng trong file
+        """
+        data = ('﻿Fullname,StaffCode,Email\r\n'
+                '"Ngô\x0cVăn A",NV01,a@example.com\r\n'
+                '\r\n'
+                'B C,"NV\n02",b@example.com\n'
+                'Short\n').encode('utf-8')
+        reader = SpreadsheetReader(storage=ChunkedStorage(data), file_path='staffs.csv', columns=COLUMNS)
+
+        rows = self.read_all(reader)
+
+        assert rows == [
+            ['Ngô\x0cVăn A', 'NV01', 'a@example.com'],
+            ['B C', 'NV\n02', 'b@example.com'],
+            ['Short', '', ''],
+        ]
+        assert reader.row_numbers == [2, 4, 5]
+
+    def test_csv_wrong_template_and_max_rows(self):
+        """
+            Test file csv sai template hoặc vượt quá số dòng cho phép
+            Đầu ra mong muốn: lỗi 139
+        """
+        wrong_header = SpreadsheetReader(storage=ChunkedStorage(b'Fullname,StaffCode\nA,B\n'),
+                                         file_path='staffs.csv', columns=COLUMNS)
+        too_many_rows = SpreadsheetReader(storage=ChunkedStorage(b'Fullname,StaffCode,Email\n1,2,3\n4,5,6\n'),
+                                          file_path='staffs.csv', columns=COLUMNS, max_rows=1)
+
+        for reader in [wrong_header, too_many_rows]:
+            with pytest.raises(CustomException) as e:
+                self.read_all(reader)
+            assert e.value.code == '139'
+
+    def test_xlsx_batches(self, tmp_path):
+        """
+            Test đọc file xlsx theo batch
+            Step by step:
+            - Tạo file xlsx 5 dòng dữ liệu, có ô số và ô trống
+            - Đọc file với batch_size = 2
+            - Đầu ra mong muốn:
+                . 3 batch, ô số nguyên được đọc thành chuỗi không có ".0", ô trống thành ''
+        """
+        path = str(tmp_path / 'staffs.xlsx')
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(COLUMNS)
+        for index in range(5):
+            sheet.append(['Staff %s' % index, 100 + index, None])
+        workbook.save(path)
+        reader = SpreadsheetReader(storage=None, file_path='staffs.xlsx', columns=COLUMNS, batch_size=2,
+                                   local_path=path)
+
+        batches = list(reader.iter_batches())
+
+        assert [len(batch) for batch in batches] == [2, 2, 1]
+        assert batches[0][0] == ['Staff 0', '100', '']
+        assert reader.row_numbers == [2, 3, 4, 5, 6]
+
+    def test_xls(self, tmp_path):
+        """
+            Test đọc file xls (cần xlwt để tạo file test)
+            Đầu ra mong muốn: dữ liệu đọc lại đúng từng ô
+        """
+        xlwt = pytest.importorskip('xlwt')
+        path = str(tmp_path / 'staffs.xls')
+        workbook = xlwt.Workbook()
+        sheet = workbook.add_sheet('Sheet1')
+        for column, value in enumerate(COLUMNS):
+            sheet.write(0, column, value)
+        for column, value in enumerate(['Staff', 'NV01', 'a@example.com']):
+            sheet.write(1, column, value)
+        workbook.save(path)
+        reader = SpreadsheetReader(storage=None, file_path='staffs.xls', columns=COLUMNS, local_path=path)
+
+        assert self.read_all(reader) == [['Staff', 'NV01', 'a@example.com']]
@@ -0,0 +1,60 @@
+import os
+
+import pytest
+from fastapi_sqlalchemy import db
+
+from app.models import Staff, DepartmentStaff, StaffTeam
+from app.services.srv_staff_bulk_load import StaffBulkLoader
+from tests.api import APITestCase
+from tests.faker import fake
+
+pytestmark = pytest.mark.skipif(
+    not os.getenv('TESTING_SQL_DATABASE_URL', '').startswith('postgresql'),
+    reason='COPY chỉ chạy với PostgreSQL (TESTING_SQL_DATABASE_URL)')
+
+
+class TestStaffBulkLoader(APITestCase):
+    ISSUE_KEY = "O2OSTAFF-319"
+
+    def test_copy_insert_with_manager_role_title_and_team(self):
+        """
+            Test import nhân viên bằng COPY vào bảng staging
+            Step by step:
+            - Tạo company, department, role title, team
+            - Import 2 nhân viên, nhân viên thứ 2 có line manager là nhân viên thứ nhất và thuộc team
+            - Đầu ra mong muốn:
+                . 2 staff được tạo, manager_id của staff thứ 2 là id staff thứ nhất
+                . department-staff có đúng role title, staff-team có đúng team
+        """
+        company = fake.company_provider()
+        department = fake.department({'company_id': company.id, 'is_active': True})
+        role_title = fake.role_title_provider({
+            'company_id': company.id, 'department_id': department.id, 'is_active': True})
+        team = fake.team({'company_id': company.id, 'is_active': True})
+        suffix = fake.uuid4()[:8]
+        rows = [
+            ['Manager', 'MG-%s' % suffix, 'manager-%s@example.com' % suffix, '0912345678', str(department.id),
+             department.department_name, role_title.role_title_name, '', ''],
+            ['Staff', 'ST-%s' % suffix, 'staff-%s@example.com' % suffix, '0912345679', str(department.id),
+             department.department_name, role_title.role_title_name.upper(), ' %s ' % team.team_name,
+             'manager-%s@example.com' % suffix],
+        ]
+
+        with db():
+            if not StaffBulkLoader.is_supported(db.session):
+                pytest.skip('COPY chỉ chạy với PostgreSQL')
+            staff_ids = StaffBulkLoader(session=db.session, company_id=company.id).insert(rows)
+            db.session.commit()
+
+            manager = db.session.query(Staff).get(staff_ids[rows[0][2]])
+            staff = db.session.query(Staff).get(staff_ids[rows[1][2]])
+            department_staff = db.session.query(DepartmentStaff).filter(DepartmentStaff.staff_id == staff.id).one()
+            staff_teams = db.session.query(StaffTeam).filter(StaffTeam.staff_id == staff.id).all()
+
+        assert len(staff_ids) == 2
+        assert manager.company_id == staff.company_id == company.id
+        assert staff.manager_id == manager.id
+        assert manager.manager_id is None
+        assert department_staff.department_id == department.id
+        assert department_staff.role_title_id == role_title.id
+        assert [item.team_id for item in staff_teams] == [team.id]
@@ -0,0 +1,183 @@
+import csv
+import io
+
+from fastapi.encoders import jsonable_encoder
+from starlette.testclient import TestClient
+
+from app.core.config import settings
+from app.helpers.constant import COLUMNS
+from app.helpers.local_storage import MemoryStorageHandler
+from app.services import srv_staff
+from app.services.srv_staff import StaffService
+from tests.api import APITestCase
+from tests.faker import fake
+
+HEADERS = {'Authorization': 'Bearer testing'}
+
+
+class TestPostStaffImportValidateAPI(APITestCase):
+    ISSUE_KEY = "O2OSTAFF-319"
+
+    def test_061_response_company_id_not_exists(self, client: TestClient):
+        """
+            Test api POST Staff Import Validate response code 061
+            Step by step:
+            - Tạo company trong DB
+            - Gọi API Staff Import Validate với company_id không tồn tại
+            - Đầu ra mong muốn:
+                . status code: 400
+                . code: 061
+        """
+        company = fake.company_provider()
+
+        data_body = {
+            'company_id': company.id + 1,
+            'file_path': 'xxx.xlsx'
+        }
+        resp = client.post(f"{settings.BASE_API_PREFIX}/staffs/import/validate", headers=HEADERS,
+                           json=jsonable_encoder(data_body))
+        data = resp.json()
+
+        assert resp.status_code == 400
+        assert data.get('code') == '061'
+        assert data.get('message') == 'ID company không tồn tại trong hệ thống'
+
+    def test_002_response_page_size_invalid(self, client: TestClient):
+        """
+            Test api POST Staff Import Validate response code 002
+            Step by step:
+            - Tạo company trong DB
+            - Gọi API Staff Import Validate với page_size = 0
+            - Đầu ra mong muốn:
+                . status code: 400
+                . code: 002
+        """
+        company = fake.company_provider()
+
+        data_body = {
+            'company_id': company.id,
+            'file_path': 'xxx.xlsx',
+            'page_size': 0
+        }
+        resp = client.post(f"{settings.BASE_API_PREFIX}/staffs/import/validate", headers=HEADERS,
+                           json=jsonable_encoder(data_body))
+        data = resp.json()
+
+        assert resp.status_code == 400
+        assert data.get('code') == '002'
+
+    def test_003_response_page_invalid(self, client: TestClient):
+        """
+            Test api POST Staff Import Validate response code 003
+            Step by step:
+            - Tạo company trong DB
+            - Gọi API Staff Import Validate với page = 0
+            - Đầu ra mong muốn:
+                . status code: 400
+                . code: 003
+        """
+        company = fake.company_provider()
+
+        data_body = {
+            'company_id': company.id,
+            'file_path': 'xxx.xlsx',
+            'page': 0
+        }
+        resp = client.post(f"{settings.BASE_API_PREFIX}/staffs/import/validate", headers=HEADERS,
+                           json=jsonable_encoder(data_body))
+        data = resp.json()
+
+        assert resp.status_code == 400
+        assert data.get('code') == '003'
+
+    @staticmethod
+    def upload_csv(monkeypatch, rows: list) -> str:
+        """
+        Upload file csv lên memory storage và trả về tên object
+        """
+        storage = MemoryStorageHandler()
+        monkeypatch.setattr(srv_staff, 'storage', storage)
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(COLUMNS)
+        writer.writerows(rows)
+        data_file = storage.put_object(file_data=io.BytesIO(output.getvalue().encode('utf-8')),
+                                       file_name='staffs.csv', content_type='text/csv')
+        return data_file['file_name']
+
+    @staticmethod
+    def count_file_reads(monkeypatch) -> list:
+        reads = []
+        read_file = StaffService._upload_excel_read_file
+
+        def counting_read_file(file_path):
+            reads.append(file_path)
+            return read_file(file_path=file_path)
+
+        monkeypatch.setattr(StaffService, '_upload_excel_read_file', staticmethod(counting_read_file))
+        return reads
+
+    def test_000_response_row_errors_and_cache(self, client: TestClient, monkeypatch):
+        """
+            Test api POST Staff Import Validate trả về lỗi theo dòng
+            Step by step:
+            - Tạo company, department, role title và 1 nhân viên trong DB
+            - Upload file 5 dòng: 1 dòng hợp lệ, 1 dòng thiếu tên, 1 dòng sai số điện thoại,
+              1 dòng DepartmentID sai định dạng, 1 dòng email đã tồn tại
+            - Gọi API Staff Import Validate 2 lần với page_size = 2, page = 1 và page = 2
+            - Tạo nhân viên có email trùng dòng hợp lệ rồi gọi lại API
+            - Đầu ra mong muốn:
+                . status code: 200, code: 000
+                . total_errors = 4, mỗi trang 2 lỗi đúng dòng, cột và mã lỗi
+                . File chỉ được đọc 1 lần, các lần gọi sau dùng cache
+                . Lần gọi cuối vẫn kiểm tra lại DB: dòng hợp lệ báo email đã tồn tại
+        """
+        company = fake.company_provider()
+        department = fake.department({'company_id': company.id, 'is_active': True})
+        role_title = fake.role_title_provider({
+            'company_id': company.id, 'department_id': department.id, 'is_active': True})
+        existing = fake.staff_provider({'company_id': company.id})
+        suffix = fake.uuid4()[:8]
+
+        def row(index, full_name='Nguyen Van A', phone='0912345678', department_id=str(department.id),
+                email=None):
+            return [full_name, 'NV%s-%s' % (index, suffix), email or 'staff%s-%s@example.com' % (index, suffix),
+                    phone, department_id, department.department_name, role_title.role_title_name, '', '']
+
+        file_path = self.upload_csv(monkeypatch, [
+            row(1),
+            row(2, full_name=''),
+            row(3, phone='12ab'),
+            row(4, department_id='abc'),
+            row(5, email=existing.email),
+        ])
+        reads = self.count_file_reads(monkeypatch)
+
+        pages = []
+        for page in [1, 2]:
+            resp = client.post(f"{settings.BASE_API_PREFIX}/staffs/import/validate", headers=HEADERS,
+                               json=jsonable_encoder({'company_id': company.id, 'file_path': file_path,
+                                                      'page': page, 'page_size': 2}))
+            assert resp.status_code == 200
+            assert resp.json().get('code') == '000'
+            pages.append(resp.json()['data'])
+
+        assert [(data['total_rows'], data['total_errors'], data['is_valid']) for data in pages] == \
+            [(5, 4, False), (5, 4, False)]
+        assert pages[0]['metadata']['total_items'] == 4
+        assert [(error['row'], error['column'], error['code']) for data in pages for error in data['errors']] == [
+            (3, 'Fullname', 'FULL_NAME_REQUIRED'),
+            (4, 'Phone', 'PHONE_INVALID'),
+            (5, 'DepartmentID', 'DEPARTMENT_ID_INVALID'),
+            (6, 'Email', 'EMAIL_EXISTS'),
+        ]
+        assert reads == [file_path]
+
+        fake.staff_provider({'company_id': company.id, 'email': 'staff1-%s@example.com' % suffix})
+        resp = client.post(f"{settings.BASE_API_PREFIX}/staffs/import/validate", headers=HEADERS,
+                           json=jsonable_encoder({'company_id': company.id, 'file_path': file_path}))
+        data = resp.json()['data']
+
+        assert data['total_errors'] == 5
+        assert (data['errors'][0]['row'], data['errors'][0]['code']) == (2, 'EMAIL_EXISTS')
+        assert reads == [file_path]
@@ -0,0 +1,174 @@
+from fastapi_sqlalchemy import db
+
+from app.helpers.enums import IamOutboxEvent, IamOutboxStatus
+from app.models import Staff, CompanyStaff, DepartmentStaff, StaffTeam, IamOutbox
+from app.services.srv_staff_roster import StaffRosterSync, roster_row_hash, file_row_hash
+from tests.api import APITestCase
+from tests.faker import fake
+
+
+def file_row(staff: Staff, department, role_title_name: str, team_names: str = '', manager_email: str = ''):
+    return [staff.full_name, staff.staff_code, staff.email, staff.phone_number, str(department.id),
+            department.department_name, role_title_name, team_names, manager_email]
+
+
+class TestStaffRosterSync(APITestCase):
+    ISSUE_KEY = "O2OSTAFF-319"
+
+    @staticmethod
+    def create_test_data(total_staffs: int = 3):
+        """
+        Tạo company, department, role title, team và các nhân viên thuộc department
+        """
+        company = fake.company_provider()
+        department = fake.department({'company_id': company.id, 'is_active': True})
+        role_title = fake.role_title_provider({
+            'company_id': company.id, 'department_id': department.id, 'is_active': True})
+        team = fake.team({'company_id': company.id, 'is_active': True})
+        staffs = [fake.add_staff_to_department(company=company, staff=None, department=department,
+                                               role_title=role_title) for _ in range(total_staffs)]
+        return company, department, role_title, team, staffs
+
+    def test_row_hash(self):
+        """
+            Test hash của một dòng nhân viên
+            Đầu ra mong muốn:
+                . Hash không đổi khi khác khoảng trắng, hoa thường của role title / team / manager, thứ tự team
+                . Hash đổi khi đổi dữ liệu hoặc trạng thái active
+                . Dòng file và roster cùng dữ liệu có cùng hash
+        """
+        base = roster_row_hash(full_name='Nguyen Van A', staff_code='NV01', phone_number='0912345678',
+                               department_id=1, role_title_name='Sale', team_names=['Team A', 'Team B'],
+                               manager_email='manager@example.com')
+
+        assert base == roster_row_hash(full_name=' Nguyen Van A ', staff_code='NV01', phone_number='0912345678',
+                                       department_id='1', role_title_name='SALE', team_names=['team b', 'Team A'],
+                                       manager_email='Manager@example.com ')
+        assert base != roster_row_hash(full_name='Nguyen Van B', staff_code='NV01', phone_number='0912345678',
+                                       department_id=1, role_title_name='Sale', team_names=['Team A', 'Team B'],
+                                       manager_email='manager@example.com')
+        assert base != roster_row_hash(full_name='Nguyen Van A', staff_code='NV01', phone_number='0912345678',
+                                       department_id=1, role_title_name='Sale', team_names=['Team A', 'Team B'],
+                                       manager_email='manager@example.com', is_active=False)
+        assert base == file_row_hash(['Nguyen Van A', 'NV01', 'a@example.com', '0912345678', ' 1 ', 'Department',
+                                      'Sale', 'Team A, Team B,', 'manager@example.com'])
+
+    def test_diff(self):
+        """
+            Test so sánh file với danh sách nhân viên hiện tại của company
+            Step by step:
+            - Tạo 3 nhân viên trong department
+            - File gồm: nhân viên 1 không đổi, nhân viên 2 đổi tên, 1 email mới, không có nhân viên 3
+            - Đầu ra mong muốn:
+                . 1 dòng thêm mới, 1 dòng cập nhật, nhân viên 3 bị nghỉ việc, 1 dòng không đổi
+        """
+        company, department, role_title, _, staffs = self.create_test_data()
+        unchanged_row = file_row(staffs[0], department, role_title.role_title_name)
+        updated_row = file_row(staffs[1], department, role_title.role_title_name)
+        updated_row[0] = updated_row[0] + ' Updated'
+        new_row = ['New Staff', 'NEW-%s' % fake.uuid4()[:8], 'new-%s@example.com' % fake.uuid4()[:8],
+                   '0912345678', str(department.id), department.department_name, role_title.role_title_name, '', '']
+
+        with db():
+            inserts, updates, deactivations, unchanged = StaffRosterSync(
+                session=db.session, company_id=company.id).diff([unchanged_row, updated_row, new_row])
+
+        assert inserts == [new_row]
+        assert [(row, current['id']) for row, current in updates] == [(updated_row, staffs[1].id)]
+        assert deactivations == [staffs[2].id]
+        assert unchanged == 1
+
+    def test_apply_updates(self):
+        """
+            Test cập nhật nhân viên thay đổi
+            Step by step:
+            - Tạo 1 nhân viên trong department, không thuộc team nào
+            - Cập nhật tên, role title và team của nhân viên
+            - Đầu ra mong muốn:
+                . Staff có tên mới
+                . department-staff cũ bị inactive, department-staff mới có role title mới
+                . staff-team mới được tạo
+                . Diff lại cùng file thì dòng không còn thay đổi
+        """
+        company, department, _, team, staffs = self.create_test_data(total_staffs=1)
+        new_role_title = fake.role_title_provider({
+            'company_id': company.id, 'department_id': department.id, 'is_active': True})
+        row = file_row(staffs[0], department, new_role_title.role_title_name, team_names=team.team_name)
+        row[0] = 'Updated Name'
+
+        with db():
+            roster_sync = StaffRosterSync(session=db.session, company_id=company.id)
+            _, updates, _, _ = roster_sync.diff([row])
+            roster_sync.apply_updates(updates)
+            db.session.commit()
+
+            staff = db.session.query(Staff).get(staffs[0].id)
+            department_staffs = db.session.query(DepartmentStaff).filter(
+                DepartmentStaff.staff_id == staff.id).order_by(DepartmentStaff.id.asc()).all()
+            staff_teams = db.session.query(StaffTeam).filter(StaffTeam.staff_id == staff.id).all()
+            _, updates_again, _, unchanged = StaffRosterSync(session=db.session, company_id=company.id).diff([row])
+
+        assert staff.full_name == 'Updated Name'
+        assert [item.is_active for item in department_staffs] == [False, True]
+        assert department_staffs[-1].role_title_id == new_role_title.id
+        assert [(item.team_id, item.is_active) for item in staff_teams] == [(team.id, True)]
+        assert updates_again == []
+        assert unchanged == 1
+
+    def test_apply_updates_manager_in_company(self):
+        """
+            Test cập nhật line manager khi email manager trùng với nhân viên của company khác
+            Step by step:
+            - Tạo 2 nhân viên trong department, nhân viên 2 là manager
+            - Company khác có nhân viên cùng email với manager
+            - Cập nhật line manager của nhân viên 1 là email manager
+            - Đầu ra mong muốn: manager_id của nhân viên 1 là id của manager trong cùng company
+        """
+        company, department, role_title, _, staffs = self.create_test_data(total_staffs=2)
+        manager = staffs[1]
+        other_company = fake.company_provider()
+        other_manager = fake.staff_provider({'company_id': other_company.id, 'email': manager.email})
+        row = file_row(staffs[0], department, role_title.role_title_name, manager_email=manager.email)
+
+        with db():
+            roster_sync = StaffRosterSync(session=db.session, company_id=company.id)
+            _, updates, _, _ = roster_sync.diff([row, file_row(manager, department, role_title.role_title_name)])
+            roster_sync.apply_updates(updates)
+            db.session.commit()
+
+            manager_id = db.session.query(Staff.manager_id).filter(Staff.id == staffs[0].id).scalar()
+
+        assert other_manager.id != manager.id
+        assert manager_id == manager.id
+
+    def test_apply_deactivations(self):
+        """
+            Test cho nghỉ việc nhân viên không có trong file
+            Step by step:
+            - Tạo 2 nhân viên trong department
+            - Cho nghỉ việc nhân viên thứ 2
+            - Đầu ra mong muốn:
+                . Staff, company-staff, department-staff của nhân viên thứ 2 bị inactive, nhân viên thứ 1 không đổi
+                . Outbox có event remove_role cho email nhân viên thứ 2
+        """
+        company, department, role_title, _, staffs = self.create_test_data(total_staffs=2)
+
+        with db():
+            roster_sync = StaffRosterSync(session=db.session, company_id=company.id)
+            _, _, deactivations, _ = roster_sync.diff([file_row(staffs[0], department, role_title.role_title_name)])
+            roster_sync.apply_deactivations(deactivations)
+            db.session.commit()
+
+            active = {staff.id: staff.is_active for staff in db.session.query(Staff).filter(
+                Staff.id.in_([item.id for item in staffs])).all()}
+            company_staff = db.session.query(CompanyStaff).filter(CompanyStaff.staff_id == staffs[1].id).one()
+            department_staff = db.session.query(DepartmentStaff).filter(
+                DepartmentStaff.staff_id == staffs[1].id).one()
+            events = db.session.query(IamOutbox).filter(IamOutbox.email.in_([item.email for item in staffs])).all()
+
+        assert deactivations == [staffs[1].id]
+        assert active == {staffs[0].id: True, staffs[1].id: False}
+        assert company_staff.is_active is False
+        assert department_staff.is_active is False
+        assert [(event.email, event.event_type, event.status) for event in events] == [
+            (staffs[1].email, IamOutboxEvent.REMOVE_ROLE.value, IamOutboxStatus.PENDING.value)]
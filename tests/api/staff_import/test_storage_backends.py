@@ -0,0 +1,92 @@
+import io
+from datetime import timedelta
+
+import pytest
+
+from app.helpers.exception_handler import CustomException
+from app.helpers.local_storage import LocalStorageHandler, MemoryStorageHandler
+from tests.api import APITestCase
+
+CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+class TestStorageBackends(APITestCase):
+    ISSUE_KEY = "O2OSTAFF-319"
+
+    @staticmethod
+    def backends(tmp_path):
+        return [LocalStorageHandler(str(tmp_path)), MemoryStorageHandler()]
+
+    def test_put_stat_and_stream(self, tmp_path):
+        """
+            Test upload / đọc file với storage local và memory
+            Step by step:
+            - Upload file 3 MB
+            - Đọc lại toàn bộ file và một đoạn byte
+            - Đầu ra mong muốn:
+                . stat_object trả về đúng dung lượng và content type
+                . Nội dung đọc lại giống nội dung đã upload
+        """
+        data = bytes(range(256)) * 12 * 1024
+        for storage in self.backends(tmp_path):
+            data_file = storage.put_object(file_data=io.BytesIO(data), file_name='Danh sach.xlsx',
+                                           content_type=CONTENT_TYPE)
+            file_name = data_file['file_name']
+            stat = storage.stat_object(file_name)
+
+            assert file_name.endswith('___danh-sach.xlsx')
+            assert storage.check_file_name_exists(storage.bucket_name, file_name)
+            assert stat['size'] == len(data)
+            assert stat['content_type'] == CONTENT_TYPE
+            assert b''.join(storage.stream_object(file_name)) == data
+            assert b''.join(storage.stream_object(file_name, start=10, end=1024 * 1024 + 10)) == \
+                data[10:1024 * 1024 + 11]
+
+    def test_dedupe_reuses_object(self, tmp_path):
+        """
+            Test upload cùng nội dung hai lần với dedupe
+            Đầu ra mong muốn: hai lần upload trả về cùng object, upload không dedupe tạo object mới
+        """
+        for storage in self.backends(tmp_path):
+            first = storage.put_object(file_data=io.BytesIO(b'abc'), file_name='error_file.xlsx',
+                                       content_type=CONTENT_TYPE, dedupe=True)
+            second = storage.put_object(file_data=io.BytesIO(b'abc'), file_name='error_file.xlsx',
+                                        content_type=CONTENT_TYPE, dedupe=True)
+            third = storage.put_object(file_data=io.BytesIO(b'abc'), file_name='error_file.xlsx',
+                                       content_type=CONTENT_TYPE)
+
+            assert first['file_name'] == second['file_name']
+            assert third['file_name'] != first['file_name']
+
+    def test_missing_or_outside_object(self, tmp_path):
+        """
+            Test đọc object không tồn tại hoặc tên object trỏ ra ngoài thư mục storage
+            Đầu ra mong muốn: lỗi 045
+        """
+        for storage in self.backends(tmp_path):
+            for file_name in ['missing.xlsx', '../secret.xlsx']:
+                with pytest.raises(CustomException):
+                    storage.stat_object(file_name)
+                with pytest.raises(CustomException):
+                    b''.join(storage.stream_object(file_name))
+
+    def test_normalize_file_name(self, tmp_path):
+        """
+            Test chuẩn hoá tên file dùng chung cho mọi storage
+            Đầu ra mong muốn: tên file thành slug tối đa 100 ký tự, giữ nguyên đuôi file
+        """
+        for storage in self.backends(tmp_path):
+            assert storage.normalize_file_name('  Danh  sách nhân viên.v2.xlsx ') == 'danh-sach-nhan-vien-v2.xlsx'
+            assert storage.normalize_file_name('a' * 150 + '.pdf') == 'a' * 100 + '.pdf'
+
+    def test_presigned_put_not_supported(self, tmp_path):
+        """
+            Test xin URL upload trực tiếp với storage local và memory
+            Đầu ra mong muốn: lỗi 143 với status code 400
+        """
+        for storage in self.backends(tmp_path):
+            with pytest.raises(CustomException) as e:
+                storage.presigned_put_object(object_name='file.xlsx', content_type=CONTENT_TYPE,
+                                             expires=timedelta(minutes=15))
+
+            assert (e.value.http_code, e.value.code) == (400, '143')
@@ -0,0 +1,131 @@
+"""
+Benchmark the IAM sync against the fake IAM server:
+
+    python -m tests.iam_stub.benchmark --staffs 2000 --latency 0.02 --error-rate 0.01 --mode bulk
+
+Modes: bulk (periodic sync, one IAM directory read), per-staff (IamSyncEngine.run) and import
+(synchronized_upload_excel, the IAM step of the staff import).
+"""
+import argparse
+import json
+import time
+from contextlib import contextmanager
+
+from app.core.config import settings
+from app.helpers import circuit_breaker
+from app.helpers.api_handler import api_client
+from app.helpers.enums import SalesRoleName
+from app.schemas.sche_staff import StaffIamUploadFile
+from app.services.srv_iam import IamService
+from app.services.srv_synchronized import IamSyncEngine, synchronized_upload_excel
+from tests.iam_stub.server import FakeIamServer
+
+ROLE_IDS = {
+    SalesRoleName.SALE.value: 33,
+    SalesRoleName.SALE_LEADER.value: 34,
+    SalesRoleName.SALE_ADMIN.value: 35,
+    SalesRoleName.SALE_MANAGER.value: 36,
+}
+TOKEN = 'Bearer benchmark'
+MODES = ('bulk', 'per-staff', 'import')
+
+
+def reset_upstream_clients():
+    """
+    Drop the keep-alive sessions and the circuit breakers, a new fake IAM starts from a closed circuit
+    """
+    api_client.close()
+    with circuit_breaker._guards_lock:
+        circuit_breaker._guards.clear()
+
+
+@contextmanager
+def fake_iam_settings(server: FakeIamServer):
+    """
+    Point the IAM settings at server, restore them and reset the upstream clients on exit
+    """
+    values = {
+        'IAM_SERVICE_URL': server.url,
+        'AUTHENTICATION_SERVICE': server.url,
+        'SALE_ID': ROLE_IDS[SalesRoleName.SALE.value],
+        'SALE_LEADER_ID': ROLE_IDS[SalesRoleName.SALE_LEADER.value],
+        'SALE_ADMIN_ID': ROLE_IDS[SalesRoleName.SALE_ADMIN.value],
+        'SALE_MANAGER_ID': ROLE_IDS[SalesRoleName.SALE_MANAGER.value],
+    }
+    previous = {name: getattr(settings, name) for name in values}
+    server.state.tokens[TOKEN.replace('Bearer ', '')] = 'benchmark@example.com'
+    reset_upstream_clients()
+    try:
+        for name, value in values.items():
+            setattr(settings, name, value)
+        yield server
+    finally:
+        for name, value in previous.items():
+            setattr(settings, name, value)
+        reset_upstream_clients()
+
+
+def synthetic_staffs(total: int, existing_ratio: float, server: FakeIamServer):
+    """
+    total staffs, the first existing_ratio of them already exist in IAM (half of those with a stale role)
+    """
+    roles = list(ROLE_IDS.keys())
+    staffs = []
+    for index in range(total):
+        staff = StaffIamUploadFile(
+            full_name='Staff %s' % index,
+            email='staff%s@example.com' % index,
+            phone_number='09%08d' % index,
+            role=roles[index % len(roles)]
+        )
+        if index < total * existing_ratio:
+            role = ROLE_IDS[staff.role] if index % 2 == 0 else ROLE_IDS[roles[(index + 1) % len(roles)]]
+            server.state.add_user(email=staff.email, phone_number=staff.phone_number, role_ids=[role])
+        staffs.append(staff)
+    return staffs
+
+
+def run_benchmark(staffs: int = 1000, latency: float = 0.01, error_rate: float = 0, existing_ratio: float = 0.5,
+                  mode: str = 'bulk', concurrency: int = None, seed: int = 1) -> dict:
+    with FakeIamServer(latency=latency, error_rate=error_rate, seed=seed) as server, fake_iam_settings(server):
+        data = synthetic_staffs(staffs, existing_ratio, server)
+        engine = IamSyncEngine(iam_srv=IamService(), token=TOKEN, concurrency=concurrency)
+        started = time.monotonic()
+        if mode == 'bulk':
+            report = engine.reconcile(data, engine.iam_srv.get_user_directory(TOKEN))
+        elif mode == 'import':
+            report = synchronized_upload_excel(TOKEN, data)
+        else:
+            report = engine.run(data)
+        wall_time = time.monotonic() - started
+        return {
+            'mode': mode,
+            'staffs': staffs,
+            'latency': latency,
+            'error_rate': error_rate,
+            # Mode import dùng IamSyncEngine của synchronized_upload_excel với IAM_SYNC_CONCURRENCY
+            'concurrency': settings.IAM_SYNC_CONCURRENCY if mode == 'import' else engine.concurrency,
+            'wall_time': round(wall_time, 3),
+            'throughput': round(staffs / wall_time, 1) if wall_time else None,
+            'calls': sum(server.state.calls.values()),
+            'calls_by_route': dict(server.state.calls),
+            'report': report,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark IAM sync against the fake IAM server')
+    parser.add_argument('--staffs', type=int, default=1000)
+    parser.add_argument('--latency', type=float, default=0.01, help='seconds added to every fake IAM call')
+    parser.add_argument('--error-rate', type=float, default=0, help='ratio of calls answered with 503')
+    parser.add_argument('--existing-ratio', type=float, default=0.5, help='ratio of staffs already in IAM')
+    parser.add_argument('--mode', choices=MODES, default='bulk')
+    parser.add_argument('--concurrency', type=int, default=None)
+    args = parser.parse_args()
+    result = run_benchmark(staffs=args.staffs, latency=args.latency, error_rate=args.error_rate,
+                           existing_ratio=args.existing_ratio, mode=args.mode, concurrency=args.concurrency)
+    print(json.dumps(result, indent=2, default=str))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+API_PREFIX = '/api/v1.0'
+PHONE_EXISTS_ERROR = 1019
+
+
+class FakeIamState(object):
+    """
+    In-memory users / roles of the fake IAM, with per route call counters and the ordered request log
+    """
+
+    def __init__(self, latency: float = 0, error_rate: float = 0, seed: int = None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.users = {}  # id -> user
+        self.user_roles = {}  # id -> set of role ids
+        self.tokens = {}  # token -> email
+        self.calls = Counter()
+        self.requests = []  # (method, path, body) theo thứ tự nhận
+        self.lock = threading.Lock()
+
+    def add_user(self, email: str, phone_number: str = '', role_ids=()) -> str:
+        with self.lock:
+            user_id = uuid.uuid4().hex
+            self.users[user_id] = {'id': user_id, 'email': email, 'name': email, 'phone_number': phone_number,
+                                   'revoked': False}
+            self.user_roles[user_id] = set(role_ids)
+            return user_id
+
+    def find_by_email(self, email: str):
+        return next((user for user in self.users.values() if user['email'] == email), None)
+
+    def reset_calls(self):
+        with self.lock:
+            self.calls.clear()
+            self.requests.clear()
+
+
+class FakeIamHandler(BaseHTTPRequestHandler):
+    state: FakeIamState = None
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: dict):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self) -> dict:
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}') if length else {}
+
+    def _page(self, items: list, params: dict) -> dict:
+        page = int(params.get('page', ['1'])[0])
+        page_size = int(params.get('pageSize', [str(len(items) or 1)])[0])
+        return {'items': items[(page - 1) * page_size:page * page_size]}
+
+    def _handle(self, method: str):
+        state = self.state
+        parts = urlsplit(self.path)
+        params = parse_qs(parts.query)
+        path = parts.path
+        body = self._body() if method in ('POST', 'PUT', 'DELETE') else {}
+        route = re.sub(r'/users/[^/]+/roles', '/users/{id}/roles', path)
+        route = re.sub(r'/roles/\d+/users', '/roles/{id}/users', route)
+        route = re.sub(r'/users/(?!\{id\})[^/]+$', '/users/{id}', route)
+        if path == API_PREFIX + '/users' and 'email' in params:
+            route += '?email'
+        with state.lock:
+            state.calls['%s %s' % (method, route)] += 1
+            state.requests.append((method, path, body))
+            failed = state.random.random() < state.error_rate
+        if state.latency:
+            time.sleep(state.latency)
+        if failed:
+            return self._send(503, {'error': {'code': 503, 'message': 'Service unavailable'}})
+
+        if path == '/userinfo':
+            token = (self.headers.get('Authorization') or '').replace('Bearer ', '')
+            email = state.tokens.get(token)
+            return self._send(200, {'email': email}) if email else self._send(401, {'error': {'code': 401}})
+
+        if path == API_PREFIX + '/users':
+            if method == 'GET':
+                users = [user for user in state.users.values()
+                         if 'email' not in params or user['email'] == params['email'][0]]
+                return self._send(200, self._page(users, params))
+            with state.lock:
+                if any(user['phone_number'] == body.get('phone_number') and body.get('phone_number')
+                       for user in state.users.values()):
+                    return self._send(400, {'error': {'code': PHONE_EXISTS_ERROR, 'message': 'Phone exists'}})
+                if state.find_by_email(body.get('email')) is not None:
+                    return self._send(400, {'error': {'code': 1001, 'message': 'Email exists'}})
+            user_id = state.add_user(email=body.get('email'), phone_number=body.get('phone_number'))
+            return self._send(200, {'item': state.users[user_id]})
+
+        match = re.fullmatch(API_PREFIX + r'/users/([^/]+)', path)
+        if match:
+            user_id = match.group(1)
+            if user_id not in state.users:
+                return self._send(404, {'error': {'code': 404}})
+            with state.lock:
+                user = state.users[user_id]
+                if method == 'PUT':
+                    user.update({key: body[key] for key in ('name', 'phone_number', 'revoked') if key in body})
+                return self._send(200, {'item': dict(user)})
+
+        match = re.fullmatch(API_PREFIX + r'/users/([^/]+)/roles', path)
+        if match:
+            user_id = match.group(1)
+            if user_id not in state.users:
+                return self._send(404, {'error': {'code': 404}})
+            with state.lock:
+                roles = state.user_roles[user_id]
+                if method == 'POST':
+                    roles.update(body.get('role_ids') or [])
+                elif method == 'PUT':
+                    roles.clear()
+                    roles.update(body.get('role_ids') or [])
+                elif method == 'DELETE':
+                    roles.difference_update(body.get('role_ids') or [])
+                items = [{'id': role_id} for role_id in sorted(roles)]
+            return self._send(200, {'items': items})
+
+        match = re.fullmatch(API_PREFIX + r'/roles/(\d+)/users', path)
+        if match:
+            role_id = int(match.group(1))
+            users = [state.users[user_id] for user_id, roles in state.user_roles.items() if role_id in roles]
+            return self._send(200, self._page(users, params))
+
+        return self._send(404, {'error': {'code': 404}})
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+
+class FakeIamServer(object):
+    """
+    Fake IAM + authentication service on a free local port, run in a daemon thread:
+
+        with FakeIamServer(latency=0.02, error_rate=0.01) as server:
+            settings.IAM_SERVICE_URL = server.url
+    """
+
+    def __init__(self, latency: float = 0, error_rate: float = 0, seed: int = None):
+        self.state = FakeIamState(latency=latency, error_rate=error_rate, seed=seed)
+        handler = type('Handler', (FakeIamHandler,), {'state': self.state})
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.httpd.daemon_threads = True
+        self.url = 'http://127.0.0.1:%s' % self.httpd.server_address[1]
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
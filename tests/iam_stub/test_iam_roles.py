@@ -0,0 +1,135 @@
+import pytest
+
+from app.core.config import settings
+from app.helpers.enums import SalesRoleName
+from app.services.srv_iam import IamService
+from tests.api import APITestCase
+from tests.iam_stub.benchmark import ROLE_IDS, TOKEN, fake_iam_settings
+from tests.iam_stub.server import API_PREFIX, FakeIamServer
+
+SALE = ROLE_IDS[SalesRoleName.SALE.value]
+SALE_LEADER = ROLE_IDS[SalesRoleName.SALE_LEADER.value]
+SALE_ADMIN = ROLE_IDS[SalesRoleName.SALE_ADMIN.value]
+SALE_MANAGER = ROLE_IDS[SalesRoleName.SALE_MANAGER.value]
+OTHER_ROLE = 99  # role không thuộc sale portal
+
+
+@pytest.fixture
+def iam_server():
+    """
+    Fake IAM chạy trên port local, setting IAM trỏ tới fake IAM trong suốt test
+    """
+    with FakeIamServer() as server, fake_iam_settings(server):
+        yield server
+
+
+def role_requests(server: FakeIamServer, user_id: str) -> list:
+    """
+    Các request tới /users/{id}/roles theo thứ tự fake IAM nhận được: (method, role_ids)
+    """
+    path = API_PREFIX + '/users/%s/roles' % user_id
+    return [(method, body.get('role_ids')) for method, request_path, body in server.state.requests
+            if request_path == path]
+
+
+class TestIamReconcileRoles(APITestCase):
+    ISSUE_KEY = "O2OSTAFF-320"
+
+    def test_add_before_remove(self, iam_server: FakeIamServer):
+        """
+            Test đổi role của user trên IAM
+            Step by step:
+            - User có role SALE, đổi sang SALE_LEADER
+            - Đầu ra mong muốn:
+                . Đọc role hiện tại, thêm SALE_LEADER rồi mới xoá SALE
+                . User chỉ còn role SALE_LEADER
+        """
+        user_id = iam_server.state.add_user(email='a@example.com', role_ids=[SALE])
+
+        changed = IamService().reconcile_roles(TOKEN, user_id=user_id, role_ids=[SALE_LEADER])
+
+        assert changed is True
+        assert role_requests(iam_server, user_id) == [('GET', None), ('POST', [SALE_LEADER]), ('DELETE', [SALE])]
+        assert iam_server.state.user_roles[user_id] == {SALE_LEADER}
+
+    def test_no_call_when_roles_unchanged(self, iam_server: FakeIamServer):
+        """
+            Test cập nhật role không đổi
+            Step by step:
+            - User có role SALE và SALE_LEADER
+            - Gọi update_role với đúng các role đó, có và không truyền role hiện tại
+            - Đầu ra mong muốn:
+                . Không truyền role hiện tại: chỉ đọc role, không thêm / xoá role
+                . Truyền role hiện tại: không gọi IAM
+                . Role của user không đổi
+        """
+        user_id = iam_server.state.add_user(email='a@example.com', role_ids=[SALE, SALE_LEADER])
+        iam_srv = IamService()
+
+        changed = iam_srv.update_role(TOKEN, role_ids=[SALE_LEADER, SALE], user_id=user_id)
+        requests_without_current = role_requests(iam_server, user_id)
+        iam_server.state.reset_calls()
+        changed_with_current = iam_srv.update_role(TOKEN, role_ids=[SALE, SALE_LEADER], user_id=user_id,
+                                                   current_role_ids={SALE, SALE_LEADER})
+
+        assert (changed, changed_with_current) == (False, False)
+        assert requests_without_current == [('GET', None)]
+        assert iam_server.state.requests == []
+        assert iam_server.state.user_roles[user_id] == {SALE, SALE_LEADER}
+
+    def test_keep_roles_outside_sale_portal(self, iam_server: FakeIamServer):
+        """
+            Test đổi role của user có role không thuộc sale portal
+            Step by step:
+            - User có role SALE và một role khác sale portal
+            - Đổi sang SALE_ADMIN, rồi bỏ toàn bộ role
+            - Đầu ra mong muốn:
+                . Chỉ role sale portal bị xoá, role khác không bị gửi lên IAM
+                . User luôn giữ role khác sale portal
+        """
+        user_id = iam_server.state.add_user(email='a@example.com', role_ids=[SALE, OTHER_ROLE])
+        iam_srv = IamService()
+
+        iam_srv.reconcile_roles(TOKEN, user_id=user_id, role_ids=[SALE_ADMIN])
+        roles_after_change = set(iam_server.state.user_roles[user_id])
+        iam_srv.reconcile_roles(TOKEN, user_id=user_id, role_ids=[])
+
+        assert role_requests(iam_server, user_id) == [
+            ('GET', None), ('POST', [SALE_ADMIN]), ('DELETE', [SALE]),
+            ('GET', None), ('DELETE', [SALE_ADMIN])]
+        assert roles_after_change == {SALE_ADMIN, OTHER_ROLE}
+        assert iam_server.state.user_roles[user_id] == {OTHER_ROLE}
+
+
+class TestIamUserDirectory(APITestCase):
+    ISSUE_KEY = "O2OSTAFF-320"
+
+    def test_read_every_page(self, iam_server: FakeIamServer, monkeypatch):
+        """
+            Test đọc danh sách user và role sale portal từ IAM theo trang
+            Step by step:
+            - IAM_PAGE_SIZE = 3, fake IAM có 8 user: 4 user role SALE, 1 user thêm role SALE_MANAGER,
+              1 user chỉ có role khác sale portal, 1 user bị revoke
+            - Đầu ra mong muốn:
+                . Đọc đủ 3 trang user, 2 trang thành viên role SALE
+                . Mọi user chưa bị revoke đều có trong kết quả với đủ role sale portal, role của
+                  /roles/{id}/users được gộp theo user
+        """
+        monkeypatch.setattr(settings, 'IAM_PAGE_SIZE', 3)
+        roles_by_email = {
+            'sale0@example.com': [SALE], 'sale1@example.com': [SALE], 'sale2@example.com': [SALE],
+            'sale3@example.com': [SALE, SALE_MANAGER], 'leader@example.com': [SALE_LEADER],
+            'admin@example.com': [SALE_ADMIN, OTHER_ROLE], 'other@example.com': [OTHER_ROLE],
+        }
+        user_ids = {email: iam_server.state.add_user(email=email, role_ids=role_ids)
+                    for email, role_ids in roles_by_email.items()}
+        revoked_id = iam_server.state.add_user(email='revoked@example.com', role_ids=[SALE])
+        iam_server.state.users[revoked_id]['revoked'] = True
+
+        directory = IamService().get_user_directory(TOKEN)
+        paths = [path for _, path, _ in iam_server.state.requests]
+
+        assert directory == {email: {'id': user_ids[email], 'role_ids': set(role_ids) - {OTHER_ROLE}}
+                             for email, role_ids in roles_by_email.items()}
+        assert paths.count(API_PREFIX + '/users') == 3
+        assert paths.count(API_PREFIX + '/roles/%s/users' % SALE) == 2
@@ -0,0 +1,85 @@
+import pytest
+
+from app.core.config import settings
+from tests.api import APITestCase
+from tests.iam_stub.benchmark import reset_upstream_clients, run_benchmark
+
+
+@pytest.fixture(autouse=True)
+def isolated_iam_settings(monkeypatch):
+    """
+    Các setting IAM được khôi phục, session HTTP và circuit breaker được reset sau mỗi test
+    """
+    for name in ('IAM_SERVICE_URL', 'AUTHENTICATION_SERVICE', 'SALE_ID', 'SALE_LEADER_ID', 'SALE_ADMIN_ID',
+                 'SALE_MANAGER_ID'):
+        monkeypatch.setattr(settings, name, getattr(settings, name))
+    reset_upstream_clients()
+    yield
+    reset_upstream_clients()
+
+
+class TestIamSyncBenchmark(APITestCase):
+    ISSUE_KEY = "O2OSTAFF-320"
+
+    def test_sync_all_staffs_per_staff_mode(self):
+        """
+            Test đồng bộ IAM từng nhân viên với fake IAM
+            Step by step:
+            - Tạo 40 nhân viên giả, một nửa đã có trên fake IAM (một nửa trong số đó sai role)
+            - Chạy đồng bộ mode per-staff
+            - Đầu ra mong muốn:
+                . 20 user được tạo, 10 user được cập nhật role, 10 user không đổi
+                . Không có nhân viên lỗi
+        """
+        result = run_benchmark(staffs=40, latency=0, existing_ratio=0.5, mode='per-staff', concurrency=4)
+        report = result['report']
+
+        assert report['failed'] == 0
+        assert report['created'] == 20
+        assert report['updated'] == 10
+        assert report['unchanged'] == 10
+
+    def test_bulk_mode_only_calls_iam_for_changes(self):
+        """
+            Test đồng bộ IAM mode bulk chỉ gọi IAM cho các thay đổi
+            Step by step:
+            - Tạo 40 nhân viên giả, toàn bộ đã có trên fake IAM (một nửa sai role)
+            - Chạy đồng bộ mode bulk và mode per-staff
+            - Đầu ra mong muốn:
+                . Mode bulk không gọi GET /users theo email và GET /users/{id}/roles,
+                  mode per-staff gọi cả hai cho từng nhân viên
+                . Mode bulk gọi ít request hơn mode per-staff
+                . Kết quả đồng bộ của hai mode giống nhau
+        """
+        bulk = run_benchmark(staffs=40, latency=0, existing_ratio=1, mode='bulk', concurrency=4)
+        per_staff = run_benchmark(staffs=40, latency=0, existing_ratio=1, mode='per-staff', concurrency=4)
+
+        assert bulk['report']['failed'] == 0
+        assert bulk['report']['updated'] == per_staff['report']['updated'] == 20
+        assert bulk['report']['unchanged'] == per_staff['report']['unchanged'] == 20
+        assert bulk['calls_by_route'].get('GET /api/v1.0/users?email', 0) == 0
+        assert bulk['calls_by_route'].get('GET /api/v1.0/users/{id}/roles', 0) == 0
+        assert per_staff['calls_by_route']['GET /api/v1.0/users?email'] == 40
+        assert per_staff['calls_by_route']['GET /api/v1.0/users/{id}/roles'] == 40
+        assert bulk['calls'] < per_staff['calls']
+
+    def test_import_mode(self):
+        """
+            Test bước đồng bộ IAM của import nhân viên với fake IAM
+            Step by step:
+            - Tạo 40 nhân viên giả, một nửa đã có trên fake IAM, fake IAM chậm 5ms mỗi request
+            - Chạy benchmark mode import
+            - Đầu ra mong muốn:
+                . Kết quả giống mode per-staff, không có nhân viên lỗi
+                . Báo cáo có thời gian chạy và throughput
+                . Setting IAM được khôi phục sau benchmark
+        """
+        iam_service_url = settings.IAM_SERVICE_URL
+
+        result = run_benchmark(staffs=40, latency=0.005, existing_ratio=0.5, mode='import')
+        report = result['report']
+
+        assert (report['failed'], report['created'], report['updated'], report['unchanged']) == (0, 20, 10, 10)
+        assert result['wall_time'] > 0 and result['throughput'] > 0
+        assert result['calls_by_route']['POST /api/v1.0/users'] == 20
+        assert settings.IAM_SERVICE_URL == iam_service_url